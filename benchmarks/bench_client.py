@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for the hot paths of the client
+
+The API is replaced by a local server function that serves synthetic DIP
+pages of 50 documents with cursors, so results only depend on the client.
+
+Usage:
+    python -m benchmarks.bench_client --records 20000 --output results.json
+    python -m benchmarks.bench_client --compare old.json new.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import bundestag_api
+from bundestag_api import bta_wrapper
+from bundestag_api.bta_wrapper import convert_results
+
+PAGE_SIZE = 50
+APIKEY = "OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw"
+
+
+def synthetic_document(resource, i):
+    """Returns a document with the fields the API serves for a resource"""
+    day = (datetime(2021, 10, 26) + timedelta(days=i % 900)).strftime("%Y-%m-%d")
+    base = {"id": str(100000 + i), "datum": day, "aktualisiert": day + "T10:00:00+01:00",
+            "wahlperiode": 20}
+    if resource == "person":
+        return dict(base, typ="Person", nachname="Muster{}".format(i), vorname="Erika",
+                    titel="Dr. Erika Muster{}, MdB, SPD".format(i), basisdatum="2021-10-26",
+                    person_roles=[{"funktion": "MdB", "fraktion": "SPD", "nachname": "Muster",
+                                   "vorname": "Erika", "wahlperiode_nummer": [20]}])
+    if resource == "aktivitaet":
+        return dict(base, typ="Aktivität", aktivitaetsart="Rede", dokumentart="Plenarprotokoll",
+                    titel="Erika Muster, MdB, SPD", vorgangsbezug_anzahl=1,
+                    vorgangsbezug=[{"id": str(i), "titel": "Vorgang", "vorgangstyp": "Gesetzgebung"}],
+                    fundstelle={"id": str(5000 + i % 100), "dokumentart": "Plenarprotokoll",
+                                "pdf_url": "https://dserver.bundestag.de/btp/20/20001.pdf"},
+                    deskriptor=[{"name": "Pflege", "typ": "Sachbegriffe"}])
+    if resource == "vorgang":
+        return dict(base, typ="Vorgang", titel="Gesetz Nummer {}".format(i), vorgangstyp="Gesetzgebung",
+                    beratungsstand="Noch nicht beraten", initiative=["Bundesregierung"],
+                    abstract="Zusammenfassung " * 20, sachgebiet=["Gesundheit"],
+                    deskriptor=[{"name": "Pflege", "typ": "Sachbegriffe", "fundstelle": True}],
+                    zustimmungsbeduerftigkeit=["Ja, laut Gesetzentwurf"])
+    if resource == "vorgangsposition":
+        return dict(base, typ="Vorgangsposition", vorgangsposition="Gesetzentwurf",
+                    titel="Gesetz Nummer {}".format(i), vorgang_id=str(i), vorgangstyp="Gesetzgebung",
+                    dokumentart="Drucksache", zuordnung="BT", gang=True, fortsetzung=False,
+                    nachtrag=False, fundstelle={"id": str(200000 + i), "dokumentart": "Drucksache",
+                                                "drucksachetyp": "Gesetzentwurf"})
+    doc = dict(base, titel="Drucksache Nummer {}".format(i), dokumentnummer="20/{}".format(i),
+               herausgeber="BT", fundstelle={"id": base["id"], "dokumentart": "Drucksache",
+                                             "pdf_url": "https://dserver.bundestag.de/btd/20/001/2000001.pdf"})
+    if resource.startswith("plenarprotokoll"):
+        doc.update(typ="Dokument", dokumentart="Plenarprotokoll", sitzungsbemerkung="")
+    else:
+        doc.update(typ="Dokument", dokumentart="Drucksache", drucksachetyp="Antrag",
+                   urheber=[{"bezeichnung": "SPD", "titel": "Fraktion der SPD"}],
+                   autoren_anzahl=1, autoren_anzeige=[{"id": "1", "titel": "Erika Muster, MdB, SPD",
+                                                      "autor_titel": "Erika Muster"}],
+                   vorgangsbezug=[{"id": str(i), "titel": "Vorgang", "vorgangstyp": "Gesetzgebung"}])
+    if resource.endswith("-text"):
+        doc["text"] = "Sehr geehrte Damen und Herren! " * 400
+    return doc
+
+
+class SyntheticResponse:
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+        self.reason = "OK"
+        self.url = ""
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class SyntheticServer:
+    """Serves pre-encoded pages of synthetic documents in place of requests.get"""
+
+    def __init__(self, resource, records):
+        self.pages = []
+        for start in range(0, records, PAGE_SIZE):
+            docs = [synthetic_document(resource, i) for i in range(start, min(start + PAGE_SIZE, records))]
+            cursor = "c{}".format(start + PAGE_SIZE if start + PAGE_SIZE < records else start)
+            self.pages.append(json.dumps({"numFound": records, "documents": docs,
+                                          "cursor": cursor}).encode("utf-8"))
+
+    def get(self, url, params=None, **kwargs):
+        cursor = params.get("cursor")
+        index = 0 if cursor is None else min(int(cursor[1:]) // PAGE_SIZE, len(self.pages) - 1)
+        return SyntheticResponse(self.pages[index])
+
+
+def timed(function, repeat):
+    """Returns the best wall time of several runs"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_resource(resource, records, repeat):
+    server = SyntheticServer(resource, records)
+    original = bta_wrapper.requests.get
+    bta_wrapper.requests.get = server.get
+    try:
+        bta = bundestag_api.btaConnection(apikey=APIKEY)
+        result = {"records": records, "pages": len(server.pages),
+                  "bytes": sum(len(p) for p in server.pages)}
+        elapsed = timed(lambda: bta.query(resource, num=records), repeat)
+        result["pagination_seconds"] = elapsed
+        result["pagination_records_per_second"] = records / elapsed
+        elapsed = timed(lambda: [json.loads(p) for p in server.pages], repeat)
+        result["json_decode_seconds"] = elapsed
+        result["json_decode_mb_per_second"] = result["bytes"] / 1e6 / elapsed
+        data = bta.query(resource, num=records)
+        elapsed = timed(lambda: convert_results(data, resource, "object"), repeat)
+        result["model_construction_seconds"] = elapsed
+        result["model_construction_records_per_second"] = records / elapsed
+        parallel = bundestag_api.btaConnection(apikey=APIKEY, workers=os.cpu_count())
+        elapsed = timed(lambda: parallel.query(resource, num=records, return_format="object"), repeat)
+        result["parallel_object_query_seconds"] = elapsed
+        try:
+            import pandas
+            elapsed = timed(lambda: convert_results(data, resource, "pandas"), repeat)
+            result["pandas_seconds"] = elapsed
+        except ImportError:
+            result["pandas_seconds"] = None
+        del data
+        gc.collect()
+        tracemalloc.start()
+        data = bta.query(resource, num=records)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del data
+        result["peak_bytes_per_100k_records"] = int(peak * 100000 / records)
+    finally:
+        bta_wrapper.requests.get = original
+    return result
+
+
+def run(resources, records, repeat):
+    try:
+        from importlib.metadata import version
+        package_version = version("bundestag_api")
+    except Exception:
+        package_version = None
+    results = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+               "package_version": package_version,
+               "python": sys.version.split()[0],
+               "platform": platform.platform(),
+               "records": records,
+               "repeat": repeat,
+               "resources": {}}
+    for resource in resources:
+        print("Benchmarking {} ...".format(resource), file=sys.stderr)
+        results["resources"][resource] = bench_resource(resource, records, repeat)
+    return results
+
+
+def compare(old, new, threshold=0.1):
+    """Prints relative changes of the timing and memory measurements and
+    returns the number of regressions above the threshold"""
+    regressions = 0
+    for resource, values in new["resources"].items():
+        if resource not in old["resources"]:
+            continue
+        for key, val in values.items():
+            before = old["resources"][resource].get(key)
+            if not (key.endswith("_seconds") or key.startswith("peak_")) or not before or val is None:
+                continue
+            change = (val - before) / before
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("{:<22} {:<40} {:>12.4g} -> {:>12.4g} ({:+.1%}){}".format(
+                resource, key, before, val, change, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of bundestag_api")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--resources", nargs="+", default=bundestag_api.bta_wrapper.RESOURCETYPES)
+    parser.add_argument("--output", default=None, help="Path of the JSON results. Defaults to stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running the benchmarks")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.threshold) else 0
+    results = run(args.resources, args.records, args.repeat)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
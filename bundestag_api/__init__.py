@@ -5,3 +5,12 @@ Python wrapper for the official Bundestag API
 
 from .bta_wrapper import btaConnection
 from .models import Person, Role, Drucksache, Aktivitaet, Vorgang, Vorgangsposition, Plenarprotokoll
+from .speeches import Speech, Interjection, iter_speeches, segment_protocols
+from .local import LocalCorpus
+from .hybrid import HybridPlanner
+from .metrics import Metrics
+from .prepared import PreparedQuery
+from .keys import KeyPool
+from .changes import ChangeFeed, ChangeEvent
+from .idset import IdSet
+from .utils import is_error, NO_DATA
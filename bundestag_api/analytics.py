@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized counting over harvested records. Requires numpy
+"""
+
+import numpy as np
+from .models import Person, Drucksache, Aktivitaet, Vorgang, Vorgangsposition, Plenarprotokoll
+
+DATE_FIELDS = ["datum", "aktualisiert", "basisdatum"]
+DEFAULT_FIELDS = ["id", "datum", "typ", "dokumentart", "drucksachetyp", "zuordnung",
+                  "herausgeber", "wahlperiode", "fraktion"]
+# Attribute names of the model classes for the field names of the API. Fields
+# a class does not hold are missing for its objects
+_SHARED = {"id": "btid", "datum": "date", "titel": "title", "typ": "instance"}
+ATTRIBUTES = {Person: {"id": "btid", "datum": "date", "typ": "instance", "basisdatum": "basedate",
+                       "nachname": "lastname", "vorname": "firstname", "wahlperiode": "legislativeperiod"},
+              Drucksache: dict(_SHARED, dokumentart="docname", drucksachetyp="doctype", herausgeber="publisher",
+                               wahlperiode="legislativeperiod", dokumentnummer="docnumber", urheber="originator"),
+              Aktivitaet: dict(_SHARED, typ="type", dokumentart="doctype", wahlperiode="parlsession",
+                               aktivitaetsart="activitytype", vorgangsbezug_anzahl="numprocedure"),
+              Vorgang: dict(_SHARED, vorgangstyp="processtype", beratungsstand="status",
+                            wahlperiode="legislativeperiod", gesta="gesta"),
+              Vorgangsposition: dict(_SHARED, dokumentart="docname", vorgangstyp="processtype",
+                                     vorgangsposition="processposition", zuordnung="institution",
+                                     vorgang_id="procedureID", urheber="originator"),
+              Plenarprotokoll: dict(_SHARED, dokumentart="docname", herausgeber="publisher",
+                                    wahlperiode="legislativeperiod", dokumentnummer="docnumber")}
+# The model classes spell out the institutions, the API returns their codes
+INSTITUTION_CODES = {"Bundestag": "BT", "Bundesrat": "BR"}
+FREQUENCIES = {"D": "datetime64[D]", "M": "datetime64[M]", "Y": "datetime64[Y]"}
+
+
+def _faction(record):
+    """Derives the faction of an activity from its title ("Name, MdB, SPD")
+    and of a document from the faction among its originators"""
+    if isinstance(record, dict):
+        originators = record.get("urheber")
+        title = record.get("titel")
+        typ = record.get("typ")
+    else:
+        originators = getattr(record, "originator", None)
+        title = getattr(record, "title", None)
+        typ = getattr(record, "type", getattr(record, "instance", None))
+    if originators:
+        for o in originators:
+            if isinstance(o, dict) and str(o.get("titel", "")).startswith("Fraktion"):
+                return o.get("bezeichnung")
+    if typ == "Aktivität" and title is not None:
+        ttl = title.split(",")
+        if len(ttl) > 2 and ttl[1].strip() == "MdB":
+            return ttl[2].strip()
+    return None
+
+
+def _value(record, field):
+    if field == "fraktion":
+        return _faction(record)
+    if isinstance(record, dict):
+        return record.get(field)
+    attributes = ATTRIBUTES.get(type(record))
+    if attributes is None:
+        return getattr(record, field, None)
+    if field not in attributes:
+        return None
+    value = getattr(record, attributes[field], None)
+    if field in ["herausgeber", "zuordnung"]:
+        value = INSTITUTION_CODES.get(value, value)
+    return value
+
+
+def _records(records):
+    if records is None or isinstance(records, str):
+        return []
+    if isinstance(records, dict):
+        if "id" in records:
+            return [records]
+        return list(records.values())
+    if not isinstance(records, list):
+        return [records]
+    return records
+
+
+def encode(values):
+    """Encodes a list of values as integer codes. Missing values become -1
+
+    Returns
+    -------
+    data: tuple
+        a tuple of the categories (numpy array of objects) and the codes
+    """
+    lookup = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+        else:
+            codes[i] = lookup.setdefault(v, len(lookup))
+    categories = np.empty(len(lookup), dtype=object)
+    categories[:] = list(lookup)
+    return categories, codes
+
+
+class Columns:
+    """This class holds records as column arrays. Dates are stored as
+    datetime64 and all other fields as integer codes with their categories
+
+    Methods
+    -------
+    count_by(field, freq=None):
+        Counts records per category or per date bucket
+    crosstab(row, col, row_freq=None, col_freq=None):
+        Counts records per combination of two fields
+    to_arrow():
+        Returns the columns as a pyarrow Table
+    """
+
+    def __init__(self, records, fields=None):
+        records = _records(records)
+        if fields is None:
+            fields = DEFAULT_FIELDS
+        self.fields = list(fields)
+        self.ids = None
+        self.dates = {}
+        self.codes = {}
+        self.categories = {}
+        for field in self.fields:
+            values = [_value(r, field) for r in records]
+            if field in DATE_FIELDS:
+                self.dates[field] = np.array(
+                    [v[0:10] if v is not None else "NaT" for v in values], dtype="datetime64[D]")
+            elif field == "id":
+                self.ids = np.array([int(v) for v in values], dtype=np.int64)
+            else:
+                self.categories[field], self.codes[field] = encode(values)
+
+    def __len__(self):
+        if self.ids is not None:
+            return len(self.ids)
+        return 0
+
+    def __str__(self):
+        return "Columns: {} records, fields {}".format(len(self), ", ".join(self.fields))
+
+    def __repr__(self):
+        return "Columns: {} records, fields {}".format(len(self), ", ".join(self.fields))
+
+    def bucket(self, field="datum", freq="W"):
+        """Truncates a date column to days, weeks (starting Monday), months or years
+
+        Returns
+        -------
+        data: numpy array
+            the bucket start of each record as datetime64
+        """
+        dates = self.dates[field]
+        if freq == "W":
+            days = dates.astype("datetime64[D]").astype(np.int64)
+            # 1970-01-01 was a Thursday, shift by 3 days to start weeks on Monday
+            weeks = (days - (days + 3) % 7).astype("datetime64[D]")
+            weeks[np.isnat(dates)] = np.datetime64("NaT")
+            return weeks
+        if freq not in FREQUENCIES:
+            raise ValueError("freq must be one of D, W, M or Y")
+        return dates.astype(FREQUENCIES[freq])
+
+    def _labels_codes(self, field, freq):
+        if field in self.dates:
+            buckets = self.bucket(field, freq if freq is not None else "D")
+            valid = ~np.isnat(buckets)
+            labels, inverse = np.unique(buckets[valid], return_inverse=True)
+            codes = np.full(len(buckets), -1, dtype=np.int64)
+            codes[valid] = inverse.ravel()
+            return labels, codes
+        if field not in self.codes:
+            raise ValueError("Unknown field {}".format(field))
+        return self.categories[field], self.codes[field]
+
+    def count_by(self, field, freq=None):
+        """Counts records per category or, for date fields, per date bucket
+
+        Parameters
+        ----------
+        field: str
+            A field of the columns, e.g. "drucksachetyp" or "datum"
+        freq: str, optional
+            Bucket size for date fields: D, W, M or Y. Defaults to D
+
+        Returns
+        -------
+        data: tuple
+            a tuple of the labels and the counts as numpy arrays
+        """
+        labels, codes = self._labels_codes(field, freq)
+        counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        return labels, counts
+
+    def crosstab(self, row, col, row_freq=None, col_freq=None):
+        """Counts records per combination of two fields
+
+        Parameters
+        ----------
+        row: str
+            Field whose labels form the rows
+        col: str
+            Field whose labels form the columns
+        row_freq: str, optional
+            Bucket size if row is a date field
+        col_freq: str, optional
+            Bucket size if col is a date field
+
+        Returns
+        -------
+        data: tuple
+            a tuple of the row labels, the column labels and a 2D array of counts
+        """
+        row_labels, row_codes = self._labels_codes(row, row_freq)
+        col_labels, col_codes = self._labels_codes(col, col_freq)
+        valid = (row_codes >= 0) & (col_codes >= 0)
+        flat = row_codes[valid].astype(np.int64) * len(col_labels) + col_codes[valid]
+        counts = np.bincount(flat, minlength=len(row_labels) * len(col_labels))
+        return row_labels, col_labels, counts.reshape(len(row_labels), len(col_labels))
+
+    def to_arrow(self):
+        """Returns the columns as a pyarrow Table with dictionary encoded categories"""
+        import pyarrow as pa
+        arrays = {}
+        if self.ids is not None:
+            arrays["id"] = pa.array(self.ids)
+        for field, dates in self.dates.items():
+            arrays[field] = pa.array(dates, mask=np.isnat(dates))
+        for field, codes in self.codes.items():
+            arrays[field] = pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0), pa.array(list(self.categories[field])))
+        return pa.table(arrays)
@@ -1,14 +1,95 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import product, islice
+import heapq
+import time
+import threading
 import requests
 import sys
 import logging
 from .models import Person, Aktivitaet, Vorgang, Vorgangsposition, Drucksache, Plenarprotokoll
-from .utils import is_iso8601, parse_args_to_dict
+from .checkpoint import Checkpoint
+from .keys import KeyPool, BENCH_STATUS
+from .prepared import PreparedQuery
+from .streaming import PageDecoder, XmlPageDecoder, project_element, CHUNK_SIZE
+from .frames import page_frame, concat_frames
+from .profiling import Profiler, clock, timed
+from .tracing import get_tracer, traced, current_span, set_attributes, propagate
+from .utils import is_iso8601, parse_args_to_dict, canonical_key, compile_fields, project, RateLimiter, \
+    MODEL_FIELDS, RESOURCETYPES, INSTITUTIONS, NO_DATA, is_error
 
 logger = logging.getLogger("bundestag_api")
 logger.addHandler(logging.NullHandler())
 
+MAX_FANOUT = 16
+RETRY_STATUS = [429, 500, 502, 503, 504]
+MODELS = {"aktivitaet": Aktivitaet,
+          "drucksache": Drucksache,
+          "drucksache-text": Drucksache,
+          "person": Person,
+          "plenarprotokoll": Plenarprotokoll,
+          "plenarprotokoll-text": Plenarprotokoll,
+          "vorgang": Vorgang,
+          "vorgangsposition": Vorgangsposition}
+
+
+def _sort_key(doc):
+    btid = str(doc["id"])
+    return (doc.get("datum") or "", int(btid) if btid.isdigit() else 0)
+
+
+def _build_models(resource, documents):
+    """Constructs the objects of a page of documents. Runs in a worker process"""
+    model = MODELS[resource]
+    return [(doc["id"], model(doc)) for doc in documents]
+
+
+def convert_results(data, resource, return_format="json"):
+    """Converts a list of documents into the requested return format
+
+    Parameters
+    ----------
+    data: list
+        a list of dictionaries as returned by the API
+    resource: str
+        The resource type the documents belong to
+    return_format: str, optional
+        "json", "object" or "pandas". Defaults to json
+
+    Returns
+    -------
+    data: list/dict/DataFrame
+        the converted data. Single results are returned unwrapped
+    """
+    if isinstance(data, str):
+        return data
+    if return_format == "object":
+        if resource == "aktivitaet":
+            data = {name["id"]: Aktivitaet(name) for name in data}
+        elif resource == "drucksache":
+            data = {name["id"]: Drucksache(name) for name in data}
+        elif resource == "drucksache-text":
+            data = {name["id"]: Drucksache(name) for name in data}
+        elif resource == "person":
+            data = {name["id"]: Person(name) for name in data}
+        elif resource == "plenarprotokoll":
+            data = {name["id"]: Plenarprotokoll(name) for name in data}
+        elif resource == "plenarprotokoll-text":
+            data = {name["id"]: Plenarprotokoll(name) for name in data}
+        elif resource == "vorgang":
+            data = {name["id"]: Vorgang(name) for name in data}
+        elif resource == "vorgangsposition":
+            data = {name["id"]: Vorgangsposition(name) for name in data}
+    if return_format == "pandas":
+        data = page_frame(data)
+    if len(data) == 1 and isinstance(data, dict):
+        tl = list(data.keys())
+        data = data[tl[0]]
+    elif len(data) == 1 and isinstance(data, list):
+        data = data[0]
+    return data
+
 
 class btaConnection:
     """This class handles the API authentication and provides search functionality
@@ -18,6 +99,10 @@ class btaConnection:
     query(resource, return_format="json", num=100, fid=None, date_start=None, date_end=None,
           institution=None, documentID=None, plenaryprotocolID=None, processID=None)
         A general search function for the official Bundestag API
+    count_many(resource, filter_sets, concurrency=4):
+        Counts the entities matching several filter sets concurrently
+    iter_query(resource, return_format="json", num=None, checkpoint=None, pages=False, **params):
+        Iterates over the results of a query with resumable checkpoints
     search_procedure(return_format="json",num=100,fid=None,date_start=None,date_end=None):
         Searches procedures specified by the parameters
     search_procedureposition(return_format="json", num=100, fid=None, date_start=None, date_end=None, processID=None):
@@ -42,9 +127,47 @@ class btaConnection:
         Retrieves persons specified by IDs
     get_plenaryprotocol(btid, return_format="json"):
         Retrieves plenary protocols specified by IDs
+    prepare(resource, return_format="json", num=100, **params):
+        Validates a query once for repeated execution with different IDs and dates
+    add_hook(event, callback):
+        Registers a callback for request, page, retry and error events
+    profile(slowest=20):
+        Returns a context manager that records phase timings of queries
+    close():
+        Shuts down the process pool of the connection
     """
 
-    def __init__(self, apikey=None):
+    def __init__(self, apikey=None, max_retries=3, retry_backoff=1.0, tracing=True, rate_limit=None,
+                 workers=None, stream=False, wire_format="json"):
+        if workers is not None and (not isinstance(workers, int) or workers <= 0):
+            raise ValueError("workers must be an integer larger than zero")
+        if wire_format not in ["json", "xml"]:
+            raise ValueError("wire_format must be 'json' or 'xml'")
+        self.workers = workers
+        # The process pool is started by the first query that needs it and kept until close()
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.stream = stream
+        self.wire_format = wire_format
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        if rate_limit is not None:
+            self.rate_limiter = RateLimiter(rate_limit)
+        else:
+            self.rate_limiter = None
+        self.profiler = None
+        if tracing is True:
+            self.tracer = get_tracer()
+        else:
+            self.tracer = None
+        self.hooks = {"query_start": [],
+                      "query_end": [],
+                      "request_start": [],
+                      "request_end": [],
+                      "page": [],
+                      "retry": [],
+                      "error": []}
+        self.key_pool = None
         GEN_APIKEY = "OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw"
 
         DATE_GEN_APIKEY = "31.05.2026"
@@ -56,6 +179,13 @@ class btaConnection:
         elif apikey is None and date_expiry.date() > today.date():
             self.apikey = GEN_APIKEY
             logger.info("General API key used. It is valid until 31.05.2024.")
+        elif isinstance(apikey, (list, dict, KeyPool)):
+            if isinstance(apikey, KeyPool):
+                self.key_pool = apikey
+            else:
+                self.key_pool = KeyPool(apikey)
+            self.apikey = self.key_pool.keys[0]
+            logger.debug("Pool of {} API keys is used.".format(len(self.key_pool.keys)))
         elif apikey is not None:
             if not isinstance(apikey, str) and len(apikey) == 42:
                 raise ValueError("No (correct) API key provided")
@@ -69,6 +199,28 @@ class btaConnection:
     def __repr__(self):
         return "API key: "+str(self.apikey)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Shuts down the process pool that constructs objects. The
+        connection can still be used and starts a new pool when needed"""
+        with self.executor_lock:
+            executor = self.executor
+            self.executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _get_executor(self):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    @traced
     def query(self,
               resource,
               return_format="json",
@@ -87,7 +239,11 @@ class btaConnection:
               document_type=None,
               process_type=None,
               procces_type_notation=None,
-              title=None,):
+              title=None,
+              descriptor_mode="and",
+              sachgebiet_mode="and",
+              fields=None,
+              count=False):
         """A general search function for the official Bundestag API
 
         Parameters
@@ -97,9 +253,9 @@ class btaConnection:
                 drucksache, drucksache-text, person, plenarprotokoll,
                 plenarprotokoll-text, vorgang or vorgangsposition
             return_format: str, optional
-                Return format of the data. Defaults to json. XML not implemented
-                yet. Other option is "object" which will return results as class
-                objects
+                Return format of the data. Defaults to json. Other options are
+                "object" which will return results as class objects, "pandas" and
+                "xml" which returns the documents as XML elements
             num: int, optional
                 Number of maximal results to be returned. Defaults to 100
             fid: int/list, optional
@@ -129,12 +285,12 @@ class btaConnection:
                 that are connected to the process
             descriptor: str/list, optional
                 Keyword that is connected to the entities. Multiple strings can
-                be supplied as a list but they will be joined via AND. An OR-
-                search is not possible
+                be supplied as a list and will be joined via AND unless
+                descriptor_mode is "or"
             sachgebiet: str/list, optional
                 Political field that is connected to the entities. Multiple 
-                strings can be supplied as a list but they will be joined via
-                AND. An OR-search is not possible
+                strings can be supplied as a list and will be joined via AND
+                unless sachgebiet_mode is "or"
             document_type: str, optional
                 The type of document to be returned.
             process_type: str, optional
@@ -145,13 +301,298 @@ class btaConnection:
                 Keyword that can be found in the title of documents. Multiple 
                 strings can be supplied as a list and will be joined via
                 an OR-search.
+            descriptor_mode: str, optional
+                "and" (default) joins multiple descriptors via AND. "or" runs
+                one search per descriptor concurrently and merges the results.
+                Every search fetches up to num documents and the results are
+                merged once all searches have finished. Can not be combined
+                with return_format "xml"
+            sachgebiet_mode: str, optional
+                "and" (default) joins multiple political fields via AND. "or"
+                runs one search per field concurrently and merges the results
+                like descriptor_mode
+            fields: list, optional
+                Fields to keep of every document, e.g. ["titel",
+                "fundstelle.pdf_url"]. Nested fields are separated by dots and
+                the id is always kept. Other fields are dropped as soon as a
+                page is decoded
+            count: bool, optional
+                If True, only the number of matching entities (numFound) is
+                returned. One request is made and only the head of the first
+                page is read, so no documents are received
         """
 
+        if descriptor_mode not in ["and", "or"] or sachgebiet_mode not in ["and", "or"]:
+            raise ValueError("descriptor_mode and sachgebiet_mode must be 'and' or 'or'")
+        if fields is not None and return_format == "object":
+            fields = compile_fields(fields, MODEL_FIELDS.get(str(resource).lower()))
+        elif fields is not None:
+            fields = compile_fields(fields)
+        if (descriptor_mode == "or" and isinstance(descriptor, list) and len(descriptor) > 1) or \
+                (sachgebiet_mode == "or" and isinstance(sachgebiet, list) and len(sachgebiet) > 1):
+            if count:
+                # Entities matching several sub-queries would be counted twice
+                raise ValueError("count can not be combined with descriptor_mode or sachgebiet_mode 'or'")
+            if return_format == "xml":
+                # The results are merged as dictionaries
+                raise ValueError("return_format 'xml' can not be combined with descriptor_mode or "
+                                 "sachgebiet_mode 'or'")
+            params = {"fid": fid,
+                      "date_start": date_start,
+                      "date_end": date_end,
+                      "updated_since": updated_since,
+                      "updated_until": updated_until,
+                      "institution": institution,
+                      "documentID": documentID,
+                      "plenaryprotocolID": plenaryprotocolID,
+                      "processID": processID,
+                      "document_type": document_type,
+                      "process_type": process_type,
+                      "procces_type_notation": procces_type_notation,
+                      "title": title}
+            if descriptor_mode == "or" and isinstance(descriptor, list):
+                descriptors = descriptor
+            else:
+                descriptors = [descriptor]
+            if sachgebiet_mode == "or" and isinstance(sachgebiet, list):
+                sachgebiete = sachgebiet
+            else:
+                sachgebiete = [sachgebiet]
+            subqueries = [dict(params, descriptor=d, sachgebiet=sg)
+                          for d, sg in product(descriptors, sachgebiete)]
+            data = self._fan_out(resource, subqueries, num, fields=fields)
+            return convert_results(data, resource, return_format)
+        profile = None
+        if self.profiler is not None:
+            profile = self.profiler.begin(resource)
+            phase_started = clock()
+        resource, r_url, payload = self._build_request(resource,
+                                                       return_format=return_format,
+                                                       num=num,
+                                                       fid=fid,
+                                                       date_start=date_start,
+                                                       date_end=date_end,
+                                                       updated_since=updated_since,
+                                                       updated_until=updated_until,
+                                                       institution=institution,
+                                                       documentID=documentID,
+                                                       plenaryprotocolID=plenaryprotocolID,
+                                                       processID=processID,
+                                                       descriptor=descriptor,
+                                                       sachgebiet=sachgebiet,
+                                                       document_type=document_type,
+                                                       process_type=process_type,
+                                                       procces_type_notation=procces_type_notation,
+                                                       title=title)
+        if profile is not None:
+            profile.add(("validate",), phase_started)
+        if count:
+            return self._count(resource, r_url, payload)
+        return self._execute(resource, r_url, payload, return_format, num, profile=profile, fields=fields)
+
+    def count_many(self, resource, filter_sets, concurrency=4):
+        """Counts the entities matching several filter sets concurrently,
+        with one request per filter set and without receiving documents
+
+        Parameters
+        ----------
+        resource: str
+            The resource type to be counted
+        filter_sets: list
+            A list of dictionaries of parameters of query(), e.g.
+            [{"date_start": "2022-01-01", "date_end": "2022-01-31"}, ...]
+        concurrency: int, optional
+            Number of concurrent requests. Defaults to 4
+
+        Returns
+        -------
+        data: list
+            the number of entities per filter set in the order of filter_sets
+        """
+        for params in filter_sets:
+            if "count" in params or "return_format" in params:
+                raise ValueError("Filter sets can not contain count or return_format")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(propagate(self.query), resource, count=True, **params)
+                       for params in filter_sets]
+            return [future.result() for future in futures]
+
+    def _execute(self, resource, r_url, payload, return_format, num, profile=None, fields=None):
+        """Runs a validated request and converts the results"""
+        if profile is not None:
+            profile.key = canonical_key(resource, {k: v for k, v in payload.items()
+                                                   if k not in ["apikey", "cursor"]})
+            profile.resource = resource
+        self._emit("query_start", resource=resource, num=num)
+        started = time.perf_counter()
+        if return_format == "object" and self.workers is not None:
+            data, stats = self._fetch_objects(resource, r_url, payload, num, profile=profile, fields=fields)
+        elif return_format == "pandas":
+            data, stats = self._fetch(resource, r_url, payload, num, profile=profile, fields=fields,
+                                      frames=True)
+        else:
+            data, stats = self._fetch(resource, r_url, payload, num, profile=profile, fields=fields,
+                                      elements=return_format == "xml")
+        if return_format == "pandas" and isinstance(data, list):
+            documents = sum(len(frame) for frame in data)
+        else:
+            documents = len(data) if isinstance(data, list) else 0
+        self._emit("query_end", resource=resource, pages=stats["pages"], documents=documents,
+                   elapsed=time.perf_counter()-started)
+        if self.tracer is not None:
+            set_attributes(current_span(), {
+                "bundestag_api.resource": resource,
+                "bundestag_api.filters": canonical_key(resource, {k: v for k, v in payload.items()
+                                                                 if k not in ["apikey", "cursor", "format"]}),
+                "bundestag_api.numFound": stats["numFound"],
+                "bundestag_api.cursor_depth": stats["pages"],
+                "bundestag_api.bytes": stats["bytes"],
+                "bundestag_api.retries": stats["retries"],
+                "bundestag_api.documents": documents})
+        if profile is not None:
+            phase_started = clock()
+        if isinstance(data, dict):
+            # Objects were already constructed by _fetch_objects
+            data = convert_results(data, resource, "json")
+        elif return_format == "pandas" and not isinstance(data, str):
+            # Pages were already turned into frames by _fetch
+            data = concat_frames(data)
+        else:
+            data = convert_results(data, resource, return_format)
+        if profile is not None:
+            if return_format == "object":
+                profile.add(("models",), phase_started)
+            elif return_format == "pandas":
+                profile.add(("pandas",), phase_started)
+            else:
+                profile.add(("convert",), phase_started)
+            self.profiler.end(profile)
+        return data
+
+    def iter_query(self, resource, return_format="json", num=None, checkpoint=None,
+                   checkpoint_every=10, pages=False, fields=None, **params):
+        """Iterates over the results of a query page by page. With a checkpoint
+        the position of the pagination is saved every checkpoint_every pages and
+        when the iteration stops, so that a later call with the same parameters
+        resumes at the same page and skips the documents already delivered.
+        The checkpoint is removed once all documents are delivered
+
+        Delivery is at least once. A document counts as delivered when the
+        caller asks for the next one, so the document (or with pages=True or
+        "pandas" the page) that was handed out when the iteration was
+        stopped is delivered again on resume. After a crash, when no
+        checkpoint is saved on the way out, up to checkpoint_every pages are
+        delivered again
+
+        Parameters
+        ----------
+        resource: str
+            The resource type to be queried
+        return_format: str, optional
+            "json" (default) yields dictionaries, "object" yields class objects,
+            "pandas" yields a typed DataFrame per page, "xml" yields XML elements
+        num: int, optional
+            Number of maximal results to be delivered in total, including
+            those delivered before a resume. Defaults to all results
+        checkpoint: str/Checkpoint, optional
+            Path of the checkpoint file or a Checkpoint object
+        checkpoint_every: int, optional
+            Number of pages between two saves of the checkpoint. Defaults to 10
+        pages: bool, optional
+            If True, yields a list of documents per page instead of single
+            documents
+        fields: list, optional
+            Fields to keep of every document. The id is always kept
+        **params:
+            Further filters of query(), e.g. date_start or institution
+
+        Returns
+        -------
+        data: generator
+            the documents or pages of documents. An error of the API raises a
+            RuntimeError after the checkpoint is saved
+        """
+        if return_format not in ["json", "object", "pandas", "xml"]:
+            raise ValueError("return_format must be 'json', 'object', 'pandas' or 'xml'")
+        if isinstance(checkpoint, str):
+            checkpoint = Checkpoint(checkpoint, every=checkpoint_every)
+        resource, r_url, payload = self._build_request(resource, return_format=return_format,
+                                                       num=num, **params)
+        if fields is not None and return_format == "object":
+            fields = compile_fields(fields, MODEL_FIELDS.get(resource))
+        elif fields is not None:
+            fields = compile_fields(fields)
+        key = canonical_key(resource, {k: v for k, v in payload.items()
+                                       if k not in ["apikey", "cursor", "format"]})
+        state = {"key": key, "resource": resource, "cursor": None, "offset": 0, "delivered": 0}
+        if checkpoint is not None:
+            saved = checkpoint.load(key)
+            if saved is not None:
+                state = saved
+                payload["cursor"] = state["cursor"]
+                logger.info("Resuming {} at {} delivered documents".format(resource, state["delivered"]))
+        stats = {"pages": 0, "numFound": None, "bytes": 0, "retries": 0, "error": None}
+        complete = False
+        self._emit("query_start", resource=resource, num=num)
+        started = time.perf_counter()
+        try:
+            for documents, cursor in self._iter_pages(resource, r_url, payload, stats, fields=fields,
+                                                      elements=return_format == "xml"):
+                stop = None if num is None else state["offset"]+num-state["delivered"]
+                documents = islice(documents, state["offset"], stop)
+                if return_format == "object":
+                    documents = (MODELS[resource](doc) for doc in documents)
+                if pages or return_format == "pandas":
+                    documents = list(documents)
+                    if documents:
+                        yield page_frame(documents) if return_format == "pandas" else documents
+                    state["delivered"] += len(documents)
+                else:
+                    for doc in documents:
+                        yield doc
+                        state["delivered"] += 1
+                        state["offset"] += 1
+                if num is not None and state["delivered"] >= num:
+                    break
+                # The page is delivered, a resume starts with the next one
+                state["cursor"] = payload["cursor"]
+                state["offset"] = 0
+                if checkpoint is not None and stats["pages"] % checkpoint.every == 0:
+                    checkpoint.save(state)
+            if stats["error"] is not None:
+                raise RuntimeError(stats["error"])
+            complete = True
+        finally:
+            self._emit("query_end", resource=resource, pages=stats["pages"],
+                       documents=state["delivered"], elapsed=time.perf_counter()-started)
+            if checkpoint is not None:
+                if complete:
+                    checkpoint.clear()
+                else:
+                    checkpoint.save(state)
+
+    def _build_request(self,
+                       resource,
+                       return_format="json",
+                       num=100,
+                       fid=None,
+                       date_start=None,
+                       date_end=None,
+                       updated_since=None,
+                       updated_until=None,
+                       institution=None,
+                       documentID=None,
+                       plenaryprotocolID=None,
+                       processID=None,
+                       descriptor=None,
+                       sachgebiet=None,
+                       document_type=None,
+                       process_type=None,
+                       procces_type_notation=None,
+                       title=None,):
+        """Validates the parameters of query and returns the resource, the URL
+        and the request parameters"""
         BASE_URL = "https://search.dip.bundestag.de/api/v1/"
-        RESOURCETYPES = ["aktivitaet", "drucksache", "drucksache-text", "person",
-                         "plenarprotokoll", "plenarprotokoll-text", "vorgang",
-                         "vorgangsposition"]
-        INSTITUTIONS = ["BT", "BR", "BV", "EK"]
         if isinstance(resource, str) is True:
             resource = resource.lower()
         if resource not in RESOURCETYPES:
@@ -163,8 +604,6 @@ class btaConnection:
                     fid = [int(item) for item in fid]
                 except ValueError as e:
                     raise Exception("IDs must be integers: {}".format(e)) from None
-            else:
-                fid = '&f.id='.join(map(str, fid))
         elif fid is not None:
             if not isinstance(fid, int):
                 try:
@@ -226,7 +665,7 @@ class btaConnection:
             raise ValueError(
                 "Can't select more than one of documentID, plenaryprotocolID and processID")
         # Validate the num parameter is an integer and positive
-        if not isinstance(num, int) or num <= 0:
+        if num is not None and (not isinstance(num, int) or num <= 0):
             raise ValueError("num must be an integer larger than zero")
         # Validate updated_since and updated_until are both in ISO 8601 format
         if updated_since is not None:
@@ -244,10 +683,8 @@ class btaConnection:
                     raise ValueError("All descriptor items need to be of type string.")
                 elif all(len(item) < 100 for item in descriptor) is False:
                     raise ValueError("Strings are over 100 characters in length.")
-                else:
-                    descriptor = '&f.deskriptor='.join(map(str, descriptor))
             elif isinstance(descriptor, str) is True:
-                if len(descriptor) < 100:
+                if len(descriptor) >= 100:
                     raise ValueError("String is over 100 characters in length.")
             else:
                 raise ValueError("Descriptor must be string or a list of strings.")
@@ -258,22 +695,20 @@ class btaConnection:
                     raise ValueError("All sachgebiet items need to be of type string.")
                 elif all(len(item) < 100 for item in sachgebiet) is False:
                     raise ValueError("Strings are over 100 characters in length.")
-                else:
-                    sachgebiet = '&f.sachgebiet='.join(map(str, sachgebiet))
             elif isinstance(sachgebiet, str) is True:
-                if len(sachgebiet) < 100:
+                if len(sachgebiet) >= 100:
                     raise ValueError("String is over 100 characters in length.")
             else:
                 raise ValueError("Sachgebiet must be string or a list of strings.")
 
         r_url = BASE_URL+resource
-        return_object = False
-        if return_format == "object":
-            return_format = "json"
-            return_object = True
+        if return_format == "xml" or self.wire_format == "xml":
+            wire_format = "xml"
+        else:
+            wire_format = "json"
 
         payload = {"apikey": self.apikey,
-                   "format": return_format,
+                   "format": wire_format,
                    "f.id": fid,
                    "f.datum.start": date_start,
                    "f.datum.end": date_end,
@@ -290,67 +725,421 @@ class btaConnection:
                    "f.vorgangstyp_notation": procces_type_notation,
                    "f.titel": title,
                    "cursor": None}
-        data = []
+        return resource, r_url, payload
+
+    def prepare(self, resource, return_format="json", num=100, fields=None, **params):
+        """Validates the parameters of a query once and returns a query object
+        that can be executed repeatedly with different IDs and date ranges
+
+        Parameters
+        ----------
+        resource: str
+            The resource type to be queried
+        return_format: str, optional
+            Return format of the data. Defaults to json
+        num: int, optional
+            Number of maximal results to be returned. Defaults to 100
+        fields: list, optional
+            Fields to keep of every document. The id is always kept
+        **params:
+            Further filters of query(), e.g. institution or descriptor. IDs and
+            dates given here are fixed for all executions
+
+        Returns
+        -------
+        query: PreparedQuery
+            the prepared query. Use execute(), execute_async() and key() on it
+        """
+        return PreparedQuery(self, resource, return_format=return_format, num=num, fields=fields, **params)
+
+    def profile(self, slowest=20):
+        """Returns a profiler that records wall and CPU time per phase
+        (validate, network, decode, models, pandas) of every query and page
+        while it is used as a context manager
+
+        Parameters
+        ----------
+        slowest: int, optional
+            Number of slowest queries to keep. Defaults to 20
+
+        Returns
+        -------
+        profiler: Profiler
+            the profiler. Use slowest_queries() and dump_flamegraph() on it
+        """
+        return Profiler(self, slowest=slowest)
+
+    def add_hook(self, event, callback):
+        """Registers a callback for an event. Callbacks are called as
+        callback(event, info) with a dictionary of details
+
+        Parameters
+        ----------
+        event: str
+            One of query_start, query_end, request_start, request_end, page,
+            retry or error
+        callback: callable
+            The function to be called
+        """
+        if event not in self.hooks:
+            raise ValueError("Unknown event. Options are: "+", ".join(self.hooks))
+        self.hooks[event].append(callback)
+
+    def remove_hook(self, event, callback):
+        """Removes a callback registered with add_hook"""
+        self.hooks[event].remove(callback)
+
+    def _emit(self, event, **info):
+        for callback in self.hooks[event]:
+            try:
+                callback(event, info)
+            except Exception:
+                logger.exception("Hook for {} failed".format(event))
+
+    def _request(self, resource, r_url, payload, stats=None, stream=False):
+        """Sends one request and retries it on connection errors, 429 and
+        server errors with exponential backoff. With a key pool every attempt
+        uses the best available key and a 401 or 429 is retried at once with
+        another key"""
+        attempt = 0
+        while True:
+            self._emit("request_start", resource=resource, cursor=payload.get("cursor"), attempt=attempt)
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            key = None
+            params = payload
+            if self.key_pool is not None:
+                key = self.key_pool.acquire()
+                params = dict(payload, apikey=key)
+            started = time.perf_counter()
+            try:
+                r = requests.get(r_url, params=params, stream=stream)
+            except requests.exceptions.RequestException as e:
+                if key is not None:
+                    self.key_pool.release(key, None)
+                self._emit("request_end", resource=resource, status=None, bytes=0,
+                           elapsed=time.perf_counter()-started)
+                if attempt < self.max_retries:
+                    if stats is not None:
+                        stats["retries"] += 1
+                    self._emit("retry", resource=resource, status=None, attempt=attempt+1, error=e)
+                    time.sleep(self.retry_backoff * 2**attempt)
+                    attempt += 1
+                    continue
+                self._emit("error", resource=resource, status=None, error=e)
+                raise
+            if key is not None:
+                self.key_pool.release(key, r.status_code)
+            if stream and r.status_code == requests.codes.ok:
+                # The body is read later, request_end is emitted by _stream_end once it is received
+                r.started = started
+            else:
+                self._emit("request_end", resource=resource, status=r.status_code, bytes=len(r.content),
+                           elapsed=time.perf_counter()-started)
+            logger.debug(r.url)
+            if key is not None and r.status_code in BENCH_STATUS and attempt < self.max_retries \
+                    and self.key_pool.available():
+                # Another key is ready, so the request is repeated without backoff
+                if stats is not None:
+                    stats["retries"] += 1
+                self._emit("retry", resource=resource, status=r.status_code, attempt=attempt+1, error=None)
+                attempt += 1
+                continue
+            if r.status_code in RETRY_STATUS and attempt < self.max_retries:
+                logger.warning("Request failed with code {code}, retrying".format(code=r.status_code))
+                if stats is not None:
+                    stats["retries"] += 1
+                self._emit("retry", resource=resource, status=r.status_code, attempt=attempt+1, error=None)
+                time.sleep(self.retry_backoff * 2**attempt)
+                attempt += 1
+                continue
+            return r
+
+    def _iter_pages(self, resource, r_url, payload, stats, profile=None, fields=None, elements=False):
+        """Follows the cursor and yields the documents of every page together
+        with the cursor the page was requested with. Documents are projected
+        on fields right after decoding. With streaming or XML, the documents
+        of a page are an iterator that decodes them while the body is
+        received. With elements, XML documents are yielded as elements.
+        Statistics (pages, numFound, bytes, retries, error) are collected in
+        stats"""
+        # XML pages are always parsed incrementally
+        stream = self.stream or payload.get("format") == "xml"
         prs = True
         while prs is True:
-            r = requests.get(r_url, params=payload)
-            logger.debug(r.url)
+            span = None
+            if self.tracer is not None:
+                span = self.tracer.start_span("bundestag_api.page", attributes={
+                    "bundestag_api.resource": resource,
+                    "bundestag_api.cursor_depth": stats["pages"]})
+            if profile is not None:
+                phase_started = clock()
+            retries = stats["retries"]
+            try:
+                r = self._request(resource, r_url, payload, stats=stats, stream=stream)
+            except Exception as e:
+                if span is not None:
+                    span.record_exception(e)
+                    span.end()
+                raise
+            if profile is not None:
+                profile.add(("page {}".format(stats["pages"]+1), "network"), phase_started)
+            set_attributes(span, {"http.status_code": r.status_code,
+                                  "bundestag_api.retries": stats["retries"]-retries})
+            cursor = payload["cursor"]
+            if r.status_code == requests.codes.ok and stream:
+                page = {"more": False}
+                documents = self._stream_page(resource, r, payload, stats, page, span, fields, elements,
+                                              profile=profile)
+                yield documents, cursor
+                # Documents the caller did not consume are skipped to reach the cursor
+                for _ in documents:
+                    pass
+                prs = page["more"]
+                continue
+            stats["bytes"] += len(r.content)
+            set_attributes(span, {"bundestag_api.bytes": len(r.content)})
+            documents = []
             if r.status_code == requests.codes.ok:
+                if profile is not None:
+                    phase_started = clock()
                 content = r.json()
-                if content["numFound"] == 0:
-                    logging.info("No data was returned.")
-                    data = "No data was returned."
-                    prs = False
-                elif content["numFound"] > 0 and content["numFound"] <= 50:
-                    data.extend(content["documents"])
-                    prs = False
-                elif content["numFound"] > 50:
-                    if payload["cursor"] == content["cursor"]:
-                        prs = False
-                    data.extend(content["documents"])
-                    if num is not None and len(data) >= num:
-                        data = data[0:num]
-                        prs = False
-                    payload["cursor"] = content["cursor"]
-            elif r.status_code == 400:
-                logger.error("A syntax error occured. Code {code}: {message}".format(
-                    code=r.status_code, message=r.reason))
-            elif r.status_code == 401:
-                logger.error("An authorization error occured. Likely an error with you API key. Code {code}: {message}".format(
-                    code=r.status_code, message=r.reason))
-            elif r.status_code == 404:
-                logger.error("The API is not reachable. Code {code}: {message}".format(
-                    code=r.status_code, message=r.reason))
+                if fields is not None and content.get("documents"):
+                    content["documents"] = [project(doc, fields) for doc in content["documents"]]
+                if profile is not None:
+                    profile.add(("page {}".format(stats["pages"]+1), "decode"), phase_started)
+                stats["pages"] += 1
+                stats["numFound"] = content["numFound"]
+                set_attributes(span, {"bundestag_api.numFound": content["numFound"],
+                                      "bundestag_api.documents": len(content.get("documents", []))})
+                self._emit("page", resource=resource, page=stats["pages"], numFound=content["numFound"],
+                           documents=len(content.get("documents", [])), bytes=len(r.content))
+                if content["numFound"] > 0:
+                    documents = content["documents"]
+                prs = self._advance(content, payload)
             else:
-                logger.error("An error occured. Code {code}: {message}".format(
-                    code=r.status_code, message=r.reason))
-        if return_object is True:
-            if resource == "aktivitaet":
-                data = {name["id"]: Aktivitaet(name) for name in data}
-            elif resource == "drucksache":
-                data = {name["id"]: Drucksache(name) for name in data}
-            elif resource == "drucksache-text":
-                data = {name["id"]: Drucksache(name) for name in data}
-            elif resource == "person":
-                data = {name["id"]: Person(name) for name in data}
-            elif resource == "plenarprotokoll":
-                data = {name["id"]: Plenarprotokoll(name) for name in data}
-            elif resource == "plenarprotokoll-text":
-                data = {name["id"]: Plenarprotokoll(name) for name in data}
-            elif resource == "vorgang":
-                data = {name["id"]: Vorgang(name) for name in data}
-            elif resource == "vorgangsposition":
-                data = {name["id"]: Vorgangsposition(name) for name in data}
-        if return_format == "pandas":
-            import pandas as pd
-            data = pd.json_normalize(data)
-        if len(data) == 1 and isinstance(data, dict):
-            tl = list(data.keys())
-            data = data[tl[0]]
-        elif len(data) == 1 and isinstance(data, list):
-            data = data[0]
+                stats["error"] = self._error(resource, r)
+                prs = False
+            if span is not None:
+                span.end()
+            if documents:
+                yield documents, cursor
+
+    def _error(self, resource, r):
+        """Logs and emits a failed response and returns its error message"""
+        if r.status_code == 400:
+            error = "A syntax error occured. Code {code}: {message}".format(
+                code=r.status_code, message=r.reason)
+        elif r.status_code == 401:
+            error = "An authorization error occured. Likely an error with you API key. Code {code}: {message}".format(
+                code=r.status_code, message=r.reason)
+        elif r.status_code == 404:
+            error = "The API is not reachable. Code {code}: {message}".format(
+                code=r.status_code, message=r.reason)
+        else:
+            error = "An error occured. Code {code}: {message}".format(
+                code=r.status_code, message=r.reason)
+        logger.error(error)
+        self._emit("error", resource=resource, status=r.status_code, error=error)
+        return error
+
+    def _stream_end(self, resource, r, size):
+        """Emits request_end of a streamed response with the size of the
+        received body and the time until it was received"""
+        self._emit("request_end", resource=resource, status=r.status_code, bytes=size,
+                   elapsed=time.perf_counter()-r.started)
+
+    def _count(self, resource, r_url, payload):
+        """Requests the first page of a query and returns numFound. Only the
+        head of the page is read, the documents are not received unless
+        numFound follows them"""
+        payload = dict(payload, format="json")
+        r = self._request(resource, r_url, payload, stream=True)
+        decoder = None
+        try:
+            if r.status_code != requests.codes.ok:
+                raise RuntimeError(self._error(resource, r))
+            decoder = PageDecoder(r.iter_content(chunk_size=CHUNK_SIZE))
+            header = decoder.head()
+            if "numFound" not in header:
+                header = decoder.finish()
+        finally:
+            r.close()
+            if decoder is not None:
+                self._stream_end(resource, r, decoder.bytes)
+        return header["numFound"]
+
+    def _advance(self, content, payload):
+        """Moves the cursor to the next page. Returns False after the last page"""
+        if content["numFound"] <= 50:
+            return False
+        if payload["cursor"] == content["cursor"]:
+            return False
+        payload["cursor"] = content["cursor"]
+        return True
+
+    def _stream_page(self, resource, r, payload, stats, page, span, fields, elements=False, profile=None):
+        """Decodes the documents of a page while the body is received. The
+        cursor and the statistics are updated once the page is complete. With
+        a profile, the time spent waiting for the body is recorded as network
+        and the rest of the time spent producing documents as decode"""
+        label = "page {}".format(stats["pages"]+1)
+        chunks = r.iter_content(chunk_size=CHUNK_SIZE)
+        network = [0.0, 0.0]
+        spent = [0.0, 0.0]
+        if profile is not None:
+            chunks = timed(chunks, network)
+        if payload.get("format") == "xml":
+            decoder = XmlPageDecoder(chunks, elements=elements)
+        else:
+            decoder = PageDecoder(chunks)
+        documents = decoder.documents()
+        if profile is not None:
+            documents = timed(documents, spent)
+        count = 0
+        try:
+            for doc in documents:
+                count += 1
+                if fields is None:
+                    yield doc
+                elif elements:
+                    yield project_element(doc, fields)
+                else:
+                    yield project(doc, fields)
+            if profile is not None:
+                phase_started = clock()
+            content = decoder.finish()
+            if profile is not None:
+                now = clock()
+                spent[0] += now[0]-phase_started[0]
+                spent[1] += now[1]-phase_started[1]
+                profile.record((label, "network"), network[0], network[1])
+                profile.record((label, "decode"), spent[0]-network[0], spent[1]-network[1])
+            stats["pages"] += 1
+            stats["numFound"] = content["numFound"]
+            stats["bytes"] += decoder.bytes
+            set_attributes(span, {"bundestag_api.bytes": decoder.bytes,
+                                  "bundestag_api.numFound": content["numFound"],
+                                  "bundestag_api.documents": count})
+            self._emit("page", resource=resource, page=stats["pages"], numFound=content["numFound"],
+                       documents=count, bytes=decoder.bytes)
+            page["more"] = self._advance(content, payload)
+        finally:
+            r.close()
+            self._stream_end(resource, r, decoder.bytes)
+            if span is not None:
+                span.end()
+
+    def _fetch(self, resource, r_url, payload, num, profile=None, fields=None, frames=False,
+               elements=False):
+        """Collects the documents of all pages until num documents are
+        reached. With frames, every page is turned into a typed DataFrame
+        right away, so the documents of only one page are held at a time.
+        Returns the documents (or frames) and a dictionary of statistics"""
+        data = []
+        count = 0
+        stats = {"pages": 0, "numFound": None, "bytes": 0, "retries": 0, "error": None}
+        for documents, cursor in self._iter_pages(resource, r_url, payload, stats, profile=profile,
+                                                  fields=fields, elements=elements):
+            documents = list(documents if num is None else islice(documents, num-count))
+            count += len(documents)
+            if frames:
+                if profile is not None:
+                    phase_started = clock()
+                data.append(page_frame(documents))
+                if profile is not None:
+                    profile.add(("page {}".format(stats["pages"]), "pandas"), phase_started)
+            else:
+                data.extend(documents)
+            if num is not None and count >= num:
+                break
+        if stats["error"] is not None:
+            data = stats["error"]
+        elif stats["numFound"] == 0:
+            logger.info(NO_DATA)
+            data = NO_DATA
+        return data, stats
+
+    def _fetch_objects(self, resource, r_url, payload, num, profile=None, fields=None):
+        """Like _fetch, but every page is handed to the process pool of the
+        connection that constructs the objects while the next page is fetched.
+        Results that fit on one page are constructed in this process. Returns a
+        dictionary of objects in the order of the pages and a dictionary of
+        statistics"""
+        data = {}
+        stats = {"pages": 0, "numFound": None, "bytes": 0, "retries": 0, "error": None}
+        futures = []
+        count = 0
+        try:
+            for documents, cursor in self._iter_pages(resource, r_url, payload, stats, profile=profile,
+                                                      fields=fields):
+                documents = list(documents if num is None else islice(documents, num-count))
+                count += len(documents)
+                # numFound is unknown if a streamed page was not read to its end
+                if stats["numFound"] is None or stats["numFound"] <= 50:
+                    data.update(_build_models(resource, documents))
+                else:
+                    futures.append(self._get_executor().submit(_build_models, resource, documents))
+                if num is not None and count >= num:
+                    break
+            if stats["error"] is not None:
+                return stats["error"], stats
+            if stats["numFound"] == 0:
+                logger.info(NO_DATA)
+                return NO_DATA, stats
+            for future in futures:
+                data.update(future.result())
+        finally:
+            # Pages of a failed or interrupted query are not constructed
+            for future in futures:
+                future.cancel()
+        return data, stats
+
+    def _fan_out(self, resource, subqueries, num, fields=None):
+        """Runs sub-queries concurrently and merges their results newest first
+        without duplicates until num results are collected. Every sub-query
+        fetches up to num documents, and the merge starts once all of them
+        have finished. If a sub-query fails, its error message is returned"""
+        if isinstance(resource, str) is True:
+            resource = resource.lower()
+        sub_fields = None
+        if fields is not None:
+            # The date is needed to merge the results
+            sub_fields = dict(fields, datum=None)
+        with ThreadPoolExecutor(max_workers=min(len(subqueries), MAX_FANOUT)) as executor:
+            futures = [executor.submit(propagate(self.query), resource, return_format="json", num=num,
+                                       fields=sub_fields, **sub)
+                       for sub in subqueries]
+            results = []
+            for future in futures:
+                result = future.result()
+                if is_error(result):
+                    # A failed sub-query would leave gaps in the merged results
+                    return result
+                if isinstance(result, str):
+                    result = []
+                elif isinstance(result, dict):
+                    result = [result]
+                results.append(sorted(result, key=_sort_key, reverse=True))
+        data = []
+        seen = set()
+        for doc in heapq.merge(*results, key=_sort_key, reverse=True):
+            if doc["id"] in seen:
+                continue
+            seen.add(doc["id"])
+            data.append(doc if fields is None else project(doc, fields))
+            if num is not None and len(data) >= num:
+                break
+        if self.tracer is not None:
+            set_attributes(current_span(), {"bundestag_api.resource": resource,
+                                            "bundestag_api.subqueries": len(subqueries),
+                                            "bundestag_api.documents": len(data)})
+        if not data:
+            logger.info(NO_DATA)
+            data = NO_DATA
         return data
 
+    @traced
     def search_procedure(self,
                          return_format="json",
                          num=100,
@@ -363,16 +1152,20 @@ class btaConnection:
                          sachgebiet=None,
                          document_type=None,
                          process_type=None,
-                         title=None,):
+                         title=None,
+                         descriptor_mode="and",
+                         sachgebiet_mode="and",
+                         fields=None,
+                         count=False):
         """
         Searches procedures specified by the parameters
 
         Parameters
         ----------
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         num: int, optional
             Number of maximal results to be returned. Defaults to 100
         fid: int/list, optional
@@ -390,12 +1183,12 @@ class btaConnection:
             Date and time until which updated documents are to be retrieved
         descriptor: str/list, optional
             Keyword that is connected to the entities. Multiple strings can
-            be supplied as a list but they will be joined via AND. An OR-
-            search is not possible         
+            be supplied as a list and will be joined via AND unless
+            descriptor_mode is "or"
         sachgebiet: str/list, optional
             Political field that is connected to the entities. Multiple 
-            strings can be supplied as a list but they will be joined via
-            AND. An OR-search is not possible
+            strings can be supplied as a list and will be joined via AND
+            unless sachgebiet_mode is "or"
         document_type: str, optional
             The type of document to be returned.
         process_type: str, optional
@@ -404,6 +1197,19 @@ class btaConnection:
             Keyword that can be found in the title of documents. Multiple 
             strings can be supplied as a list and will be joined via
             an OR-search.
+        descriptor_mode: str, optional
+            "and" (default) or "or". With "or" one search per descriptor is
+            run concurrently and the results are merged
+        sachgebiet_mode: str, optional
+            "and" (default) or "or". With "or" one search per political field
+            is run concurrently and the results are merged
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
+        count: bool, optional
+            If True, only the number of matching entities is returned. One
+            request is made and no documents are received
 
         Returns
         -------
@@ -423,14 +1229,20 @@ class btaConnection:
                           sachgebiet=sachgebiet,
                           document_type=document_type,
                           process_type=process_type,
-                          title=title)
+                          title=title,
+                          descriptor_mode=descriptor_mode,
+                          sachgebiet_mode=sachgebiet_mode,
+                          fields=fields,
+                          count=count)
         return data
 
+    @traced
     def get_procedure(self,
                       btid=None,
                       return_format="json",
                       documentID=None,
-                      plenaryprotocolID=None):
+                      plenaryprotocolID=None,
+                      fields=None):
         """
         Retrieves procedures specified by IDs
 
@@ -440,15 +1252,19 @@ class btaConnection:
             ID of a procedure entity. Can be a list to retrieve more than
             one entity
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         documentID: int, optional
             Returns procedure related to that documentID
         plenaryprotocolID: int, optional
             Entity ID of a plenary protocol. Can be used to select activities,
             procedures and procedure positions that are connected to the
             protocol
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
 
         Returns
         -------
@@ -463,9 +1279,11 @@ class btaConnection:
                               fid=btid,
                               return_format=return_format,
                               documentID=documentID,
-                              plenaryprotocolID=plenaryprotocolID)
+                              plenaryprotocolID=plenaryprotocolID,
+                              fields=fields)
             return data
 
+    @traced
     def search_procedureposition(self,
                                  return_format="json",
                                  num=100,
@@ -476,16 +1294,18 @@ class btaConnection:
                                  updated_until=None,
                                  document_type=None,
                                  processID=None,
-                                 title=None,):
+                                 title=None,
+                                 fields=None,
+                                 count=False):
         """
         Searches procedure positions specified by the parameters
 
         Parameters
         ----------
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         num: int, optional
             Number of maximal results to be returned. Defaults to 100
         fid: int/list, optional
@@ -507,6 +1327,13 @@ class btaConnection:
             Keyword that can be found in the title of documents. Multiple 
             strings can be supplied as a list and will be joined via
             an OR-search.
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
+        count: bool, optional
+            If True, only the number of matching entities is returned. One
+            request is made and no documents are received
 
         Returns
         -------
@@ -524,15 +1351,19 @@ class btaConnection:
                           updated_until=updated_until,
                           document_type=document_type,
                           processID=processID,
-                          title=title)
+                          title=title,
+                          fields=fields,
+                          count=count)
         return data
 
+    @traced
     def get_procedureposition(self,
                               btid,
                               return_format="json",
                               documentID=None,
                               processID=None,
-                              plenaryprotocolID=None):
+                              plenaryprotocolID=None,
+                              fields=None):
         """
         Retrieves procedure positions specified by IDs
 
@@ -542,9 +1373,9 @@ class btaConnection:
             ID of a procedure position entity. Can be a list to retrieve more than
             one entity
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         documentID: int, optional
             Returns procedure positions related to that documentID
         processID: int, optional
@@ -553,6 +1384,10 @@ class btaConnection:
             Entity ID of a plenary protocol. Can be used to select activities,
             procedures and procedure positions that are connected to the
             protocol
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
 
         Returns
         -------
@@ -568,9 +1403,11 @@ class btaConnection:
                               return_format=return_format,
                               documentID=documentID,
                               processID=processID,
-                              plenaryprotocolID=plenaryprotocolID)
+                              plenaryprotocolID=plenaryprotocolID,
+                              fields=fields)
             return data
 
+    @traced
     def search_document(self,
                         return_format="json",
                         num=100,
@@ -582,16 +1419,18 @@ class btaConnection:
                         updated_since=None,
                         updated_until=None,
                         document_type=None,
-                        title=None,):
+                        title=None,
+                        fields=None,
+                        count=False):
         """
         Searches documents specified by the parameters
 
         Parameters
         ----------
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         num: int, optional
             Number of maximal results to be returned. Defaults to 100
         fid: int/list, optional
@@ -616,6 +1455,13 @@ class btaConnection:
             Keyword that can be found in the title of documents. Multiple 
             strings can be supplied as a list and will be joined via
             an OR-search.
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
+        count: bool, optional
+            If True, only the number of matching entities is returned. One
+            request is made and no documents are received
 
         Returns
         -------
@@ -640,13 +1486,17 @@ class btaConnection:
                           updated_since=updated_since,
                           updated_until=updated_until,
                           document_type=document_type,
-                          title=title)
+                          title=title,
+                          fields=fields,
+                          count=count)
         return data
 
+    @traced
     def get_document(self,
                      btid,
                      return_format="json",
-                     fulltext=False):
+                     fulltext=False,
+                     fields=None):
         """
         Retrieves documents specified by IDs
 
@@ -656,11 +1506,15 @@ class btaConnection:
             ID of a document entity. Can be a list to retrieve more than
             one entity
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         fulltext: boolean
             Whether the fulltext (if available) should be requested or not. Default is False    
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
 
         Returns
         -------
@@ -677,29 +1531,40 @@ class btaConnection:
 
         data = self.query(resource=resource,
                           fid=btid,
-                          return_format=return_format)
+                          return_format=return_format,
+                          fields=fields)
         return data
 
+    @traced
     def search_person(self,
                       return_format="json",
                       num=100,
                       updated_since=None,
-                      updated_until=None,):
+                      updated_until=None,
+                      fields=None,
+                      count=False):
         """
         Searches persons specified by the parameters
 
         Parameters
         ----------
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         num: int, optional
             Number of maximal results to be returned. Defaults to 100
         updated_since: str, optional
             Date and time after which updated documents are to be retrieved
         updated_until: str, optional
             Date and time until which updated documents are to be retrieved
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
+        count: bool, optional
+            If True, only the number of matching entities is returned. One
+            request is made and no documents are received
 
         Returns
         -------
@@ -711,12 +1576,16 @@ class btaConnection:
                           return_format=return_format,
                           num=num,
                           updated_since=updated_since,
-                          updated_until=updated_until,)
+                          updated_until=updated_until,
+                          fields=fields,
+                          count=count)
         return data
 
+    @traced
     def get_person(self,
                    btid,
-                   return_format="json"):
+                   return_format="json",
+                   fields=None):
         """
         Retrieves persons specified by IDs
 
@@ -726,9 +1595,13 @@ class btaConnection:
             ID of a person entity. Can be a list to retrieve more than
             one entity
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
 
         Returns
         -------
@@ -738,12 +1611,16 @@ class btaConnection:
 
         data = self.query(resource="person",
                           fid=btid,
-                          return_format=return_format)
+                          return_format=return_format,
+                          fields=fields)
         return data
 
+    @traced
     def search_plenaryprotocol(self,
                                return_format="json",
                                num=100,
+                               fields=None,
+                               count=False,
                                **kwargs):
         """
         Searches plenary protocols specified by the parameters
@@ -751,9 +1628,9 @@ class btaConnection:
         Parameters
         ----------
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         num: int, optional
             Number of maximal results to be returned. Defaults to 100
         date_start: str, optional
@@ -770,6 +1647,13 @@ class btaConnection:
             Date and time after which updated documents are to be retrieved
         updated_until: str, optional
             Date and time until which updated documents are to be retrieved
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
+        count: bool, optional
+            If True, only the number of matching entities is returned. One
+            request is made and no documents are received
 
         Returns
         -------
@@ -798,14 +1682,18 @@ class btaConnection:
                           institution=institution,
                           num=num,
                           updated_since=updated_since,
-                          updated_until=updated_until,)
+                          updated_until=updated_until,
+                          fields=fields,
+                          count=count)
 
         return data
 
+    @traced
     def get_plenaryprotocol(self,
                             btid,
                             return_format="json",
-                            fulltext=False):
+                            fulltext=False,
+                            fields=None):
         """
         Retrieves plenary protocols specified by IDs
 
@@ -815,11 +1703,15 @@ class btaConnection:
             ID of a plenary protocol entity. Can be a list to retrieve more than
             one entity
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         fulltext: boolean
             Whether the fulltext (if available) should be requested or not. Default is false
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
 
         Returns
         -------
@@ -836,9 +1728,11 @@ class btaConnection:
 
         data = self.query(resource=resource,
                           fid=btid,
-                          return_format=return_format)
+                          return_format=return_format,
+                          fields=fields)
         return data
 
+    @traced
     def search_activity(self,
                         return_format="json",
                         num=100,
@@ -847,16 +1741,19 @@ class btaConnection:
                         institution=None,
                         updated_since=None,
                         updated_until=None,
-                        descriptor=None,):
+                        descriptor=None,
+                        descriptor_mode="and",
+                        fields=None,
+                        count=False):
         """
         Searches activities specified by the parameters
 
         Parameters
         ----------
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         num: int, optional
             Number of maximal results to be returned. Defaults to 100
         date_start: str, optional
@@ -873,8 +1770,18 @@ class btaConnection:
             Date and time until which updated documents are to be retrieved
         descriptor: str/list, optional
             Keyword that is connected to the entities. Multiple strings can
-            be supplied as a list but they will be joined via AND. An OR-
-            search is not possible         
+            be supplied as a list and will be joined via AND unless
+            descriptor_mode is "or"
+        descriptor_mode: str, optional
+            "and" (default) or "or". With "or" one search per descriptor is
+            run concurrently and the results are merged
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
+        count: bool, optional
+            If True, only the number of matching entities is returned. One
+            request is made and no documents are received
 
         Returns
         -------
@@ -890,15 +1797,20 @@ class btaConnection:
                           num=num,
                           updated_since=updated_since,
                           updated_until=updated_until,
-                          descriptor=descriptor)
+                          descriptor=descriptor,
+                          descriptor_mode=descriptor_mode,
+                          fields=fields,
+                          count=count)
 
         return data
 
+    @traced
     def get_activity(self,
                      btid=None,
                      return_format="json",
                      documentID=None,
-                     plenaryprotocolID=None):
+                     plenaryprotocolID=None,
+                     fields=None):
         """
         Retrieves activities specified by IDs
 
@@ -908,9 +1820,9 @@ class btaConnection:
             ID of an activity entity. Can be a list to retrieve more than
             one entity
         return_format: str, optional
-            Return format of the data. Defaults to json. XML not implemented
-            yet. Other option is "object" which will return results as class
-            objects
+            Return format of the data. Defaults to json. Other options are
+            "object" which will return results as class objects, "pandas" and
+            "xml" which returns the documents as XML elements
         documentID: int, optional
             Entity ID of a document. Can be used to select activities,
             procedures and procedure positions that are connected to the
@@ -919,6 +1831,10 @@ class btaConnection:
             Entity ID of a plenary protocol. Can be used to select activities,
             procedures and procedure positions that are connected to the
             protocol
+        fields: list, optional
+            Fields to keep of every document, e.g. ["titel", "fundstelle.pdf_url"].
+            The id is always kept. Other fields are dropped as soon as a page
+            is decoded
         Returns
         -------
         data: list
@@ -932,7 +1848,8 @@ class btaConnection:
                               fid=btid,
                               return_format=return_format,
                               documentID=documentID,
-                              plenaryprotocolID=plenaryprotocolID)
+                              plenaryprotocolID=plenaryprotocolID,
+                              fields=fields)
             return data
 
     def list_methods(self):
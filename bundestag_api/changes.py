@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+A change feed that turns repeated results of the API into created, updated
+and deleted events
+"""
+
+import os
+import json
+import hashlib
+import logging
+from .local import _as_documents
+from .utils import is_error
+
+logger = logging.getLogger("bundestag_api")
+
+EVENT_TYPES = ["created", "updated", "deleted"]
+
+
+def field_hash(value):
+    """Returns a short hash of a field value that does not depend on the
+    order of dictionary keys"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class ChangeEvent:
+    """This class holds a change of one entity. changed lists the fields that
+    were added, changed or removed by an update"""
+
+    def __init__(self, event_type, resource, btid, changed=None, document=None):
+        self.type = event_type
+        self.resource = resource
+        self.btid = btid
+        self.changed = changed or []
+        self.document = document
+
+    def to_dict(self):
+        return {"type": self.type,
+                "resource": self.resource,
+                "id": self.btid,
+                "changed": self.changed,
+                "document": self.document}
+
+    def __str__(self):
+        if self.type == "updated":
+            return "{} {} {}: {}".format(self.type, self.resource, self.btid, ", ".join(self.changed))
+        return "{} {} {}".format(self.type, self.resource, self.btid)
+
+    def __repr__(self):
+        return "ChangeEvent: {} {} {}".format(self.type, self.resource, self.btid)
+
+
+class ChangeFeed:
+    """This class compares incoming documents with the versions seen before.
+    Only the hashes of the fields are kept. Changes are passed as ChangeEvent
+    objects to subscribers and appended to an optional JSONL log
+
+    Methods
+    -------
+    subscribe(callback, resource=None, types=None):
+        Registers a callback for events
+    unsubscribe(callback):
+        Removes a callback
+    process(resource, documents, complete=False):
+        Compares documents with the seen versions and emits the changes
+    delete(resource, btids):
+        Emits deleted events for entities
+    poll(connection, resource, **params):
+        Fetches the entities updated since the last poll and processes them
+    save():
+        Writes the seen versions to the state file
+    """
+
+    def __init__(self, state=None, log=None, ignore=("aktualisiert",)):
+        self.state_path = state
+        self.log = log
+        self.ignore = set(ignore)
+        self.subscribers = []
+        self.seen = {}
+        self.updated = {}
+        if state is not None and os.path.exists(state):
+            with open(state, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.seen = saved["seen"]
+            self.updated = saved["updated"]
+
+    def __len__(self):
+        return sum(len(v) for v in self.seen.values())
+
+    def __str__(self):
+        return "ChangeFeed: {} entities".format(len(self))
+
+    def __repr__(self):
+        return "ChangeFeed: {} entities".format(len(self))
+
+    def subscribe(self, callback, resource=None, types=None):
+        """Registers a callback that is called with every matching ChangeEvent
+
+        Parameters
+        ----------
+        callback: callable
+            The function to be called
+        resource: str, optional
+            Only events of this resource. Defaults to all resources
+        types: list, optional
+            Only events of these types, e.g. ["updated"]. Defaults to all
+        """
+        if types is not None and any(t not in EVENT_TYPES for t in types):
+            raise ValueError("types must be of "+", ".join(EVENT_TYPES))
+        self.subscribers.append((callback, resource, types))
+
+    def unsubscribe(self, callback):
+        self.subscribers = [s for s in self.subscribers if s[0] is not callback]
+
+    def _emit(self, events):
+        if not events:
+            return
+        for event in events:
+            for callback, resource, types in self.subscribers:
+                if (resource is None or resource == event.resource) and \
+                        (types is None or event.type in types):
+                    callback(event)
+        if self.log is not None:
+            with open(self.log, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event.to_dict(), ensure_ascii=False)+"\n")
+
+    def hashes(self, doc):
+        return {field: field_hash(val) for field, val in doc.items() if field not in self.ignore}
+
+    def process(self, resource, documents, complete=False):
+        """Compares documents with the versions seen before
+
+        Parameters
+        ----------
+        resource: str
+            The resource type of the documents
+        documents: list/dict
+            Documents as returned by btaConnection.query
+        complete: bool, optional
+            If True, the documents are all entities of the resource and
+            entities seen before but missing now are deleted
+
+        Returns
+        -------
+        data: list
+            a list of ChangeEvent objects
+        """
+        seen = self.seen.setdefault(resource, {})
+        events = []
+        ids = set()
+        for doc in _as_documents(documents):
+            btid = str(doc["id"])
+            ids.add(btid)
+            hashes = self.hashes(doc)
+            previous = seen.get(btid)
+            if previous is None:
+                events.append(ChangeEvent("created", resource, btid, sorted(hashes), doc))
+            elif previous != hashes:
+                changed = sorted(field for field in set(previous) | set(hashes)
+                                 if previous.get(field) != hashes.get(field))
+                events.append(ChangeEvent("updated", resource, btid, changed, doc))
+            seen[btid] = hashes
+            if doc.get("aktualisiert") and doc["aktualisiert"] > self.updated.get(resource, ""):
+                self.updated[resource] = doc["aktualisiert"]
+        if complete:
+            events.extend(self._delete(resource, [btid for btid in seen if btid not in ids]))
+        self._emit(events)
+        return events
+
+    def _delete(self, resource, btids):
+        seen = self.seen.setdefault(resource, {})
+        events = []
+        for btid in btids:
+            if seen.pop(str(btid), None) is not None:
+                events.append(ChangeEvent("deleted", resource, str(btid)))
+        return events
+
+    def delete(self, resource, btids):
+        """Emits deleted events for entities that were seen before
+
+        Returns
+        -------
+        data: list
+            a list of ChangeEvent objects
+        """
+        events = self._delete(resource, btids)
+        self._emit(events)
+        return events
+
+    def poll(self, connection, resource, **params):
+        """Fetches the entities of a resource updated since the last poll and
+        processes them. The first poll fetches all entities matching params
+
+        Parameters
+        ----------
+        connection: btaConnection
+            The connection to use
+        resource: str
+            The resource type to be queried
+        **params:
+            Further filters of query()
+
+        Returns
+        -------
+        data: list
+            a list of ChangeEvent objects
+        """
+        since = self.updated.get(resource)
+        if since is not None:
+            # The API expects times without offset
+            params["updated_since"] = since[:19]
+        data = connection.query(resource, num=10**9, **params)
+        if is_error(data):
+            raise RuntimeError(data)
+        events = self.process(resource, data)
+        self.save()
+        return events
+
+    def save(self):
+        if self.state_path is None:
+            return
+        with open(self.state_path+".tmp", "w", encoding="utf-8") as f:
+            json.dump({"seen": self.seen, "updated": self.updated}, f)
+        os.replace(self.state_path+".tmp", self.state_path)
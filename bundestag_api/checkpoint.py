@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints of long paginations so that an interrupted query resumes at the
+page it stopped at
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger("bundestag_api")
+
+
+class Checkpoint:
+    """This class persists the position of a pagination in a JSON file. The
+    state holds the resource, the canonical filters, the cursor of the current
+    page, the number of documents of that page already delivered and the
+    number of documents delivered in total
+
+    Methods
+    -------
+    load(key):
+        Returns the saved state if it belongs to the query with this key
+    save(state):
+        Writes the state atomically
+    clear():
+        Removes the checkpoint file
+    """
+
+    def __init__(self, path, every=10):
+        if not isinstance(every, int) or every <= 0:
+            raise ValueError("every must be an integer larger than zero")
+        self.path = path
+        self.every = every
+
+    def load(self, key):
+        """Returns the saved state of a query
+
+        Parameters
+        ----------
+        key: str
+            The canonical key of the query
+
+        Returns
+        -------
+        data: dict
+            the state or None if there is no checkpoint of this query
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("key") != key:
+            logger.warning("Checkpoint {} belongs to another query and is ignored".format(self.path))
+            return None
+        return state
+
+    def save(self, state):
+        with open(self.path+".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(self.path+".tmp", self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __str__(self):
+        return "Checkpoint: "+str(self.path)
+
+    def __repr__(self):
+        return "Checkpoint: "+str(self.path)
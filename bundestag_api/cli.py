@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface of bundestag_api
+
+Example:
+    bundestag-api harvest drucksache --date-start 2022-01-01 --date-end 2022-12-31
+        --output drucksachen.jsonl --concurrency 4 --rate-limit 5 institution=BT
+
+    bundestag-api submit queue.db vorgang --date-start 2021-10-26 --date-end 2025-03-24
+        --split descriptor descriptor=Pflege,Gesundheit
+    bundestag-api work queue.db --processes 8
+    bundestag-api export queue.db --output vorgaenge.jsonl
+
+    bundestag-api pdf drucksache --date-start 2022-01-01 --date-end 2022-01-31 --output pdfs
+"""
+
+import sys
+import json
+import argparse
+import logging
+from .bta_wrapper import btaConnection
+from .harvest import Harvester, OUTPUT_FORMATS
+from .keys import KeyPool
+from .pdf import PdfFetcher, PDF_RESOURCES
+from .workqueue import WorkQueue, plan_tasks, run_workers
+from .utils import parse_args_to_dict, RESOURCETYPES
+
+INT_FILTERS = ["documentID", "plenaryprotocolID", "processID"]
+LIST_FILTERS = ["fid", "descriptor", "sachgebiet", "title"]
+
+
+def parse_filters(args):
+    """Turns key=value arguments into query parameters. Values of list
+    parameters can be separated by commas"""
+    filters = parse_args_to_dict(args)
+    for key in list(filters):
+        if key in INT_FILTERS:
+            filters[key] = int(filters[key])
+        elif key in LIST_FILTERS and "," in filters[key]:
+            filters[key] = [v.strip() for v in filters[key].split(",")]
+    return filters
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="bundestag-api",
+                                     description="Command line tools for the Bundestag API")
+    parser.add_argument("--apikey", default=None,
+                        help="Personal API key. Several keys can be separated by commas")
+    parser.add_argument("--key-budget", type=int, default=None,
+                        help="Maximal requests per key and hour when several keys are given")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    subparsers = parser.add_subparsers(dest="command")
+
+    harvest = subparsers.add_parser(
+        "harvest", help="Download all documents of a resource",
+        description="Download all documents of a resource. Further filters of query() can be "
+                    "appended as key=value, e.g. institution=BT descriptor=Pflege,Gesundheit")
+    harvest.add_argument("resource", choices=RESOURCETYPES)
+    harvest.add_argument("--date-start", default=None, help="YYYY-MM-DD")
+    harvest.add_argument("--date-end", default=None, help="YYYY-MM-DD")
+    harvest.add_argument("--updated-since", default=None, help="YYYY-MM-DDTHH:MM:SS")
+    harvest.add_argument("--updated-until", default=None, help="YYYY-MM-DDTHH:MM:SS")
+    harvest.add_argument("--window-days", type=int, default=30,
+                         help="Days per date window. Windows are fetched concurrently")
+    harvest.add_argument("--target-size", type=int, default=None,
+                         help="Plan windows of at most this many documents instead of --window-days")
+    harvest.add_argument("--concurrency", type=int, default=4)
+    harvest.add_argument("--rate-limit", type=float, default=None, help="Maximal requests per second")
+    harvest.add_argument("--output", "-o", required=True,
+                         help="JSONL file, Parquet directory or local store directory")
+    harvest.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="jsonl")
+    harvest.add_argument("--state", default=None,
+                         help="State file for resuming. Defaults to a file next to the output")
+    harvest.add_argument("--quiet", "-q", action="store_true", help="Do not show progress")
+    harvest.add_argument("--no-dedup", action="store_true",
+                         help="Do not skip documents that were already written")
+
+    submit = subparsers.add_parser(
+        "submit", help="Add the tasks of a harvest to a work queue",
+        description="Split a harvest into tasks of one date window and one filter set and add "
+                    "them to a work queue. Tasks that are already queued are skipped")
+    submit.add_argument("queue", help="Path of the queue database")
+    submit.add_argument("resource", choices=RESOURCETYPES)
+    submit.add_argument("--date-start", default=None, help="YYYY-MM-DD")
+    submit.add_argument("--date-end", default=None, help="YYYY-MM-DD")
+    submit.add_argument("--window-days", type=int, default=30)
+    submit.add_argument("--target-size", type=int, default=None,
+                        help="Plan windows of at most this many documents instead of --window-days")
+    submit.add_argument("--split", default=None, choices=LIST_FILTERS,
+                        help="List filter whose values become separate filter sets")
+
+    work = subparsers.add_parser("work", help="Run worker processes on a work queue")
+    work.add_argument("queue", help="Path of the queue database")
+    work.add_argument("--processes", type=int, default=4)
+    work.add_argument("--rate-limit", type=float, default=None,
+                      help="Maximal requests per second of each process")
+    work.add_argument("--lease-seconds", type=int, default=600)
+    work.add_argument("--no-wal", action="store_true",
+                      help="Do not use write-ahead logging, e.g. on network file systems")
+
+    status = subparsers.add_parser("status", help="Show the state of a work queue")
+    status.add_argument("queue", help="Path of the queue database")
+
+    export = subparsers.add_parser("export", help="Write the documents of a work queue")
+    export.add_argument("queue", help="Path of the queue database")
+    export.add_argument("--output", "-o", required=True)
+    export.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="jsonl")
+
+    pdf = subparsers.add_parser(
+        "pdf", help="Download the PDF files of documents or plenary protocols",
+        description="Download the PDF files of all documents or plenary protocols matching the "
+                    "filters. Files already in the output directory are skipped")
+    pdf.add_argument("resource", choices=PDF_RESOURCES)
+    pdf.add_argument("--date-start", default=None, help="YYYY-MM-DD")
+    pdf.add_argument("--date-end", default=None, help="YYYY-MM-DD")
+    pdf.add_argument("--output", "-o", required=True, help="Directory of the files and the manifest")
+    pdf.add_argument("--concurrency", type=int, default=4)
+    pdf.add_argument("--rate-limit", type=float, default=None,
+                     help="Maximal requests per second to the API and to the file server each")
+    return parser
+
+
+def apikey_argument(args):
+    if args.apikey is not None and "," in args.apikey:
+        return KeyPool([k.strip() for k in args.apikey.split(",")], budget=args.key_budget)
+    return args.apikey
+
+
+def run_harvest(args, filters):
+    bta = btaConnection(apikey=apikey_argument(args), rate_limit=args.rate_limit)
+    if args.updated_since is not None:
+        filters["updated_since"] = args.updated_since
+    if args.updated_until is not None:
+        filters["updated_until"] = args.updated_until
+    harvester = Harvester(bta, args.resource, args.output,
+                          output_format=args.output_format,
+                          date_start=args.date_start,
+                          date_end=args.date_end,
+                          window_days=args.window_days,
+                          concurrency=args.concurrency,
+                          state=args.state,
+                          progress=not args.quiet,
+                          dedup=not args.no_dedup,
+                          target_size=args.target_size,
+                          **filters)
+    summary = harvester.run()
+    sys.stderr.write("Harvested {records} records of {resource} in {seconds:.1f}s "
+                     "({records_per_second:.1f} records/s, {requests} requests, {bytes} bytes)\n".format(**summary))
+    print(json.dumps(summary))
+    return 0
+
+
+def run_pdf(args, filters):
+    bta = btaConnection(apikey=apikey_argument(args), rate_limit=args.rate_limit)
+    documents = bta.iter_query(args.resource, date_start=args.date_start, date_end=args.date_end,
+                               fields=["fundstelle.pdf_url"], **filters)
+    fetcher = PdfFetcher(args.output, connection=bta, concurrency=args.concurrency,
+                         rate_limit=args.rate_limit)
+    summary = fetcher.fetch(list(documents), resource=args.resource)
+    del summary["paths"]
+    sys.stderr.write("Downloaded {downloaded} files ({bytes} bytes), skipped {skipped}, "
+                     "{failed} failed, {missing} without PDF in {seconds:.1f}s\n".format(**summary))
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+
+def run_submit(args, filters):
+    filter_sets = [filters]
+    if args.split is not None and args.split in filters:
+        values = filters[args.split] if isinstance(filters[args.split], list) else [filters[args.split]]
+        filter_sets = [dict(filters, **{args.split: val}) for val in values]
+    connection = None
+    if args.target_size is not None:
+        connection = btaConnection(apikey=apikey_argument(args))
+    tasks = plan_tasks(args.resource, args.date_start, args.date_end, args.window_days, filter_sets,
+                       connection=connection, target_size=args.target_size)
+    queue = WorkQueue(args.queue)
+    try:
+        added = queue.submit(tasks)
+        print(json.dumps(dict(queue.status(), added=added)))
+    finally:
+        queue.close()
+    return 0
+
+
+def run_queue(args):
+    if args.command == "work":
+        apikey = args.apikey
+        if apikey is not None and "," in apikey:
+            apikey = [k.strip() for k in apikey.split(",")]
+        run_workers(args.queue, processes=args.processes, apikey=apikey, key_budget=args.key_budget,
+                    rate_limit=args.rate_limit, lease_seconds=args.lease_seconds, wal=not args.no_wal)
+    queue = WorkQueue(args.queue, wal=not getattr(args, "no_wal", False))
+    try:
+        if args.command == "export":
+            count = queue.export(args.output, args.output_format)
+            sys.stderr.write("Exported {} documents\n".format(count))
+        print(json.dumps(queue.status()))
+        failed = queue.status()["failed"]
+    finally:
+        queue.close()
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+    unknown = [a for a in extra if "=" not in a]
+    if unknown:
+        parser.error("unrecognized arguments: "+" ".join(unknown))
+    filters = parse_filters(extra)
+    if args.command == "harvest":
+        return run_harvest(args, filters)
+    if args.command == "submit":
+        return run_submit(args, filters)
+    if args.command in ["work", "status", "export"]:
+        return run_queue(args)
+    if args.command == "pdf":
+        return run_pdf(args, filters)
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Typed DataFrames of API pages. Every page becomes a chunk with dates,
+integer IDs and categoricals, and chunks are concatenated without losing
+their types. Requires pandas
+"""
+
+import json
+from .utils import NUMBER_FIELDS
+
+# Fields are matched by the last part of their column name, so e.g.
+# "fundstelle.dokumentart" is a categorical as well
+DATE_FIELDS = ["datum"]
+DATETIME_FIELDS = ["aktualisiert"]
+INT_FIELDS = ["id"]+NUMBER_FIELDS
+CATEGORY_FIELDS = ["typ", "dokumentart", "drucksachetyp", "zuordnung", "herausgeber",
+                   "vorgangstyp", "vorgangsposition", "beratungsstand", "aktivitaetsart"]
+LIST_HANDLING = ["keep", "json"]
+
+
+def _field(column):
+    return column.rsplit(".", 1)[-1]
+
+
+def _is_int_field(column):
+    name = _field(column)
+    return name in INT_FIELDS or name.endswith("_id")
+
+
+def _is_list_column(values):
+    for val in values:
+        if isinstance(val, list):
+            return True
+    return False
+
+
+def type_frame(frame, lists="keep"):
+    """Converts the columns of a normalized page to their types in place.
+    Dates become datetime64, IDs int64 (Int64 if some are missing), repeated
+    strings categoricals. Nested lists (e.g. deskriptor, vorgangsbezug) are
+    kept as lists with [] for missing values or, with lists="json", turned
+    into JSON strings
+
+    Returns
+    -------
+    data: DataFrame
+        the typed frame
+    """
+    import pandas as pd
+    if lists not in LIST_HANDLING:
+        raise ValueError("lists must be one of "+", ".join(LIST_HANDLING))
+    for column in frame.columns:
+        name = _field(column)
+        values = frame[column]
+        if name in DATE_FIELDS:
+            frame[column] = pd.to_datetime(values, format="%Y-%m-%d", errors="coerce")
+        elif name in DATETIME_FIELDS:
+            # Times carry different offsets (summer time), so they are stored in UTC
+            frame[column] = pd.to_datetime(values, utc=True, errors="coerce")
+        elif name in CATEGORY_FIELDS and not _is_list_column(values):
+            frame[column] = values.astype("category")
+        elif _is_int_field(column) and not _is_list_column(values):
+            numbers = pd.to_numeric(values, errors="coerce")
+            if numbers.isna().sum() > values.isna().sum():
+                # Not every value is an integer, so the column is left as it is
+                continue
+            frame[column] = numbers.astype("Int64" if numbers.isna().any() else "int64")
+        elif values.dtype == object and _is_list_column(values):
+            if lists == "json":
+                frame[column] = [json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else None
+                                 for v in values]
+            else:
+                frame[column] = [v if isinstance(v, list) else [] for v in values]
+    return frame
+
+
+def page_frame(documents, lists="keep"):
+    """Turns the documents of a page into a typed DataFrame
+
+    Parameters
+    ----------
+    documents: list
+        a list of dictionaries as returned by the API
+    lists: str, optional
+        "keep" (default) keeps nested lists as lists, "json" stores them as
+        JSON strings
+
+    Returns
+    -------
+    data: DataFrame
+        one row per document with nested dictionaries flattened into
+        columns like "fundstelle.pdf_url"
+    """
+    import pandas as pd
+    return type_frame(pd.json_normalize(documents), lists=lists)
+
+
+def _missing(reference, index):
+    """Returns a column of missing values with the type of reference"""
+    import pandas as pd
+    length = len(index)
+    if isinstance(reference.dtype, pd.CategoricalDtype):
+        values = pd.Categorical([None]*length, categories=reference.cat.categories)
+    elif reference.dtype == "int64":
+        values = pd.array([None]*length, dtype="Int64")
+    elif reference.dtype == object and _is_list_column(reference):
+        return pd.Series([[] for _ in range(length)], index=index, dtype=object)
+    else:
+        return pd.Series([None]*length, index=index, dtype=reference.dtype)
+    return pd.Series(values, index=index)
+
+
+def concat_frames(frames):
+    """Concatenates typed page frames. Columns missing in some pages are
+    added with the right type and categoricals are unified first, so the
+    result keeps the types of the pages instead of falling back to object
+
+    Parameters
+    ----------
+    frames: list
+        DataFrames as returned by page_frame
+
+    Returns
+    -------
+    data: DataFrame
+        all rows with a new index
+    """
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+    frames = [frame for frame in frames if len(frame) > 0]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for frame in frames:
+        for column in frame.columns:
+            columns.setdefault(column, frame[column])
+    categories = {}
+    for column, reference in columns.items():
+        if isinstance(reference.dtype, pd.CategoricalDtype):
+            categories[column] = union_categoricals(
+                [frame[column] for frame in frames
+                 if column in frame.columns and isinstance(frame[column].dtype, pd.CategoricalDtype)]
+            ).categories
+    aligned = []
+    for frame in frames:
+        missing = {column: _missing(reference, frame.index)
+                   for column, reference in columns.items() if column not in frame.columns}
+        if missing:
+            frame = frame.assign(**missing)
+        for column, cats in categories.items():
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].cat.set_categories(cats)
+        aligned.append(frame[list(columns)])
+    return pd.concat(aligned, ignore_index=True)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk harvesting of a resource over date windows
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .local import LocalCorpus
+from .idset import IdSet
+from .keys import mask
+from .metrics import Metrics
+from .utils import canonical_key
+
+logger = logging.getLogger("bundestag_api")
+
+OUTPUT_FORMATS = ["jsonl", "parquet", "store"]
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def split_dates(date_start, date_end, window_days):
+    """Splits a date range into consecutive windows of window_days days
+
+    Returns
+    -------
+    data: list
+        a list of (start, end) tuples of "YYYY-MM-DD" strings
+    """
+    start = datetime.strptime(date_start, DATE_FORMAT).date()
+    end = datetime.strptime(date_end, DATE_FORMAT).date()
+    windows = []
+    while start <= end:
+        w_end = min(start + timedelta(days=window_days-1), end)
+        windows.append((start.strftime(DATE_FORMAT), w_end.strftime(DATE_FORMAT)))
+        start = w_end + timedelta(days=1)
+    return windows
+
+
+def bisect_window(window):
+    """Splits a window of at least two days into two halves"""
+    start = datetime.strptime(window[0], DATE_FORMAT).date()
+    end = datetime.strptime(window[1], DATE_FORMAT).date()
+    middle = start + timedelta(days=((end-start).days+1)//2-1)
+    return [(start.strftime(DATE_FORMAT), middle.strftime(DATE_FORMAT)),
+            ((middle+timedelta(days=1)).strftime(DATE_FORMAT), end.strftime(DATE_FORMAT))]
+
+
+def plan_windows(connection, resource, date_start, date_end, target_size, concurrency=4, **filters):
+    """Splits a date range into windows of at most target_size documents.
+    The number of documents of a window is probed with one request, and
+    windows above target_size are bisected until they fit or are one day
+    long. Probes of one level run concurrently
+
+    Parameters
+    ----------
+    connection: btaConnection
+        The connection to probe with
+    resource: str
+        The resource type to be harvested
+    date_start, date_end: str
+        The date range as "YYYY-MM-DD"
+    target_size: int
+        Maximal number of documents per window
+    concurrency: int, optional
+        Number of concurrent probes
+    **filters:
+        Further filters of query()
+
+    Returns
+    -------
+    data: list
+        a list of (start, end, count) tuples, largest windows first, so that
+        they are scheduled before the small ones. Empty windows are left out
+    """
+    if not isinstance(target_size, int) or target_size <= 0:
+        raise ValueError("target_size must be an integer larger than zero")
+    pending = [(date_start, date_end)]
+    leaves = []
+    probes = 0
+    while pending:
+        counts = connection.count_many(resource, [dict(filters, date_start=w[0], date_end=w[1])
+                                                  for w in pending], concurrency=concurrency)
+        probes += len(pending)
+        bisect = []
+        for window, count in zip(pending, counts):
+            if count > target_size and window[0] != window[1]:
+                bisect.extend(bisect_window(window))
+            elif count > 0:
+                leaves.append((window[0], window[1], count))
+        pending = bisect
+    logger.info("Planned {} windows with {} probes".format(len(leaves), probes))
+    return sorted(leaves, key=lambda w: (-w[2], w[0]))
+
+
+class JsonlWriter:
+    """Appends documents as JSON lines to a file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, resource, documents, window):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for doc in documents:
+                f.write(json.dumps(doc, ensure_ascii=False)+"\n")
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Writes one Parquet file per page into a directory. Files are named by
+    the window and the first ID of the page, so a page written again after a
+    resume replaces its file. Requires pandas and pyarrow"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, resource, documents, window):
+        import pandas as pd
+        if not documents:
+            return
+        name = "part-{}-{}-{}.parquet".format(window[0] or "all", window[1] or "all", documents[0]["id"])
+        frame = pd.json_normalize(documents)
+        # Nested lists are kept as JSON strings so that the schema is stable across windows
+        for column in frame.columns:
+            if frame[column].map(lambda v: isinstance(v, (list, dict))).any():
+                frame[column] = frame[column].map(
+                    lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v)
+        frame.to_parquet(os.path.join(self.path, name), index=False)
+
+    def close(self):
+        pass
+
+
+class StoreWriter:
+    """Adds documents to a LocalCorpus"""
+
+    def __init__(self, path):
+        self.corpus = LocalCorpus(path)
+
+    def write(self, resource, documents, window):
+        self.corpus.add(resource, documents)
+
+    def close(self):
+        pass
+
+
+def open_writer(output, output_format):
+    if output_format == "jsonl":
+        return JsonlWriter(output)
+    if output_format == "parquet":
+        return ParquetWriter(output)
+    if output_format == "store":
+        return StoreWriter(output)
+    raise ValueError("output_format must be one of "+", ".join(OUTPUT_FORMATS))
+
+
+class Harvester:
+    """This class downloads all documents of a resource matching a filter set.
+    The date range is split into windows that are fetched concurrently. Finished
+    windows are recorded in a state file and the cursor of unfinished windows in
+    checkpoint files next to it, so that an interrupted harvest resumes with the
+    missing pages. With target_size, the windows are planned by probing the
+    number of documents and bisecting windows that are larger, and the
+    largest windows are fetched first. With dedup, the IDs written so far are kept in an IdSet next
+    to the state file and documents that were already written (overlapping
+    windows, pages fetched again after a resume) are skipped
+
+    Methods
+    -------
+    run():
+        Harvests all windows that are not finished yet and returns a summary
+    """
+
+    def __init__(self, connection, resource, output, output_format="jsonl", date_start=None,
+                 date_end=None, window_days=30, concurrency=4, state=None, progress=True,
+                 dedup=True, target_size=None, **filters):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("output_format must be one of "+", ".join(OUTPUT_FORMATS))
+        if (date_start is None) != (date_end is None):
+            raise ValueError("date_start and date_end must be given together")
+        if target_size is not None and date_start is None:
+            raise ValueError("target_size needs date_start and date_end")
+        self.connection = connection
+        self.resource = resource
+        self.output = output
+        self.output_format = output_format
+        self.concurrency = concurrency
+        self.progress = progress
+        self.filters = filters
+        self.date_range = (date_start, date_end)
+        self.target_size = target_size
+        self.planned = None
+        if date_start is not None:
+            self.windows = split_dates(date_start, date_end, window_days)
+        else:
+            self.windows = [(None, None)]
+        if state is None:
+            if output_format == "store":
+                state = os.path.join(output, "harvest-state.json")
+            else:
+                state = output.rstrip("/\\")+".state.json"
+        self.state_path = state
+        # A state of another date range or plan belongs to another harvest
+        self.key = canonical_key(resource, dict(filters, date_start=date_start, date_end=date_end,
+                                                window_days=window_days if date_start is not None else None,
+                                                target_size=target_size))
+        self.lock = threading.Lock()
+        self.state = {"key": self.key, "done": [], "records": 0}
+        self.records = 0
+        self.finished = 0
+        self.duplicates = 0
+        self.ids_path = state+".ids"
+        self.seen = IdSet() if dedup else None
+        if os.path.exists(state):
+            with open(state, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("key") == self.key:
+                self.state = saved
+                if dedup and os.path.exists(self.ids_path):
+                    self.seen = IdSet.load(self.ids_path)
+            else:
+                logger.warning("State file {} belongs to another harvest and is ignored".format(state))
+
+    def save_state(self):
+        with open(self.state_path+".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(self.state_path+".tmp", self.state_path)
+
+    def checkpoint_path(self, window):
+        return "{}.{}-{}.checkpoint".format(self.state_path, window[0] or "all", window[1] or "all")
+
+    def fetch_window(self, window, writer, started):
+        """Fetches a window page by page and writes every page as it arrives.
+        The cursor is checkpointed after every page, so an interrupted window
+        resumes at the page it stopped at"""
+        count = 0
+        try:
+            for page in self.connection.iter_query(self.resource, date_start=window[0],
+                                                   date_end=window[1], pages=True,
+                                                   checkpoint=self.checkpoint_path(window),
+                                                   checkpoint_every=1, **self.filters):
+                with self.lock:
+                    if self.seen is not None:
+                        before = len(page)
+                        page = [doc for doc in page if self.seen.add(doc["id"])]
+                        self.duplicates += before-len(page)
+                    if page:
+                        writer.write(self.resource, page, window)
+                        if self.seen is not None:
+                            # Saved after writing, so a crash can only repeat documents
+                            self.seen.save(self.ids_path)
+                    self.records += len(page)
+                    self.state["records"] += len(page)
+                    count += len(page)
+                self.report(self.finished, len(self.windows), self.records, started)
+        except RuntimeError as e:
+            raise RuntimeError("Window {} to {} failed: {}".format(window[0], window[1], e)) from None
+        with self.lock:
+            self.finished += 1
+            self.state["done"].append(list(window))
+            self.save_state()
+        self.report(self.finished, len(self.windows), self.records, started)
+        return count
+
+    def report(self, done, total, records, started):
+        if self.progress:
+            elapsed = time.perf_counter()-started
+            sys.stderr.write("\r[{}/{} windows] {} records, {:.1f} records/s".format(
+                done, total, records, records/elapsed if elapsed > 0 else 0.0))
+            sys.stderr.flush()
+
+    def plan(self):
+        """Plans the windows by their number of documents. The plan is kept in
+        the state file, so a resumed harvest uses the same windows"""
+        if "windows" not in self.state:
+            self.state["windows"] = [list(w) for w in plan_windows(
+                self.connection, self.resource, self.date_range[0], self.date_range[1],
+                self.target_size, concurrency=self.concurrency, **self.filters)]
+            with self.lock:
+                self.save_state()
+        self.planned = self.state["windows"]
+        self.windows = [(w[0], w[1]) for w in self.planned]
+
+    def run(self):
+        """Harvests all windows that are not finished yet
+
+        Returns
+        -------
+        data: dict
+            a summary with records, windows, requests, bytes, seconds and
+            records per second of this run
+        """
+        if self.target_size is not None:
+            self.plan()
+        done = set(tuple(w) for w in self.state["done"])
+        todo = [w for w in self.windows if tuple(w) not in done]
+        writer = open_writer(self.output, self.output_format)
+        metrics = Metrics(self.connection)
+        started = time.perf_counter()
+        self.records = 0
+        self.duplicates = 0
+        self.finished = len(self.windows)-len(todo)
+        self.report(self.finished, len(self.windows), self.records, started)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = {executor.submit(self.fetch_window, w, writer, started): w for w in todo}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception:
+                        for f in futures:
+                            f.cancel()
+                        raise
+        finally:
+            with self.lock:
+                self.save_state()
+            writer.close()
+            metrics.detach(self.connection)
+            if self.progress:
+                sys.stderr.write("\n")
+        elapsed = time.perf_counter()-started
+        requests_total = sum(v for (name, _), v in metrics.counters.items() if name == "requests_total")
+        summary = {"resource": self.resource,
+                   "records": self.records,
+                   "records_total": self.state["records"],
+                   "duplicates": self.duplicates,
+                   "windows": len(todo),
+                   "windows_total": len(self.windows),
+                   "requests": requests_total,
+                   "bytes": metrics.get("response_bytes_total", resource=self.resource) or 0,
+                   "seconds": elapsed,
+                   "records_per_second": self.records/elapsed if elapsed > 0 else 0.0}
+        key_pool = getattr(self.connection, "key_pool", None)
+        if key_pool is not None:
+            summary["keys"] = {mask(key): val for key, val in key_pool.usage().items()}
+        return summary
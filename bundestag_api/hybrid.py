@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Freshness-aware planning between a local corpus and the API
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, date, timedelta
+from .local import LocalCorpus, _as_documents
+from .utils import canonical_key, is_error
+
+logger = logging.getLogger("bundestag_api")
+
+DATE_FORMAT = "%Y-%m-%d"
+ONE_DAY = timedelta(days=1)
+
+
+def _day(string):
+    return datetime.strptime(string, DATE_FORMAT).date()
+
+
+def subtract_windows(window, covered):
+    """Returns the parts of a (start, end) date window not covered by a list
+    of (start, end) windows. All bounds are inclusive dates"""
+    missing = []
+    start, end = window
+    for c_start, c_end in sorted(covered):
+        if c_end < start or c_start > end:
+            continue
+        if c_start > start:
+            missing.append((start, c_start - ONE_DAY))
+        start = max(start, c_end + ONE_DAY)
+        if start > end:
+            break
+    if start <= end:
+        missing.append((start, end))
+    return missing
+
+
+class Coverage:
+    """This class records which date windows of a resource and filter set
+    are held locally and when they were fetched"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.slices = {}
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.slices = json.load(f)
+
+    def add(self, key, start, end, fetched_at, settle_after=None):
+        """Records a fetched window. With settle_after, the days that were
+        already settled when the window was fetched are recorded as a slice of
+        their own, so they stay final while the recent days become stale"""
+        slices = self.slices.setdefault(key, [])
+        if settle_after is not None:
+            settled = fetched_at.date() - settle_after
+            if start <= settled < end:
+                slices.append([start.strftime(DATE_FORMAT), settled.strftime(DATE_FORMAT), fetched_at.isoformat()])
+                start = settled + ONE_DAY
+        slices.append([start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT), fetched_at.isoformat()])
+        self.save()
+
+    def windows(self, key):
+        """Returns (start, end, fetched_at) tuples for a key"""
+        return [(_day(s), _day(e), datetime.fromisoformat(f)) for s, e, f in self.slices.get(key, [])]
+
+    def save(self):
+        if self.path is not None:
+            with open(self.path+".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.slices, f)
+            os.replace(self.path+".tmp", self.path)
+
+
+class HybridPlanner:
+    """This class answers queries from a local corpus where it holds fresh
+    data and fetches only missing or stale date windows from the API
+
+    A window counts as fresh if it was fetched less than max_age ago. Days
+    fetched at least settle_after (two days by default) after they passed are
+    regarded as final and never refetched, so repeating a query of the last
+    days only refetches the days that were not settled yet. With settle_after
+    None, every window becomes stale after max_age. A failed request raises a
+    RuntimeError and leaves its window missing.
+
+    Methods
+    -------
+    plan(resource, date_start, date_end, **filters):
+        Splits a date range into windows answered locally and windows to fetch
+    query(resource, return_format="json", num=100, date_start=None, date_end=None, **filters):
+        Fetches the missing windows and answers the query from the corpus
+    """
+
+    def __init__(self, connection, corpus=None, max_age=timedelta(days=1), settle_after=timedelta(days=2)):
+        self.connection = connection
+        if corpus is None:
+            corpus = LocalCorpus()
+        self.corpus = corpus
+        self.max_age = max_age
+        self.settle_after = settle_after
+        if corpus.path is not None:
+            self.coverage = Coverage(os.path.join(corpus.path, "coverage.json"))
+        else:
+            self.coverage = Coverage()
+
+    def _fresh(self, resource, filters, now):
+        """Returns the fresh windows of the filter set and of unfiltered harvests
+        of the same resource, which contain the filtered records as well"""
+        keys = [canonical_key(resource, filters)]
+        if any(v is not None for v in filters.values()):
+            keys.append(canonical_key(resource, {}))
+        fresh = []
+        for key in keys:
+            for start, end, fetched_at in self.coverage.windows(key):
+                if now - fetched_at <= self.max_age:
+                    fresh.append((start, end))
+                elif self.settle_after is not None and fetched_at.date() - end >= self.settle_after:
+                    fresh.append((start, end))
+        return fresh
+
+    def plan(self, resource, date_start, date_end=None, **filters):
+        """Splits a date range into windows answered locally and windows to fetch
+
+        Parameters
+        ----------
+        resource: str
+            The resource type to be queried
+        date_start: str
+            First day of the range. Format is "YYYY-MM-DD"
+        date_end: str, optional
+            Last day of the range. Format is "YYYY-MM-DD". Defaults to today
+        filters: optional
+            Further parameters of btaConnection.query
+
+        Returns
+        -------
+        data: tuple
+            a tuple of two lists of (start, end) date windows: local and remote
+        """
+        start = _day(date_start)
+        if date_end is None:
+            end = date.today()
+        else:
+            end = _day(date_end)
+        fresh = self._fresh(resource, filters, datetime.now())
+        remote = subtract_windows((start, end), fresh)
+        local = subtract_windows((start, end), remote)
+        return local, remote
+
+    def query(self, resource, return_format="json", num=100, date_start=None, date_end=None, **filters):
+        """Answers a query from the corpus after fetching missing or stale windows
+
+        Parameters
+        ----------
+        resource: str
+            The resource type to be queried
+        return_format: str, optional
+            "json", "object" or "pandas". Defaults to json
+        num: int, optional
+            Number of maximal results to be returned. Defaults to 100
+        date_start: str, optional
+            Date after which entities should be retrieved. Without a start
+            date the query is passed to the API and its results are stored
+        date_end: str, optional
+            Date before which entities should be retrieved. Defaults to today
+        filters: optional
+            Further parameters of btaConnection.query
+
+        Returns
+        -------
+        data: list
+            a list of dictionaries or class objects. An error of the API
+            raises a RuntimeError; windows fetched before it stay covered
+        """
+        if date_start is None:
+            data = self.connection.query(resource, num=num, date_end=date_end, **filters)
+            if is_error(data):
+                raise RuntimeError(data)
+            self.corpus.add(resource, data)
+            return self.corpus.query(resource, return_format=return_format, num=num,
+                                     date_end=date_end, **filters)
+        local, remote = self.plan(resource, date_start, date_end, **filters)
+        key = canonical_key(resource, filters)
+        for start, end in remote:
+            fetched_at = datetime.now()
+            logger.debug("Fetching {} from {} to {}".format(resource, start, end))
+            # A window is only covered if all of its documents are stored
+            data = self.connection.query(resource,
+                                         num=None,
+                                         date_start=start.strftime(DATE_FORMAT),
+                                         date_end=end.strftime(DATE_FORMAT),
+                                         **filters)
+            if is_error(data):
+                raise RuntimeError(data)
+            self.corpus.add(resource, _as_documents(data))
+            self.coverage.add(key, start, end, fetched_at, settle_after=self.settle_after)
+        logger.debug("{} windows answered locally, {} fetched".format(len(local), len(remote)))
+        if date_end is None:
+            date_end = date.today().strftime(DATE_FORMAT)
+        return self.corpus.query(resource, return_format=return_format, num=num,
+                                 date_start=date_start, date_end=date_end, **filters)
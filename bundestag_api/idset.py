@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+A compact set of integer IDs for deduplication and for comparing harvests
+"""
+
+import os
+import zlib
+import struct
+
+# IDs are grouped into chunks of 2**16 IDs, each a bitmap of 8 KiB
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_BYTES = CHUNK_SIZE // 8
+MAGIC = b"BTAIDS1\n"
+
+
+class IdSet:
+    """This class holds a set of non-negative integer IDs as bitmaps of 2**16
+    IDs each. Only chunks that contain an ID are allocated, so the IDs of the
+    DIP (up to a few million) take a few hundred KiB instead of the gigabytes
+    a set of Python integers needs. Membership, adding and removing are
+    O(1); union, intersection and difference work on whole chunks
+
+    Methods
+    -------
+    add(btid):
+        Adds an ID and returns whether it was new
+    discard(btid):
+        Removes an ID if present
+    update(btids):
+        Adds several IDs and returns how many were new
+    union(other), intersection(other), difference(other), symmetric_difference(other):
+        Set operations, also available as |, &, - and ^
+    to_bytes():
+        Returns the compressed set
+    save(path):
+        Writes the compressed set to a file
+    load(path):
+        Reads a set written by save()
+    """
+
+    def __init__(self, btids=None):
+        self.chunks = {}
+        self.count = 0
+        if btids is not None:
+            self.update(btids)
+
+    @staticmethod
+    def _split(btid):
+        btid = int(btid)
+        if btid < 0:
+            raise ValueError("IDs must be non-negative integers")
+        return btid >> CHUNK_BITS, (btid & (CHUNK_SIZE-1)) >> 3, 1 << (btid & 7)
+
+    def add(self, btid):
+        """Adds an ID
+
+        Parameters
+        ----------
+        btid: int/str
+            The ID of an entity
+
+        Returns
+        -------
+        data: bool
+            True if the ID was not in the set before
+        """
+        key, pos, bit = self._split(btid)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = bytearray(CHUNK_BYTES)
+        if chunk[pos] & bit:
+            return False
+        chunk[pos] |= bit
+        self.count += 1
+        return True
+
+    def discard(self, btid):
+        key, pos, bit = self._split(btid)
+        chunk = self.chunks.get(key)
+        if chunk is None or not chunk[pos] & bit:
+            return
+        chunk[pos] &= ~bit & 0xFF
+        self.count -= 1
+
+    def update(self, btids):
+        """Adds several IDs and returns how many of them were new"""
+        before = self.count
+        for btid in btids:
+            self.add(btid)
+        return self.count-before
+
+    def __contains__(self, btid):
+        try:
+            key, pos, bit = self._split(btid)
+        except ValueError:
+            return False
+        chunk = self.chunks.get(key)
+        return chunk is not None and bool(chunk[pos] & bit)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterates over the IDs in ascending order"""
+        for key in sorted(self.chunks):
+            base = key << CHUNK_BITS
+            chunk = self.chunks[key]
+            for pos, byte in enumerate(chunk):
+                if byte:
+                    for bit in range(8):
+                        if byte & (1 << bit):
+                            yield base + (pos << 3) + bit
+
+    def __eq__(self, other):
+        if not isinstance(other, IdSet):
+            return NotImplemented
+        if self.count != other.count:
+            return False
+        # Chunks whose IDs were all discarded are ignored
+        return {k: v for k, v in self.chunks.items() if any(v)} == \
+            {k: v for k, v in other.chunks.items() if any(v)}
+
+    def __str__(self):
+        return "IdSet: {} IDs".format(self.count)
+
+    def __repr__(self):
+        return "IdSet: {} IDs in {} chunks".format(self.count, len(self.chunks))
+
+    def _combine(self, other, keys, operation):
+        result = IdSet()
+        for key in keys:
+            a = int.from_bytes(self.chunks.get(key, b""), "little")
+            b = int.from_bytes(other.chunks.get(key, b""), "little")
+            combined = operation(a, b)
+            if combined:
+                result.chunks[key] = bytearray(combined.to_bytes(CHUNK_BYTES, "little"))
+                result.count += bin(combined).count("1")
+        return result
+
+    def union(self, other):
+        return self._combine(other, set(self.chunks) | set(other.chunks), lambda a, b: a | b)
+
+    def intersection(self, other):
+        return self._combine(other, set(self.chunks) & set(other.chunks), lambda a, b: a & b)
+
+    def difference(self, other):
+        return self._combine(other, set(self.chunks), lambda a, b: a & ~b)
+
+    def symmetric_difference(self, other):
+        return self._combine(other, set(self.chunks) | set(other.chunks), lambda a, b: a ^ b)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
+
+    def to_bytes(self):
+        """Returns the set as compressed bytes"""
+        parts = [MAGIC, struct.pack("<QI", self.count, len(self.chunks))]
+        for key in sorted(self.chunks):
+            data = zlib.compress(bytes(self.chunks[key]))
+            parts.append(struct.pack("<QI", key, len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Returns the set of bytes created by to_bytes()"""
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a serialized IdSet")
+        result = cls()
+        pos = len(MAGIC)
+        result.count, size = struct.unpack_from("<QI", data, pos)
+        pos += 12
+        for _ in range(size):
+            key, length = struct.unpack_from("<QI", data, pos)
+            pos += 12
+            result.chunks[key] = bytearray(zlib.decompress(data[pos:pos+length]))
+            pos += length
+        return result
+
+    def save(self, path):
+        """Writes the compressed set to a file. The file is replaced atomically"""
+        with open(path+".tmp", "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(path+".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a set written by save()"""
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
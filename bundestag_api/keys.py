@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+A pool of API keys with request budgets per key
+"""
+
+import time
+import logging
+import threading
+from .utils import RateLimiter
+
+logger = logging.getLogger("bundestag_api")
+
+BENCH_STATUS = [401, 429]
+
+
+class KeyPool:
+    """This class distributes requests across several API keys. Every key
+    has a budget of requests per period and optionally a rate limit. Each
+    request uses the available key with the largest remaining budget. Keys
+    that receive a 401 or 429 response are benched for bench_seconds, twice
+    as long for every further failure in a row
+
+    Methods
+    -------
+    acquire():
+        Returns the key for the next request, waiting if no key is available
+    release(key, status):
+        Records the response status of a request made with a key
+    available():
+        Returns whether a key can be used right now
+    usage():
+        Returns requests, errors, remaining budget and bench time per key
+    """
+
+    def __init__(self, keys, budget=None, period=3600, rate=None, bench_seconds=60):
+        if isinstance(keys, str):
+            keys = [keys]
+        if isinstance(keys, dict):
+            budgets = dict(keys)
+        else:
+            budgets = {key: budget for key in keys}
+        if not budgets:
+            raise ValueError("At least one API key is needed")
+        for key, val in budgets.items():
+            if not isinstance(key, str):
+                raise ValueError("API keys must be strings")
+            if val is not None and (not isinstance(val, int) or val <= 0):
+                raise ValueError("Budgets must be integers larger than zero")
+        self.keys = list(budgets)
+        self.budgets = budgets
+        self.period = period
+        self.bench_seconds = bench_seconds
+        self.lock = threading.Lock()
+        self.period_start = time.monotonic()
+        self.used = {key: 0 for key in self.keys}
+        self.requests = {key: 0 for key in self.keys}
+        self.errors = {key: 0 for key in self.keys}
+        self.strikes = {key: 0 for key in self.keys}
+        self.benched_until = {key: 0.0 for key in self.keys}
+        if rate is not None:
+            self.limiters = {key: RateLimiter(rate) for key in self.keys}
+        else:
+            self.limiters = None
+
+    def _remaining(self, key):
+        if self.budgets[key] is None:
+            return float("inf")
+        return self.budgets[key]-self.used[key]
+
+    def _roll_period(self, now):
+        if now-self.period_start >= self.period:
+            self.period_start = now
+            self.used = {key: 0 for key in self.keys}
+
+    def _candidates(self, now):
+        return [key for key in self.keys
+                if self.benched_until[key] <= now and self._remaining(key) > 0]
+
+    def available(self):
+        with self.lock:
+            now = time.monotonic()
+            self._roll_period(now)
+            return len(self._candidates(now)) > 0
+
+    def acquire(self):
+        """Returns the key with the largest remaining budget. If all keys are
+        benched or out of budget, waits until the first key is available
+
+        Returns
+        -------
+        key: str
+            the API key to use for the next request
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._roll_period(now)
+                candidates = self._candidates(now)
+                if candidates:
+                    # Among keys with equal budgets the least used one is taken
+                    key = max(candidates, key=lambda k: (self._remaining(k), -self.used[k]))
+                    self.used[key] += 1
+                    self.requests[key] += 1
+                    break
+                ready = [until for until in self.benched_until.values() if until > now]
+                if any(self._remaining(k) > 0 for k in self.keys):
+                    delay = min(ready)-now
+                else:
+                    delay = self.period_start+self.period-now
+            logger.warning("No API key available, waiting {:.0f}s".format(delay))
+            time.sleep(max(delay, 0.01))
+        if self.limiters is not None:
+            self.limiters[key].wait()
+        return key
+
+    def release(self, key, status):
+        """Records the response of a request. 401 and 429 bench the key
+
+        Parameters
+        ----------
+        key: str
+            The key returned by acquire()
+        status: int
+            The status code of the response or None on connection errors
+        """
+        with self.lock:
+            if status in BENCH_STATUS:
+                self.errors[key] += 1
+                self.strikes[key] += 1
+                seconds = min(self.bench_seconds * 2**(self.strikes[key]-1), self.period)
+                self.benched_until[key] = time.monotonic()+seconds
+                logger.warning("API key {} benched for {}s after code {}".format(
+                    mask(key), seconds, status))
+            elif status is not None and status < 400:
+                self.strikes[key] = 0
+
+    def usage(self):
+        """Returns the usage of every key
+
+        Returns
+        -------
+        data: dict
+            a dictionary of keys to dictionaries with requests (total),
+            used (in the current period), remaining, errors and benched
+            (seconds until the key can be used again)
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._roll_period(now)
+            return {key: {"requests": self.requests[key],
+                          "used": self.used[key],
+                          "remaining": None if self.budgets[key] is None else self._remaining(key),
+                          "errors": self.errors[key],
+                          "benched": max(self.benched_until[key]-now, 0.0)}
+                    for key in self.keys}
+
+    def __str__(self):
+        return "KeyPool: "+", ".join(mask(key) for key in self.keys)
+
+    def __repr__(self):
+        return "KeyPool: {} keys".format(len(self.keys))
+
+
+def mask(key):
+    """Shortens a key for logs"""
+    if len(key) <= 8:
+        return key
+    return key[:4]+"..."+key[-4:]
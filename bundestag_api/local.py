@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+Local storage of harvested DIP entities and an offline query engine
+"""
+
+import os
+import re
+import json
+import logging
+from bisect import bisect_left, bisect_right
+from .bta_wrapper import convert_results, _sort_key
+from .utils import is_iso8601, RESOURCETYPES, INSTITUTIONS, NO_DATA
+
+logger = logging.getLogger("bundestag_api")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(string):
+    return set(t.lower() for t in TOKEN_PATTERN.findall(string))
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _as_documents(documents):
+    if documents is None or isinstance(documents, str):
+        return []
+    if isinstance(documents, dict):
+        if "id" in documents:
+            return [documents]
+        return list(documents.values())
+    return list(documents)
+
+
+class _ResourceIndex:
+    """Holds the documents of one resource together with its secondary indexes"""
+
+    def __init__(self):
+        self.documents = {}
+        self.by_date = []
+        self.by_updated = []
+        self.sorted_ok = True
+        self.fields = {"institution": {},
+                       "drucksache": {},
+                       "plenarprotokoll": {},
+                       "vorgang": {},
+                       "deskriptor": {},
+                       "sachgebiet": {},
+                       "drucksachetyp": {},
+                       "vorgangstyp": {},
+                       "titel": {}}
+
+    @staticmethod
+    def keys(doc):
+        """Returns the index keys of a document per indexed field"""
+        keys = {"institution": [], "drucksache": [], "plenarprotokoll": [],
+                "vorgang": [], "deskriptor": [], "sachgebiet": [],
+                "drucksachetyp": [], "vorgangstyp": [], "titel": []}
+        inst = doc.get("zuordnung", doc.get("herausgeber"))
+        if inst is not None:
+            keys["institution"].append(inst)
+        fundstelle = doc.get("fundstelle")
+        if isinstance(fundstelle, dict) and "id" in fundstelle:
+            if fundstelle.get("dokumentart") == "Plenarprotokoll":
+                keys["plenarprotokoll"].append(str(fundstelle["id"]))
+            else:
+                keys["drucksache"].append(str(fundstelle["id"]))
+            if fundstelle.get("drucksachetyp") is not None:
+                keys["drucksachetyp"].append(fundstelle["drucksachetyp"])
+        if doc.get("vorgang_id") is not None:
+            keys["vorgang"].append(str(doc["vorgang_id"]))
+        for vb in _as_list(doc.get("vorgangsbezug")):
+            if isinstance(vb, dict) and "id" in vb:
+                keys["vorgang"].append(str(vb["id"]))
+        for d in _as_list(doc.get("deskriptor")):
+            keys["deskriptor"].append(d["name"] if isinstance(d, dict) else d)
+        keys["sachgebiet"].extend(_as_list(doc.get("sachgebiet")))
+        if doc.get("drucksachetyp") is not None:
+            keys["drucksachetyp"].append(doc["drucksachetyp"])
+        if doc.get("vorgangstyp") is not None:
+            keys["vorgangstyp"].append(doc["vorgangstyp"])
+        if doc.get("titel") is not None:
+            keys["titel"].extend(tokenize(doc["titel"]))
+        return keys
+
+    def add(self, doc):
+        btid = str(doc["id"])
+        if btid in self.documents:
+            self.remove(btid)
+        self.documents[btid] = doc
+        for field, values in self.keys(doc).items():
+            index = self.fields[field]
+            for v in values:
+                index.setdefault(v, set()).add(btid)
+        self.sorted_ok = False
+
+    def remove(self, btid):
+        doc = self.documents.pop(btid)
+        for field, values in self.keys(doc).items():
+            index = self.fields[field]
+            for v in values:
+                ids = index.get(v)
+                if ids is not None:
+                    ids.discard(btid)
+                    if not ids:
+                        del index[v]
+        self.sorted_ok = False
+
+    def sort(self):
+        if self.sorted_ok is False:
+            self.by_date = sorted((d.get("datum") or "", k) for k, d in self.documents.items())
+            self.by_updated = sorted((d.get("aktualisiert") or "", k) for k, d in self.documents.items())
+            self.sorted_ok = True
+
+    def lookup(self, field, value):
+        return self.fields[field].get(value, set())
+
+    def range(self, field, start, end):
+        """Returns the IDs whose date field lies between start and end (inclusive)"""
+        self.sort()
+        if field == "datum":
+            sorted_index = self.by_date
+        else:
+            sorted_index = self.by_updated
+        if start is None:
+            lo = 0
+        else:
+            lo = bisect_left(sorted_index, (start, ""))
+        if end is None:
+            hi = len(sorted_index)
+        else:
+            # The appended character makes a date bound include all timestamps of that day
+            hi = bisect_right(sorted_index, (end+"\uffff", ""))
+        return set(k for _, k in sorted_index[lo:hi])
+
+
+def _in_range(value, start, end):
+    if value is None:
+        return False
+    if start is not None and value < start:
+        return False
+    if end is not None and value[0:len(end)] > end:
+        return False
+    return True
+
+
+class LocalCorpus:
+    """This class holds DIP entities locally and evaluates query filters
+    against them without network access
+
+    Documents are kept in memory with secondary indexes on the filterable
+    fields. If a path is given, each resource is persisted as a JSON-lines file
+    in that directory and loaded again on initialisation.
+
+    Methods
+    -------
+    add(resource, documents):
+        Adds or updates documents of a resource
+    query(resource, return_format="json", num=100, fid=None, date_start=None, date_end=None, ...):
+        Evaluates the parameters of btaConnection.query against the stored documents
+    compact():
+        Rewrites the files on disk so that every document is stored only once
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.resources = {r: _ResourceIndex() for r in RESOURCETYPES}
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            for resource in RESOURCETYPES:
+                filename = self._filename(resource)
+                if os.path.exists(filename):
+                    with open(filename, "r", encoding="utf-8") as f:
+                        for line in f:
+                            if line.strip() != "":
+                                self.resources[resource].add(json.loads(line))
+
+    def __len__(self):
+        return sum(len(r.documents) for r in self.resources.values())
+
+    def __str__(self):
+        return "Local corpus: "+", ".join(
+            "{}={}".format(k, len(v.documents)) for k, v in self.resources.items() if v.documents)
+
+    def __repr__(self):
+        return "LocalCorpus(path={!r})".format(self.path)
+
+    def _filename(self, resource):
+        return os.path.join(self.path, resource+".jsonl")
+
+    def _resource(self, resource):
+        if isinstance(resource, str) is True:
+            resource = resource.lower()
+        if resource not in RESOURCETYPES:
+            raise ValueError("No or wrong resource")
+        return resource
+
+    def add(self, resource, documents):
+        """Adds or updates documents of a resource
+
+        Parameters
+        ----------
+        resource: str
+            The resource type of the documents
+        documents: list/dict
+            A list of dictionaries, a single dictionary or a dictionary of
+            dictionaries keyed by ID as returned by btaConnection.query
+
+        Returns
+        -------
+        count: int
+            the number of documents added
+        """
+        resource = self._resource(resource)
+        documents = _as_documents(documents)
+        index = self.resources[resource]
+        for doc in documents:
+            index.add(doc)
+        if self.path is not None and documents:
+            with open(self._filename(resource), "a", encoding="utf-8") as f:
+                for doc in documents:
+                    f.write(json.dumps(doc, ensure_ascii=False)+"\n")
+        return len(documents)
+
+    def get(self, resource, btid):
+        """Returns the stored document of a resource by ID or None"""
+        return self.resources[self._resource(resource)].documents.get(str(btid))
+
+    def documents(self, resource):
+        """Returns all stored documents of a resource"""
+        return list(self.resources[self._resource(resource)].documents.values())
+
+    def compact(self):
+        """Rewrites the files on disk so that every document is stored only once"""
+        if self.path is None:
+            return
+        for resource, index in self.resources.items():
+            filename = self._filename(resource)
+            if not index.documents and not os.path.exists(filename):
+                continue
+            with open(filename+".tmp", "w", encoding="utf-8") as f:
+                for doc in index.documents.values():
+                    f.write(json.dumps(doc, ensure_ascii=False)+"\n")
+            os.replace(filename+".tmp", filename)
+
+    def _related_processes(self, field, value):
+        """Procedures are linked to documents and protocols through their
+        activities and positions"""
+        ids = set()
+        for resource in ["aktivitaet", "vorgangsposition"]:
+            index = self.resources[resource]
+            for btid in index.lookup(field, value):
+                ids.update(index.keys(index.documents[btid])["vorgang"])
+        return ids
+
+    def query(self,
+              resource,
+              return_format="json",
+              num=100,
+              fid=None,
+              date_start=None,
+              date_end=None,
+              updated_since=None,
+              updated_until=None,
+              institution=None,
+              documentID=None,
+              plenaryprotocolID=None,
+              processID=None,
+              descriptor=None,
+              sachgebiet=None,
+              document_type=None,
+              process_type=None,
+              title=None,):
+        """Evaluates the parameters of btaConnection.query against the stored
+        documents. Results are ordered by date and ID, newest first
+
+        Parameters
+        ----------
+        resource: str
+            The resource type to be queried
+        return_format: str, optional
+            "json", "object" or "pandas". Defaults to json
+        num: int, optional
+            Number of maximal results to be returned. Defaults to 100
+        fid: int/list, optional
+            ID of an entity. Can be a list to retrieve more than one entity
+        date_start: str, optional
+            Date after which entities should be retrieved. Format
+            is "YYYY-MM-DD"
+        date_end: str, optional
+            Date before which entities should be retrieved. Format
+            is "YYYY-MM-DD"
+        updated_since: str, optional
+            Date and time after which updated documents are to be retrieved
+        updated_until: str, optional
+            Date and time until which updated documents are to be retrieved
+        institution: str, optional
+            Filter results by institution BT, BR, BV or EK
+        documentID: int, optional
+            Entity ID of a document connected to activities, procedures and
+            procedure positions
+        plenaryprotocolID: int, optional
+            Entity ID of a plenary protocol connected to activities,
+            procedures and procedure positions
+        processID: int, optional
+            Entity ID of a process connected to procedure positions
+        descriptor: str/list, optional
+            Keywords connected to the entities, joined via AND
+        sachgebiet: str/list, optional
+            Political fields connected to the entities, joined via AND
+        document_type: str, optional
+            The type of document to be returned
+        process_type: str, optional
+            The type of process ("Gesetzgebung") to be returned
+        title: str/list, optional
+            Keywords in the title, joined via OR. All words of a keyword
+            need to be part of the title
+
+        Returns
+        -------
+        data: list
+            a list of dictionaries or class objects like btaConnection.query
+        """
+        resource = self._resource(resource)
+        if return_format not in ["json", "object", "pandas"]:
+            raise ValueError("return_format: Not a correct format!")
+        if not isinstance(num, int) or num <= 0:
+            raise ValueError("num must be an integer larger than zero")
+        if institution is not None and institution not in INSTITUTIONS:
+            raise ValueError("Unknown institution")
+        if resource not in ["aktivitaet", "vorgang", "vorgangsposition"]:
+            if documentID is not None or plenaryprotocolID is not None:
+                raise ValueError(
+                    "documentID and plenaryprotocolID must be combined with resource 'aktivitaet', 'vorgang' or 'vorgangsposition'")
+        if resource != "vorgangsposition" and processID is not None:
+            raise ValueError("processID must be combined with resource 'vorgangsposition'")
+        if sum(arg is not None for arg in [plenaryprotocolID, documentID, processID]) > 1:
+            raise ValueError(
+                "Can't select more than one of documentID, plenaryprotocolID and processID")
+        for value, name in [(updated_since, "updated_since"), (updated_until, "updated_until")]:
+            if value is not None and is_iso8601(value) is not True:
+                raise ValueError(
+                    "{} must be a string in the following format '2022-06-24T09:45:00'".format(name))
+
+        index = self.resources[resource]
+        candidates = []
+        if fid is not None:
+            candidates.append(set(str(int(i)) for i in _as_list(fid)) & set(index.documents))
+        if institution is not None:
+            candidates.append(index.lookup("institution", institution))
+        for value, field in [(documentID, "drucksache"), (plenaryprotocolID, "plenarprotokoll")]:
+            if value is None:
+                continue
+            if resource == "vorgang":
+                candidates.append(self._related_processes(field, str(value)) & set(index.documents))
+            else:
+                candidates.append(index.lookup(field, str(value)))
+        if processID is not None:
+            candidates.append(index.lookup("vorgang", str(processID)))
+        for d in _as_list(descriptor):
+            candidates.append(index.lookup("deskriptor", d))
+        for s in _as_list(sachgebiet):
+            candidates.append(index.lookup("sachgebiet", s))
+        if document_type is not None:
+            candidates.append(index.lookup("drucksachetyp", document_type))
+        if process_type is not None:
+            candidates.append(index.lookup("vorgangstyp", process_type))
+        if title is not None:
+            matches = set()
+            for t in _as_list(title):
+                sets = sorted((index.lookup("titel", tok) for tok in tokenize(t)), key=len)
+                if sets:
+                    matches |= set.intersection(*sets)
+            candidates.append(matches)
+
+        ranges = [("datum", date_start, date_end), ("aktualisiert", updated_since, updated_until)]
+        ranges = [r for r in ranges if r[1] is not None or r[2] is not None]
+        if candidates:
+            # Intersect the smallest sets first and check the date ranges on
+            # the remaining documents instead of materialising the ranges
+            candidates.sort(key=len)
+            ids = set(candidates[0])
+            for c in candidates[1:]:
+                if not ids:
+                    break
+                ids &= c
+            for field, start, end in ranges:
+                ids = [k for k in ids if _in_range(index.documents[k].get(field), start, end)]
+        elif ranges:
+            ids = index.range(*ranges[0])
+            for field, start, end in ranges[1:]:
+                ids = [k for k in ids if _in_range(index.documents[k].get(field), start, end)]
+        else:
+            ids = index.documents.keys()
+
+        docs = [index.documents[k] for k in ids]
+        docs.sort(key=_sort_key, reverse=True)
+        data = docs[0:num]
+        if not data:
+            logger.info(NO_DATA)
+            data = NO_DATA
+        return convert_results(data, resource, return_format)
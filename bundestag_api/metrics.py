@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Request metrics collected through the hooks of btaConnection
+"""
+
+import threading
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+PAGE_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                          for k, v in labels) + "}"
+
+
+class Histogram:
+    """A cumulative histogram in the style of Prometheus"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """This class counts requests, bytes, pages, retries and errors and
+    records latency histograms per resource and status code
+
+    Methods
+    -------
+    attach(connection):
+        Registers the metric hooks on a btaConnection
+    detach(connection):
+        Removes the metric hooks from a btaConnection
+    to_prometheus():
+        Returns all metrics in the Prometheus text exposition format
+    """
+
+    EVENTS = ["query_end", "request_end", "page", "retry", "error"]
+
+    def __init__(self, connection=None, prefix="bundestag_api"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        if connection is not None:
+            self.attach(connection)
+
+    def attach(self, connection):
+        for event in self.EVENTS:
+            connection.add_hook(event, self)
+
+    def detach(self, connection):
+        for event in self.EVENTS:
+            connection.remove_hook(event, self)
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def get(self, name, **labels):
+        """Returns the value of a counter or None"""
+        return self.counters.get((name, tuple(sorted(labels.items()))))
+
+    def __call__(self, event, info):
+        resource = info.get("resource")
+        if event == "request_end":
+            labels = (("resource", resource), ("status", info["status"]))
+            self.inc("requests_total", labels)
+            self.inc("response_bytes_total", (("resource", resource),), info["bytes"])
+            self.observe("request_duration_seconds", labels, info["elapsed"], LATENCY_BUCKETS)
+        elif event == "page":
+            self.inc("pages_total", (("resource", resource),))
+            self.inc("documents_total", (("resource", resource),), info["documents"])
+        elif event == "query_end":
+            self.inc("queries_total", (("resource", resource),))
+            self.observe("query_pages", (("resource", resource),), info["pages"], PAGE_BUCKETS)
+            self.observe("query_duration_seconds", (("resource", resource),), info["elapsed"],
+                         LATENCY_BUCKETS)
+        elif event == "retry":
+            self.inc("retries_total", (("resource", resource), ("status", info["status"])))
+        elif event == "error":
+            self.inc("errors_total", (("resource", resource), ("status", info["status"])))
+
+    def to_prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format
+
+        Returns
+        -------
+        data: str
+            the metrics, one sample per line
+        """
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items(), key=lambda i: (i[0][0], str(i[0][1])))
+            histograms = sorted(self.histograms.items(), key=lambda i: (i[0][0], str(i[0][1])))
+        typed = set()
+        for (name, labels), value in counters:
+            metric = "{}_{}".format(self.prefix, name)
+            if metric not in typed:
+                lines.append("# TYPE {} counter".format(metric))
+                typed.add(metric)
+            lines.append("{}{} {}".format(metric, _labels(labels), value))
+        for (name, labels), hist in histograms:
+            metric = "{}_{}".format(self.prefix, name)
+            if metric not in typed:
+                lines.append("# TYPE {} histogram".format(metric))
+                typed.add(metric)
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append("{}_bucket{} {}".format(metric, _labels(labels + (("le", bound),)), count))
+            lines.append("{}_bucket{} {}".format(metric, _labels(labels + (("le", "+Inf"),)), hist.total))
+            lines.append("{}_sum{} {}".format(metric, _labels(labels), hist.sum))
+            lines.append("{}_count{} {}".format(metric, _labels(labels), hist.total))
+        return "\n".join(lines) + "\n"
@@ -13,6 +13,10 @@ class Person:
             self.firstname = dictionary["vorname"]
         else:
             self.firstname = None
+        if "typ" in dictionary:
+            self.instance = dictionary["typ"]
+        else:
+            self.instance = None
         mdbrole = False
         if "basisdatum" in dictionary:
             self.basedate = dictionary["basisdatum"]
@@ -263,15 +267,42 @@ class Aktivitaet:
 
     def __init__(self, dictionary):
         self.btid = dictionary["id"]
-        self.activitytype = dictionary["aktivitaetsart"]
-        self.date = dictionary["datum"]
-        self.title = dictionary["titel"]
-        self.type = dictionary["typ"]
-        self.doctype = dictionary["dokumentart"]
-        self.parlsession = dictionary["wahlperiode"]
-        self.numprocedure = dictionary["vorgangsbezug_anzahl"]
-        self.procedure_reference = dictionary["vorgangsbezug"][0]["id"]
-        self.document_reference = dictionary["fundstelle"]["id"]
+        if "aktivitaetsart" in dictionary:
+            self.activitytype = dictionary["aktivitaetsart"]
+        else:
+            self.activitytype = None
+        if "datum" in dictionary:
+            self.date = dictionary["datum"]
+        else:
+            self.date = None
+        if "titel" in dictionary:
+            self.title = dictionary["titel"]
+        else:
+            self.title = None
+        if "typ" in dictionary:
+            self.type = dictionary["typ"]
+        else:
+            self.type = None
+        if "dokumentart" in dictionary:
+            self.doctype = dictionary["dokumentart"]
+        else:
+            self.doctype = None
+        if "wahlperiode" in dictionary:
+            self.parlsession = dictionary["wahlperiode"]
+        else:
+            self.parlsession = None
+        if "vorgangsbezug_anzahl" in dictionary:
+            self.numprocedure = dictionary["vorgangsbezug_anzahl"]
+        else:
+            self.numprocedure = None
+        if "vorgangsbezug" in dictionary and len(dictionary["vorgangsbezug"]) > 0:
+            self.procedure_reference = dictionary["vorgangsbezug"][0]["id"]
+        else:
+            self.procedure_reference = None
+        if "fundstelle" in dictionary:
+            self.document_reference = dictionary["fundstelle"]["id"]
+        else:
+            self.document_reference = None
 
     def __str__(self):
         return f'{self.instance}: ({self.btid}) {self.activitytype} - {self.title} - {self.date}'
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent download of the PDF files of documents and plenary protocols into
+a content-addressed store
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from .local import _as_documents
+from .utils import RateLimiter, is_error
+
+logger = logging.getLogger("bundestag_api")
+
+PDF_RESOURCES = ["drucksache", "plenarprotokoll"]
+RETRY_STATUS = [429, 500, 502, 503, 504]
+CHUNK_SIZE = 256 * 1024
+# IDs that are resolved to URLs with one request
+ID_BATCH = 100
+# Downloads between two writes of the manifest
+SAVE_EVERY = 50
+
+
+def _pdf_url(item):
+    """Returns the ID and PDF URL of a model object or a document"""
+    if isinstance(item, dict):
+        return str(item["id"]), (item.get("fundstelle") or {}).get("pdf_url")
+    return str(item.btid), getattr(item, "pdf_url", None)
+
+
+class PdfFetcher:
+    """This class downloads the PDF files of documents ("drucksache") and
+    plenary protocols ("plenarprotokoll"). Files are stored under the SHA-256
+    of their content, so identical files are kept once. A manifest maps every
+    URL to its file and the IDs referring to it, so a rerun only downloads
+    what is missing. Interrupted downloads are continued with a range
+    request
+
+    Methods
+    -------
+    fetch(items, resource="drucksache"):
+        Downloads the PDFs of model objects, documents or IDs
+    path(btid, resource="drucksache"):
+        Returns the stored file of an ID
+    save():
+        Writes the manifest
+    """
+
+    def __init__(self, directory, connection=None, concurrency=4, max_retries=3, retry_backoff=1.0,
+                 timeout=60, rate_limit=None, manifest=None):
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("concurrency must be an integer larger than zero")
+        self.directory = directory
+        self.connection = connection
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        if rate_limit is not None:
+            self.rate_limiter = RateLimiter(rate_limit)
+        else:
+            self.rate_limiter = None
+        if manifest is None:
+            manifest = os.path.join(directory, "manifest.json")
+        self.manifest_path = manifest
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "partial"), exist_ok=True)
+        self.manifest = {}
+        if os.path.exists(manifest):
+            with open(manifest, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def __len__(self):
+        return len(self.manifest)
+
+    def __str__(self):
+        return "PdfFetcher: {} files in {}".format(len(self), self.directory)
+
+    def __repr__(self):
+        return "PdfFetcher: {} files in {}".format(len(self), self.directory)
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest+".pdf")
+
+    def partial_path(self, url):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "partial", name+".part")
+
+    def save(self):
+        with self.lock:
+            with open(self.manifest_path+".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f)
+            os.replace(self.manifest_path+".tmp", self.manifest_path)
+
+    def _resolve(self, items, resource):
+        """Returns a dictionary of IDs to PDF URLs. Plain IDs are looked up
+        with the connection in batches"""
+        urls = {}
+        ids = []
+        for item in items:
+            if isinstance(item, (int, str)):
+                ids.append(int(item))
+            else:
+                btid, url = _pdf_url(item)
+                urls[btid] = url
+        if ids and self.connection is None:
+            raise ValueError("A connection is needed to fetch PDFs by ID")
+        for i in range(0, len(ids), ID_BATCH):
+            batch = ids[i:i+ID_BATCH]
+            data = self.connection.query(resource, num=len(batch), fid=batch,
+                                         fields=["fundstelle.pdf_url"])
+            if is_error(data):
+                raise RuntimeError(data)
+            # A batch of one ID returns a single document
+            for doc in _as_documents(data):
+                btid, url = _pdf_url(doc)
+                urls[btid] = url
+            for btid in batch:
+                urls.setdefault(str(btid), None)
+        return urls
+
+    def _download(self, url):
+        """Downloads a URL into the store and returns its digest and size.
+        A partial file of an earlier attempt is continued if the server
+        supports range requests"""
+        part = self.partial_path(url)
+        attempt = 0
+        while True:
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+                    if r.status_code == 416:
+                        # The partial file is already complete
+                        break
+                    if r.status_code in RETRY_STATUS and attempt < self.max_retries:
+                        logger.warning("Download of {} failed with code {}, retrying".format(url, r.status_code))
+                        time.sleep(self.retry_backoff * 2**attempt)
+                        attempt += 1
+                        continue
+                    if r.status_code not in [200, 206]:
+                        raise RuntimeError("Download of {} failed with code {}".format(url, r.status_code))
+                    # 200 means the server ignored the range, so the file starts over
+                    mode = "ab" if r.status_code == 206 else "wb"
+                    with open(part, mode) as f:
+                        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(chunk)
+                break
+            except requests.exceptions.RequestException as e:
+                if attempt >= self.max_retries:
+                    raise RuntimeError("Download of {} failed: {}".format(url, e)) from None
+                logger.warning("Download of {} failed ({}), retrying".format(url, e))
+                time.sleep(self.retry_backoff * 2**attempt)
+                attempt += 1
+        sha = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        size = os.path.getsize(part)
+        target = self.object_path(digest)
+        if os.path.exists(target):
+            os.remove(part)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(part, target)
+        return digest, size
+
+    def fetch(self, items, resource="drucksache"):
+        """Downloads the PDFs of documents or plenary protocols. URLs that are
+        in the manifest and whose file exists are skipped
+
+        Parameters
+        ----------
+        items: list/dict/object
+            Drucksache or Plenarprotokoll objects, documents as returned by
+            query() or IDs. A single object or document is accepted as well
+        resource: str, optional
+            The resource type of the IDs, "drucksache" or "plenarprotokoll"
+
+        Returns
+        -------
+        data: dict
+            a summary with downloaded, skipped, missing (no PDF URL), failed,
+            bytes, seconds, errors (URL to message) and paths (ID to file)
+        """
+        if resource not in PDF_RESOURCES:
+            raise ValueError("resource must be one of "+", ".join(PDF_RESOURCES))
+        if isinstance(items, dict):
+            # A single document or a dictionary of IDs to objects or documents
+            items = [items] if "id" in items else list(items.values())
+        elif not isinstance(items, (list, tuple, set)) and hasattr(items, "btid"):
+            items = [items]
+        started = time.perf_counter()
+        urls = self._resolve(items, resource)
+        todo = {}
+        summary = {"downloaded": 0, "skipped": 0, "missing": 0, "failed": 0, "bytes": 0,
+                   "errors": {}, "paths": {}}
+        for btid, url in urls.items():
+            if url is None:
+                summary["missing"] += 1
+                continue
+            entry = self.manifest.get(url)
+            if entry is not None and os.path.exists(self.object_path(entry["sha256"])):
+                key = "{}:{}".format(resource, btid)
+                if key not in entry["ids"]:
+                    entry["ids"].append(key)
+                summary["skipped"] += 1
+                summary["paths"][btid] = self.object_path(entry["sha256"])
+            else:
+                todo.setdefault(url, []).append(btid)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = {executor.submit(self._download, url): url for url in todo}
+                for future in as_completed(futures):
+                    url = futures[future]
+                    try:
+                        digest, size = future.result()
+                    except Exception as e:
+                        logger.error(str(e))
+                        summary["failed"] += 1
+                        summary["errors"][url] = str(e)
+                        continue
+                    with self.lock:
+                        self.manifest[url] = {"sha256": digest,
+                                              "bytes": size,
+                                              "ids": ["{}:{}".format(resource, btid) for btid in todo[url]]}
+                    summary["downloaded"] += 1
+                    summary["bytes"] += size
+                    for btid in todo[url]:
+                        summary["paths"][btid] = self.object_path(digest)
+                    if summary["downloaded"] % SAVE_EVERY == 0:
+                        self.save()
+        finally:
+            self.save()
+        summary["seconds"] = time.perf_counter()-started
+        return summary
+
+    def path(self, btid, resource="drucksache"):
+        """Returns the stored file of a document or plenary protocol or None
+        if its PDF was not downloaded"""
+        key = "{}:{}".format(resource, btid)
+        for entry in self.manifest.values():
+            if key in entry["ids"]:
+                return self.object_path(entry["sha256"])
+        return None
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Prepared queries that validate their static parameters once and bind
+IDs and date ranges per execution
+"""
+
+import asyncio
+import functools
+from .profiling import clock
+from .tracing import traced
+from .utils import is_iso8601, canonical_key, compile_fields, MODEL_FIELDS
+
+# Parameters that can be bound per execution and their request names
+VARIABLES = {"fid": "f.id",
+             "date_start": "f.datum.start",
+             "date_end": "f.datum.end",
+             "updated_since": "f.aktualisiert.start",
+             "updated_until": "f.aktualisiert.end"}
+
+
+class PreparedQuery:
+    """This class holds a validated query whose IDs and date ranges can be
+    bound for every execution. Create it with btaConnection.prepare()
+
+    Methods
+    -------
+    bind(**variables):
+        Returns the request parameters with the variables bound
+    key(**variables):
+        Returns the canonical key of an execution
+    execute(**variables):
+        Runs the query with the variables bound
+    execute_async(executor=None, **variables):
+        Runs the query in an executor and returns an awaitable
+    """
+
+    def __init__(self, connection, resource, return_format="json", num=100, fields=None, **params):
+        self.connection = connection
+        self.tracer = connection.tracer
+        self.return_format = return_format
+        self.num = num
+        self.resource, self.r_url, self.payload = connection._build_request(
+            resource, return_format=return_format, num=num, **params)
+        # Variables given at preparation can not be rebound
+        self.fixed = [name for name in VARIABLES if params.get(name) is not None]
+        self.fields = None
+        if fields is not None and return_format == "object":
+            self.fields = compile_fields(fields, MODEL_FIELDS.get(self.resource))
+        elif fields is not None:
+            self.fields = compile_fields(fields)
+        self.static_key = {k: v for k, v in self.payload.items()
+                           if k not in ["apikey", "cursor", "format"]}
+
+    def bind(self, **variables):
+        """Returns a copy of the request parameters with the variables bound
+
+        Parameters
+        ----------
+        **variables:
+            fid, date_start, date_end, updated_since or updated_until
+
+        Returns
+        -------
+        data: dict
+            the request parameters
+        """
+        payload = dict(self.payload)
+        for name, val in variables.items():
+            if name not in VARIABLES:
+                raise ValueError("Only {} can be bound".format(", ".join(VARIABLES)))
+            if name in self.fixed:
+                raise ValueError("{} was fixed when the query was prepared".format(name))
+            if val is None:
+                continue
+            if name == "fid":
+                if isinstance(val, list):
+                    try:
+                        val = [int(item) for item in val]
+                    except ValueError as e:
+                        raise ValueError("IDs must be integers: {}".format(e)) from None
+                elif not isinstance(val, int):
+                    try:
+                        val = int(val)
+                    except ValueError as e:
+                        raise ValueError("IDs must be integers: {}".format(e)) from None
+            elif name in ["updated_since", "updated_until"]:
+                if is_iso8601(val) != True:
+                    raise ValueError(
+                        "{} must be a string in the following format '2022-06-24T09:45:00'".format(name))
+            elif not isinstance(val, str):
+                raise ValueError("{} must be a string in the format 'YYYY-MM-DD'".format(name))
+            payload[VARIABLES[name]] = val
+        return payload
+
+    def key(self, **variables):
+        """Returns the canonical key of the query with the variables bound,
+        e.g. for caching or deduplication"""
+        payload = self.bind(**variables)
+        return canonical_key(self.resource, {k: v for k, v in payload.items()
+                                             if k not in ["apikey", "cursor", "format"]})
+
+    @traced
+    def execute(self, **variables):
+        """Runs the query with the variables bound
+
+        Parameters
+        ----------
+        **variables:
+            fid, date_start, date_end, updated_since or updated_until
+
+        Returns
+        -------
+        data: list/dict/DataFrame
+            the results in the return format of the prepared query
+        """
+        profile = None
+        if self.connection.profiler is not None:
+            profile = self.connection.profiler.begin(self.resource)
+            phase_started = clock()
+        payload = self.bind(**variables)
+        if profile is not None:
+            profile.add(("validate",), phase_started)
+        return self.connection._execute(self.resource, self.r_url, payload, self.return_format,
+                                        self.num, profile=profile, fields=self.fields)
+
+    def execute_async(self, executor=None, **variables):
+        """Runs the query in an executor of the running event loop. Several
+        executions can be awaited concurrently, e.g. with asyncio.gather
+
+        Parameters
+        ----------
+        executor: Executor, optional
+            The executor to use. Defaults to the default executor of the loop
+        **variables:
+            fid, date_start, date_end, updated_since or updated_until
+
+        Returns
+        -------
+        data: Future
+            an awaitable with the results
+        """
+        # Invalid variables raise here and not in the executor
+        self.bind(**variables)
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(executor, functools.partial(self.execute, **variables))
+
+    def __str__(self):
+        return "PreparedQuery: "+canonical_key(self.resource, self.static_key)
+
+    def __repr__(self):
+        return "PreparedQuery: "+canonical_key(self.resource, self.static_key)
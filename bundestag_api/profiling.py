@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Phase-level profiling of queries and a log of the slowest queries
+"""
+
+import time
+import heapq
+import threading
+from collections import deque
+from itertools import count
+
+
+def clock():
+    """Returns the wall and CPU time of the calling thread"""
+    return (time.perf_counter(), time.thread_time())
+
+
+def timed(iterable, spent):
+    """Yields the items of an iterable and adds the wall and CPU time spent
+    in producing them to the list spent. Time the consumer spends between
+    two items is not counted"""
+    iterator = iter(iterable)
+    while True:
+        started = clock()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            now = clock()
+            spent[0] += now[0]-started[0]
+            spent[1] += now[1]-started[1]
+        yield item
+
+
+class QueryProfile:
+    """This class holds the wall and CPU time per phase of one query. Phases
+    are stored as paths such as ("page 3", "network")"""
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.key = None
+        self.phases = []
+        self.started = clock()
+        self.wall = None
+        self.cpu = None
+
+    def add(self, path, started):
+        now = clock()
+        self.phases.append((path, now[0]-started[0], now[1]-started[1]))
+
+    def record(self, path, wall, cpu):
+        """Adds a phase whose time was measured in parts"""
+        self.phases.append((path, wall, cpu))
+
+    def finish(self):
+        now = clock()
+        self.wall = now[0]-self.started[0]
+        self.cpu = now[1]-self.started[1]
+
+    def summary(self):
+        """Returns the summed wall and CPU time per phase name
+
+        Returns
+        -------
+        data: dict
+            a dictionary of phase names to (wall, cpu) tuples in seconds
+        """
+        data = {}
+        for path, wall, cpu in self.phases:
+            w, c = data.get(path[-1], (0.0, 0.0))
+            data[path[-1]] = (w+wall, c+cpu)
+        return data
+
+    def to_collapsed(self):
+        """Returns the profile as collapsed stacks ("a;b;c weight") with
+        microseconds of wall time as weights, as read by flamegraph tools"""
+        root = "query {}".format(self.resource)
+        lines = []
+        accounted = 0.0
+        for path, wall, cpu in self.phases:
+            lines.append("{};{} {}".format(root, ";".join(path), int(wall*1e6)))
+            accounted += wall
+        if self.wall is not None and self.wall > accounted:
+            lines.append("{};other {}".format(root, int((self.wall-accounted)*1e6)))
+        return "\n".join(lines)+"\n"
+
+    def __str__(self):
+        return "Query {}: {:.3f}s wall, {:.3f}s CPU - {}".format(
+            self.resource, self.wall or 0.0, self.cpu or 0.0, self.key)
+
+    def __repr__(self):
+        return "QueryProfile: {} ({:.3f}s)".format(self.resource, self.wall or 0.0)
+
+
+class Profiler:
+    """This class records phase timings of all queries of a connection while
+    it is active and keeps the slowest queries
+
+    Use it as a context manager through btaConnection.profile().
+
+    Methods
+    -------
+    slowest_queries():
+        Returns the slowest recorded queries, slowest first
+    dump_flamegraph(path, profile=None):
+        Writes the collapsed stacks of a query to a file
+    """
+
+    def __init__(self, connection=None, slowest=20, recent=100):
+        self.connection = connection
+        self.slowest = slowest
+        self.recent = deque(maxlen=recent)
+        self.heap = []
+        self.counter = count()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        if self.connection is not None:
+            self.connection.profiler = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.connection is not None and self.connection.profiler is self:
+            self.connection.profiler = None
+        return False
+
+    def begin(self, resource):
+        return QueryProfile(resource)
+
+    def end(self, profile):
+        profile.finish()
+        with self.lock:
+            self.recent.append(profile)
+            entry = (profile.wall, next(self.counter), profile)
+            if len(self.heap) < self.slowest:
+                heapq.heappush(self.heap, entry)
+            elif profile.wall > self.heap[0][0]:
+                heapq.heapreplace(self.heap, entry)
+
+    def slowest_queries(self):
+        """Returns the slowest recorded queries
+
+        Returns
+        -------
+        data: list
+            a list of QueryProfile objects, slowest first. Their key attribute
+            holds the canonical parameters of the query
+        """
+        with self.lock:
+            return [p for _, _, p in sorted(self.heap, key=lambda e: e[0], reverse=True)]
+
+    def dump_flamegraph(self, path, profile=None):
+        """Writes the collapsed stacks of a query to a file
+
+        Parameters
+        ----------
+        path: str
+            Target file
+        profile: QueryProfile, optional
+            The query to dump. Defaults to the slowest query
+        """
+        if profile is None:
+            slowest = self.slowest_queries()
+            if not slowest:
+                raise ValueError("No query has been profiled")
+            profile = slowest[0]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profile.to_collapsed())
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming segmentation of plenary protocol full texts into speeches
+"""
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+ROLE_KEYWORDS = ("Bundeskanzler", "Bundesminister", "Staatsminister",
+                 "Staatssekretär", "Ministerpräsident", "Minister",
+                 "Senator", "Beauftragte", "Wehrbeauftragte", "Bürgermeister")
+
+# One alternation is matched left to right over the whole text, so every
+# character is inspected once. Speaker lines are either the presiding officer,
+# a member with faction in brackets or a member of government with the office
+# after a comma. Interjections are lines enclosed in round brackets.
+SEGMENT_PATTERN = re.compile(
+    r"^(?:"
+    r"(?P<chair>(?:Alters)?(?:Vize)?[Pp]räsident(?:in)?) "
+    r"(?P<chairname>[A-ZÄÖÜ][^\n:()]{2,80}?):[ \t]*$"
+    r"|(?P<name>[A-ZÄÖÜ][^\n:(),]{2,80}?) "
+    r"\((?P<faction>[^\n()]{1,60})\):[ \t]*$"
+    r"|(?P<govname>[A-ZÄÖÜ][^\n:(),]{2,80}?), "
+    r"(?P<role>[^\n:()]*?(?:" + "|".join(ROLE_KEYWORDS) + r")[^\n:()]{0,120}?):[ \t]*$"
+    r"|\((?P<interjection>[^\n]{1,2000}?)\)[ \t]*$"
+    r")",
+    re.MULTILINE)
+
+
+class Interjection:
+    """This class represents an interjection ("Zwischenruf", applause, etc.)
+    inside a speech. Only offsets are kept until the text is requested"""
+
+    def __init__(self, source, start, end):
+        self.source = source
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Interjection: ({self.start}-{self.end})'
+
+
+class Speech:
+    """This class represents a single speech in a plenary protocol. Offsets
+    point into the protocol text, the text itself is only sliced on access"""
+
+    def __init__(self, source, start, end, speaker, faction=None, role=None,
+                 interjections=None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.speaker = speaker
+        self.faction = faction
+        self.role = role
+        if interjections is None:
+            self.interjections = []
+        else:
+            self.interjections = interjections
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __str__(self):
+        return f'{self.speaker}{" (" + self.faction + ")" if self.faction is not None else ""}{", " + self.role if self.role is not None else ""}: {self.start}-{self.end}'
+
+    def __repr__(self):
+        return f'Speech: {self.speaker}{" (" + self.faction + ")" if self.faction is not None else ""}{", " + self.role if self.role is not None else ""} ({self.start}-{self.end})'
+
+
+def _scan(text):
+    """Runs the single pass over the text and yields plain tuples of
+    (start, end, speaker, faction, role, [(start, end), ...])"""
+    current = None
+    for m in SEGMENT_PATTERN.finditer(text):
+        if m.group("interjection") is not None:
+            if current is not None:
+                current[5].append(m.span("interjection"))
+            continue
+        if current is not None:
+            current[1] = m.start()
+            yield tuple(current)
+        if m.group("chair") is not None:
+            current = [m.end(), None, m.group("chairname").strip(), None,
+                       m.group("chair"), []]
+        elif m.group("name") is not None:
+            current = [m.end(), None, m.group("name").strip(),
+                       m.group("faction").strip(), None, []]
+        else:
+            current = [m.end(), None, m.group("govname").strip(), None,
+                       m.group("role").strip(), []]
+    if current is not None:
+        current[1] = len(text)
+        yield tuple(current)
+
+
+def iter_speeches(text):
+    """Yields the speeches of a plenary protocol text in order
+
+    Parameters
+    ----------
+    text: str
+        Full text of a plenary protocol as returned for plenarprotokoll-text
+
+    Returns
+    -------
+    data: generator
+        a generator of Speech objects
+    """
+    if text is None:
+        return
+    for start, end, speaker, faction, role, spans in _scan(text):
+        yield Speech(text, start, end, speaker, faction=faction, role=role,
+                     interjections=[Interjection(text, s, e) for s, e in spans])
+
+
+def _segment_offsets(text):
+    return list(_scan(text))
+
+
+def segment_protocols(protocols, processes=None):
+    """Segments many plenary protocols into speeches in parallel
+
+    Parameters
+    ----------
+    protocols: list/dict
+        Plenary protocols as dictionaries or Plenarprotokoll objects, e.g.
+        the return value of get_plenaryprotocol(..., fulltext=True)
+    processes: int, optional
+        Number of worker processes. Defaults to the number of CPU cores.
+        Use 1 to segment in the calling process
+
+    Returns
+    -------
+    data: dict
+        a dictionary mapping protocol IDs to lists of Speech objects
+    """
+    if isinstance(protocols, dict) and "id" not in protocols:
+        protocols = list(protocols.values())
+    elif not isinstance(protocols, list):
+        protocols = [protocols]
+    ids = []
+    texts = []
+    for p in protocols:
+        if isinstance(p, dict):
+            ids.append(p["id"])
+            texts.append(p.get("text") or "")
+        else:
+            ids.append(p.btid)
+            texts.append(p.text or "")
+    if processes == 1 or len(texts) < 2:
+        offsets = [_segment_offsets(t) for t in texts]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            offsets = list(executor.map(_segment_offsets, texts, chunksize=4))
+    data = {}
+    for btid, text, segments in zip(ids, texts, offsets):
+        data[btid] = [Speech(text, start, end, speaker, faction=faction, role=role,
+                             interjections=[Interjection(text, s, e) for s, e in spans])
+                      for start, end, speaker, faction, role, spans in segments]
+    return data
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+SQL over harvested data with DuckDB. Every resource becomes a table and the
+nested lists vorgangsbezug, autoren_anzeige and deskriptor become link
+tables. Requires duckdb
+"""
+
+import os
+import json
+import glob
+import shutil
+import logging
+import tempfile
+from .local import _as_documents
+from .utils import RESOURCETYPES
+
+logger = logging.getLogger("bundestag_api")
+
+# Nested lists that are normalized into link tables
+LINK_FIELDS = ["vorgangsbezug", "autoren_anzeige", "deskriptor"]
+DATE_FIELDS = ["datum"]
+DATETIME_FIELDS = ["aktualisiert"]
+
+
+def table_name(resource):
+    """Returns the table of a resource, e.g. drucksache_text for drucksache-text"""
+    return resource.replace("-", "_")
+
+
+def _quote(string):
+    return "'"+string.replace("'", "''")+"'"
+
+
+def _identifier(string):
+    return '"'+string.replace('"', '""')+'"'
+
+
+def _files(path, extensions):
+    """Expands a file, a directory or a glob pattern into a list of files"""
+    if os.path.isdir(path):
+        return sorted(f for ext in extensions for f in glob.glob(os.path.join(path, "*"+ext)))
+    if any(char in path for char in "*?["):
+        return sorted(glob.glob(path))
+    return [path]
+
+
+class DipDatabase:
+    """This class loads harvested documents into an embedded DuckDB database.
+    Each resource becomes a table named after it ("drucksache-text" becomes
+    drucksache_text) with one row per ID, the newest version if an ID occurs
+    several times. IDs are BIGINT, dates DATE and update times TIMESTAMP.
+    The nested lists vorgangsbezug, autoren_anzeige and deskriptor are moved
+    into link tables like vorgang_deskriptor with the ID of the entity in
+    a column like vorgang_id
+
+    Methods
+    -------
+    load(resource, source):
+        Loads JSONL files, Parquet files or documents into the table of a resource
+    load_store(path):
+        Loads all resources of a local corpus or harvest directory
+    sql(query, params=None):
+        Runs a SQL query and returns a DuckDB relation
+    tables():
+        Returns the names of all tables
+    close():
+        Closes the database
+    """
+
+    def __init__(self, path=":memory:", threads=None):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("DipDatabase requires duckdb: pip install duckdb") from None
+        self.path = path
+        self.db = duckdb.connect(path)
+        if threads is not None:
+            self.db.execute("SET threads TO {}".format(int(threads)))
+        self.sources = {}
+        self.tempdir = None
+
+    def __str__(self):
+        return "DipDatabase: "+", ".join(self.tables())
+
+    def __repr__(self):
+        return "DipDatabase(path={!r})".format(self.path)
+
+    def _resource(self, resource):
+        if isinstance(resource, str) is True:
+            resource = resource.lower()
+        if resource not in RESOURCETYPES:
+            raise ValueError("No or wrong resource")
+        return resource
+
+    def _write_documents(self, resource, documents):
+        """Writes documents given in memory to a temporary JSONL file"""
+        if self.tempdir is None:
+            self.tempdir = tempfile.mkdtemp(prefix="bundestag_api-")
+        path = os.path.join(self.tempdir, "{}-{}.jsonl".format(resource, len(self.sources.get(resource, []))))
+        with open(path, "w", encoding="utf-8") as f:
+            for doc in _as_documents(documents):
+                f.write(json.dumps(doc, ensure_ascii=False)+"\n")
+        return path
+
+    def load(self, resource, source):
+        """Adds a source to the table of a resource and rebuilds the table and
+        its link tables
+
+        Parameters
+        ----------
+        resource: str
+            The resource type of the documents
+        source: str/list/dict
+            A JSONL file, a Parquet file, a directory or glob pattern of such
+            files (e.g. the output of a harvest) or documents as returned by
+            btaConnection.query
+
+        Returns
+        -------
+        count: int
+            the number of rows in the table
+        """
+        resource = self._resource(resource)
+        if not isinstance(source, str):
+            source = self._write_documents(resource, source)
+        files = _files(source, [".jsonl", ".json", ".parquet"])
+        files = [f for f in files if os.path.exists(f) and os.path.getsize(f) > 0]
+        if not files:
+            raise ValueError("No data found in {}".format(source))
+        self.sources.setdefault(resource, []).extend(files)
+        return self._build(resource)
+
+    def load_store(self, path):
+        """Loads every resource of a directory with one file per resource,
+        e.g. a LocalCorpus or a harvest with --format store
+
+        Returns
+        -------
+        data: dict
+            a dictionary of resources to the number of rows
+        """
+        counts = {}
+        for resource in RESOURCETYPES:
+            filename = os.path.join(path, resource+".jsonl")
+            if os.path.exists(filename) and os.path.getsize(filename) > 0:
+                counts[resource] = self.load(resource, filename)
+        return counts
+
+    def _scan(self, files):
+        """Returns the SQL reading all files. JSON and Parquet files are
+        combined by column name"""
+        parts = []
+        json_files = [f for f in files if not f.endswith(".parquet")]
+        parquet_files = [f for f in files if f.endswith(".parquet")]
+        if json_files:
+            parts.append("SELECT * FROM read_json_auto([{}], format='newline_delimited', "
+                         "union_by_name=true)".format(", ".join(_quote(f) for f in json_files)))
+        if parquet_files:
+            parts.append("SELECT * FROM read_parquet([{}], union_by_name=true)".format(
+                ", ".join(_quote(f) for f in parquet_files)))
+        return " UNION ALL BY NAME ".join(parts)
+
+    def _columns(self, query):
+        return {row[0]: row[1] for row in self.db.execute("DESCRIBE "+query).fetchall()}
+
+    def _typed(self, query, columns):
+        """Returns a select of query with IDs, dates and update times cast to
+        their types. Lists that were stored as JSON strings (Parquet) are
+        parsed again"""
+        select = []
+        for column, dtype in columns.items():
+            name = column.rsplit(".", 1)[-1]
+            ident = _identifier(column)
+            if dtype == "VARCHAR" and (name == "id" or name.endswith("_id")):
+                select.append("TRY_CAST({0} AS BIGINT) AS {0}".format(ident))
+            elif dtype == "VARCHAR" and name in DATE_FIELDS:
+                select.append("TRY_CAST({0} AS DATE) AS {0}".format(ident))
+            elif dtype == "VARCHAR" and name in DATETIME_FIELDS:
+                select.append("TRY_CAST({0} AS TIMESTAMPTZ) AS {0}".format(ident))
+            elif dtype == "VARCHAR" and column in LINK_FIELDS:
+                structure = self.db.execute("SELECT json_group_structure(TRY_CAST({} AS JSON)) FROM ({})".format(
+                    ident, query)).fetchone()[0]
+                select.append("from_json({0}, {1}) AS {0}".format(ident, _quote(structure)))
+            else:
+                select.append(ident)
+        return "SELECT {} FROM ({})".format(", ".join(select), query)
+
+    def _build(self, resource):
+        table = table_name(resource)
+        scan = self._scan(self.sources[resource])
+        scan = self._typed(scan, self._columns(scan))
+        columns = self._columns(scan)
+        # An ID that occurs several times (windows, retries, updates) is kept in its newest version
+        order = "ORDER BY aktualisiert DESC NULLS LAST" if "aktualisiert" in columns else ""
+        full = "_{}_full".format(table)
+        self.db.execute("CREATE OR REPLACE TEMP TABLE {} AS SELECT * FROM ({}) "
+                        "QUALIFY row_number() OVER (PARTITION BY id {}) = 1".format(full, scan, order))
+        links = [field for field in LINK_FIELDS if field in columns and columns[field].endswith("[]")]
+        for field in links:
+            link = "{}_{}".format(table, field)
+            items = "SELECT id AS {}_id, UNNEST({}) AS item FROM {}".format(table, field, full)
+            if self._columns(items)["item"].startswith("STRUCT"):
+                query = "SELECT {}_id, UNNEST(item, recursive := true) FROM ({})".format(table, items)
+                link_columns = self._columns(query)
+                if link_columns.get("id") == "VARCHAR":
+                    query = "SELECT * REPLACE (TRY_CAST(id AS BIGINT) AS id) FROM ({})".format(query)
+            else:
+                query = "SELECT {}_id, item AS value FROM ({})".format(table, items)
+            self.db.execute("CREATE OR REPLACE TABLE {} AS {}".format(link, query))
+        if links:
+            self.db.execute("CREATE OR REPLACE TABLE {} AS SELECT * EXCLUDE ({}) FROM {}".format(
+                table, ", ".join(links), full))
+        else:
+            self.db.execute("CREATE OR REPLACE TABLE {} AS SELECT * FROM {}".format(table, full))
+        self.db.execute("DROP TABLE {}".format(full))
+        count = self.db.execute("SELECT count(*) FROM {}".format(table)).fetchone()[0]
+        logger.debug("Loaded {} rows into {}".format(count, table))
+        return count
+
+    def sql(self, query, params=None):
+        """Runs a SQL query
+
+        Parameters
+        ----------
+        query: str
+            The SQL query, e.g. a join of vorgang and vorgang_deskriptor
+        params: list, optional
+            Values of ? placeholders in the query
+
+        Returns
+        -------
+        data: DuckDBPyRelation
+            the result. Use .df(), .fetchall() or .arrow() to retrieve it
+        """
+        if params is not None:
+            return self.db.execute(query, params)
+        return self.db.sql(query)
+
+    def tables(self):
+        """Returns the names of all tables"""
+        return [row[0] for row in self.db.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main' "
+            "ORDER BY table_name").fetchall()]
+
+    def close(self):
+        self.db.close()
+        if self.tempdir is not None:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+            self.tempdir = None
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental decoding of API pages. Documents are decoded one by one while
+the response body is still being received
+"""
+
+import re
+import json
+import codecs
+import xml.etree.ElementTree as ET
+from .utils import NUMBER_FIELDS
+
+CHUNK_SIZE = 64 * 1024
+# Fields that are lists in JSON. In XML a list is a repeated element, so a
+# single element of these fields is wrapped in a list as well
+XML_LIST_FIELDS = ["aktivitaet_anzeige", "autoren_anzeige", "beschlussfassung", "deskriptor",
+                   "initiative", "inkrafttreten", "mitberaten", "person_roles", "ressort",
+                   "sachgebiet", "ueberweisung", "urheber", "verkuendung", "vorgangsbezug",
+                   "zustimmungsbeduerftigkeit"]
+WHITESPACE = " \t\n\r"
+STRUCTURE_PATTERN = re.compile(r'["{}\[\]]')
+
+
+def _scan_text(text, i, state):
+    """Scans text from i for the end of a JSON object or array. state holds
+    depth, whether the scan is inside a string and whether the last character
+    was a backslash, so a scan can continue in the next chunk. Returns the
+    index behind the value or None"""
+    depth, in_string, escape = state
+    n = len(text)
+    if escape and i < n:
+        i += 1
+        escape = False
+    while i < n:
+        if in_string:
+            # str.find is much faster than a regular expression on long texts
+            quote = text.find('"', i)
+            backslash = text.find("\\", i, n if quote < 0 else quote)
+            if backslash >= 0:
+                if backslash+1 >= n:
+                    escape = True
+                    i = n
+                    break
+                i = backslash+2
+                continue
+            if quote < 0:
+                i = n
+                break
+            in_string = False
+            i = quote+1
+            continue
+        match = STRUCTURE_PATTERN.search(text, i)
+        if match is None:
+            break
+        i = match.start()
+        char = text[i]
+        i += 1
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return i
+    state[0], state[1], state[2] = depth, in_string, escape
+    return None
+
+
+class PageDecoder:
+    """This class decodes a JSON page of the API from a stream of byte chunks.
+    The top-level fields (numFound, cursor) are collected in header and the
+    elements of "documents" are decoded one by one, so only the current
+    document has to be held in memory
+
+    Methods
+    -------
+    head():
+        Reads the top-level fields before the documents
+    documents():
+        Yields the documents of the page as soon as each one is complete
+    finish():
+        Reads the rest of the page and returns the top-level fields
+    """
+
+    def __init__(self, chunks, encoding="utf-8"):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes = 0
+        self.header = {}
+        self.started = False
+        self.in_documents = False
+        self.done = False
+        self.iterator = None
+
+    def _more(self):
+        """Appends the next chunk to the buffer. Returns False at the end of
+        the stream"""
+        text = self._read()
+        if text is None:
+            return False
+        # Consumed text is dropped so the buffer only holds the current value
+        self.buffer = self.buffer[self.pos:]+text
+        self.pos = 0
+        return True
+
+    def _skip(self):
+        """Skips whitespace and returns the next character"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                raise ValueError("Unexpected end of page")
+
+    def _expect(self, chars):
+        char = self._skip()
+        if char not in chars:
+            raise ValueError("Expected {} at position {}, found {}".format(chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def _value(self):
+        """Decodes a complete value. A value that ends with the buffer may
+        continue in the next chunk (e.g. a number), so more data is read
+        until a character follows the value"""
+        self._skip()
+        while True:
+            try:
+                val, end = self.json.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._more()
+
+    def _read(self):
+        """Returns the text of the next chunk or None at the end of the stream"""
+        if self.eof:
+            return None
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return self.decoder.decode(b"", final=True)
+        self.bytes += len(chunk)
+        return self.decoder.decode(chunk)
+
+    def _scan(self):
+        """Returns the text of the object or array starting at pos and moves
+        pos behind it. Strings are skipped, so brackets inside of them are not
+        counted. Chunks are only joined once the value is complete"""
+        state = [0, False, False]
+        pieces = []
+        text = self.buffer
+        i = self.pos
+        while True:
+            end = _scan_text(text, i, state)
+            if end is not None:
+                if pieces:
+                    pieces.append(text[:end])
+                    self.buffer = text
+                    self.pos = end
+                    return "".join(pieces)
+                self.pos = end
+                return text[i:end]
+            pieces.append(text[i:])
+            text = self._read()
+            if text is None:
+                raise ValueError("Unexpected end of page")
+            i = 0
+
+    def _header(self):
+        """Reads top-level fields until the documents start or the page ends"""
+        if not self.started:
+            self._expect("{")
+            self.started = True
+            if self._skip() == "}":
+                self.pos += 1
+                self.done = True
+                return
+        while not self.done:
+            key = self._value()
+            self._expect(":")
+            if key == "documents":
+                self._expect("[")
+                self.in_documents = True
+                return
+            self.header[key] = self._value()
+            if self._expect(",}") == "}":
+                self.done = True
+
+    def head(self):
+        """Reads the top-level fields before the documents. numFound is
+        usually the first field of a page, so the documents need not be
+        received to learn the size of a result. Fields that follow the
+        documents are only returned by finish()
+
+        Returns
+        -------
+        data: dict
+            the top-level fields read so far
+        """
+        if self.iterator is None and not self.in_documents:
+            self._header()
+        return self.header
+
+    def documents(self):
+        """Yields the documents of the page. Repeated calls continue the same
+        iteration
+
+        Returns
+        -------
+        data: generator
+            the documents as dictionaries
+        """
+        if self.iterator is None:
+            self.iterator = self._documents()
+        return self.iterator
+
+    def _documents(self):
+        if not self.in_documents:
+            self._header()
+        if not self.in_documents:
+            return
+        if self._skip() == "]":
+            self.pos += 1
+        else:
+            while True:
+                self._skip()
+                yield self.json.decode(self._scan())
+                if self._expect(",]") == "]":
+                    break
+        self.in_documents = False
+        if self._expect(",}") == "}":
+            self.done = True
+
+    def finish(self):
+        """Reads the rest of the page. Documents that were not consumed are
+        skipped
+
+        Returns
+        -------
+        data: dict
+            the top-level fields of the page without the documents
+        """
+        for _ in self.documents():
+            pass
+        while not self.done:
+            self._header()
+        return self.header
+
+
+def _xml_value(tag, text):
+    if text is None:
+        return None
+    text = text.strip()
+    if tag in NUMBER_FIELDS and text.isdigit():
+        return int(text)
+    if text == "true":
+        return True
+    if text == "false":
+        return False
+    return text
+
+
+def project_element(element, tree):
+    """Removes the children of an XML element that are not in a tree from
+    compile_fields(). Repeated elements of a list are projected one by one"""
+    for child in list(element):
+        if child.tag not in tree:
+            element.remove(child)
+        elif tree[child.tag] is not None:
+            project_element(child, tree[child.tag])
+    return element
+
+
+def element_to_dict(element):
+    """Converts an XML element of a document into the dictionary the JSON
+    format returns. Repeated elements and known list fields become lists"""
+    children = list(element)
+    if not children:
+        return _xml_value(element.tag, element.text)
+    data = {}
+    repeated = set()
+    for child in children:
+        val = element_to_dict(child)
+        if child.tag in XML_LIST_FIELDS or child.tag in repeated:
+            data.setdefault(child.tag, []).append(val)
+        elif child.tag in data:
+            # A field that is not known as a list but occurs several times
+            data[child.tag] = [data[child.tag], val]
+            repeated.add(child.tag)
+        else:
+            data[child.tag] = val
+    return data
+
+
+class XmlPageDecoder:
+    """This class decodes an XML page of the API from a stream of byte
+    chunks with an incremental parser. The top-level fields (numFound,
+    cursor) are collected in header. Every document is handed on as soon as
+    its closing tag is parsed and then removed from the tree, so only the
+    current document is held in memory
+
+    Methods
+    -------
+    documents():
+        Yields the documents of the page as soon as each one is complete
+    finish():
+        Reads the rest of the page and returns the top-level fields
+    """
+
+    def __init__(self, chunks, elements=False):
+        self.chunks = iter(chunks)
+        self.elements = elements
+        self.parser = ET.XMLPullParser(events=("start", "end"))
+        self.bytes = 0
+        self.header = {}
+        self.iterator = None
+
+    def documents(self):
+        """Yields the documents of the page as dictionaries or, with elements,
+        as XML elements. Repeated calls continue the same iteration
+
+        Returns
+        -------
+        data: generator
+            the documents
+        """
+        if self.iterator is None:
+            self.iterator = self._documents()
+        return self.iterator
+
+    def _events(self):
+        for chunk in self.chunks:
+            self.bytes += len(chunk)
+            self.parser.feed(chunk)
+            yield from self.parser.read_events()
+        self.parser.close()
+        yield from self.parser.read_events()
+
+    def _documents(self):
+        # The path of open elements: root, documents, document, fields...
+        path = []
+        for event, element in self._events():
+            if event == "start":
+                path.append(element)
+                continue
+            path.pop()
+            depth = len(path)
+            if depth == 1 and element.tag != "documents":
+                self.header[element.tag] = _xml_value(element.tag, element.text)
+                path[0].remove(element)
+            elif depth == 2 and path[1].tag == "documents":
+                if self.elements:
+                    yield element
+                else:
+                    yield element_to_dict(element)
+                # Finished documents are dropped from the tree
+                path[1].remove(element)
+                if not self.elements:
+                    element.clear()
+
+    def finish(self):
+        """Reads the rest of the page. Documents that were not consumed are
+        skipped
+
+        Returns
+        -------
+        data: dict
+            the top-level fields of the page without the documents
+        """
+        for _ in self.documents():
+            pass
+        return self.header
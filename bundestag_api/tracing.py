@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Optional OpenTelemetry spans for queries and pages. Without the
+opentelemetry-api package all functions are no-ops
+"""
+
+import functools
+import threading
+
+try:
+    from opentelemetry import trace, context
+except ImportError:
+    trace = None
+    context = None
+
+_state = threading.local()
+
+
+def get_tracer():
+    """Returns the tracer of the package or None if OpenTelemetry is missing"""
+    if trace is None:
+        return None
+    return trace.get_tracer("bundestag_api")
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+def start_span(tracer, name, attributes=None):
+    """Starts a span as the current span or returns a no-op context manager"""
+    if tracer is None:
+        return NO_SPAN
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+def set_attributes(span, attributes):
+    if span is None:
+        return
+    for key, val in attributes.items():
+        if val is not None:
+            span.set_attribute(key, val)
+
+
+def traced(method):
+    """Wraps a public method of btaConnection in a span. Nested calls (e.g.
+    search_document calling query) do not open further spans"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.tracer is None or getattr(_state, "active", False):
+            return method(self, *args, **kwargs)
+        _state.active = True
+        try:
+            with self.tracer.start_as_current_span("bundestag_api."+method.__name__) as span:
+                _state.span = span
+                return method(self, *args, **kwargs)
+        finally:
+            _state.active = False
+            _state.span = None
+    return wrapper
+
+
+def current_span():
+    """Returns the span of the outermost traced call of this thread"""
+    return getattr(_state, "span", None)
+
+
+def propagate(function):
+    """Returns a function that runs with the tracing context of the caller,
+    e.g. in a worker thread"""
+    if context is None:
+        return function
+    ctx = context.get_current()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = context.attach(ctx)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            context.detach(token)
+    return wrapper
@@ -5,8 +5,18 @@ Created on Fri Mar  8 14:33:26 2024
 @author: jschi
 """
 
+import json
+import time
+import threading
 from datetime import datetime
 
+RESOURCETYPES = ["aktivitaet", "drucksache", "drucksache-text", "person",
+                 "plenarprotokoll", "plenarprotokoll-text", "vorgang",
+                 "vorgangsposition"]
+INSTITUTIONS = ["BT", "BR", "BV", "EK"]
+# Returned by queries instead of data if nothing matched
+NO_DATA = "No data was returned."
+
 
 def is_iso8601(string):
     iso_format = "%Y-%m-%dT%H:%M:%S"
@@ -17,6 +27,12 @@ def is_iso8601(string):
         return False
 
 
+def is_error(result):
+    """Returns True if a query returned an error message instead of data.
+    A query without results (NO_DATA) is not an error"""
+    return isinstance(result, str) and result != NO_DATA
+
+
 def parse_args_to_dict(args):
     args_dict = {}
     for arg in args:
@@ -27,3 +43,91 @@ def parse_args_to_dict(args):
             key = key.lstrip('-')
             args_dict[key] = val
     return args_dict
+
+
+def canonical_key(resource, params):
+    """Returns a stable string for a resource and its parameters. Parameters
+    that are None are dropped and lists are sorted, so equivalent queries
+    share the same key"""
+    items = {}
+    for key, val in params.items():
+        if val is None:
+            continue
+        if isinstance(val, (list, tuple, set)):
+            val = sorted(str(item) for item in val)
+        else:
+            val = str(val)
+        items[key] = val
+    return json.dumps([resource, items], sort_keys=True, ensure_ascii=False)
+
+
+# Fields that are numbers in the JSON format of the API. The XML format and
+# the DataFrames convert them to integers as well
+NUMBER_FIELDS = ["numFound", "wahlperiode", "wahlperiode_nummer", "autoren_anzahl",
+                 "vorgangsbezug_anzahl", "aktivitaet_anzahl", "anfangsseite", "endseite"]
+
+# Fields the models can not be constructed without. Nested fields are only
+# kept if their parent is in the document
+MODEL_FIELDS = {"aktivitaet": ["vorgangsbezug.id", "fundstelle.id"],
+                "drucksache": ["autoren_anzeige.id", "autoren_anzeige.titel"],
+                "drucksache-text": ["autoren_anzeige.id", "autoren_anzeige.titel"],
+                "person": ["titel", "vorname", "person_roles.funktion"],
+                "vorgang": ["inkrafttreten.datum"]}
+
+
+def compile_fields(fields, required=None):
+    """Turns a list of fields into a tree for project(). Nested fields are
+    separated by dots, e.g. "fundstelle.pdf_url". The id and the required
+    fields are always kept"""
+    if isinstance(fields, dict):
+        # Already compiled
+        return fields
+    if isinstance(fields, str):
+        fields = [fields]
+    if not isinstance(fields, (list, tuple, set)) or not all(isinstance(f, str) for f in fields):
+        raise ValueError("fields must be a string or a list of strings")
+    tree = {"id": None}
+    for field in list(fields)+(required or []):
+        node = tree
+        parts = field.split(".")
+        for part in parts[:-1]:
+            if node.get(part, {}) is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def project(doc, tree):
+    """Returns a document with the fields of a tree from compile_fields().
+    Lists of dictionaries are projected element by element"""
+    if isinstance(doc, list):
+        return [project(item, tree) for item in doc]
+    if not isinstance(doc, dict):
+        return doc
+    data = {}
+    for key, subtree in tree.items():
+        if key in doc:
+            data[key] = doc[key] if subtree is None else project(doc[key], subtree)
+    return data
+
+
+class RateLimiter:
+    """Spaces calls so that at most rate calls per second are made across
+    all threads sharing the limiter"""
+
+    def __init__(self, rate):
+        if rate <= 0:
+            raise ValueError("rate must be larger than zero")
+        self.interval = 1.0/rate
+        self.lock = threading.Lock()
+        self.next_call = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call-now
+            self.next_call = max(self.next_call, now)+self.interval
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+A durable work queue in SQLite for harvesting with many worker processes
+on one or more hosts
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from multiprocessing import Process
+from .harvest import split_dates, plan_windows, open_writer
+from .local import _as_documents
+from .utils import canonical_key, is_error
+
+logger = logging.getLogger("bundestag_api")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    resource TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    records INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+CREATE TABLE IF NOT EXISTS results (
+    resource TEXT NOT NULL,
+    id TEXT NOT NULL,
+    aktualisiert TEXT,
+    document TEXT NOT NULL,
+    task INTEGER NOT NULL,
+    PRIMARY KEY (resource, id)
+);
+"""
+
+STATUSES = ["pending", "leased", "done", "failed"]
+
+
+def plan_tasks(resource, date_start=None, date_end=None, window_days=30, filter_sets=None,
+               connection=None, target_size=None):
+    """Splits a harvest into tasks of one date window and one filter set.
+    With a connection and target_size, the windows of every filter set are
+    planned by their number of documents (see plan_windows) and the largest
+    tasks come first
+
+    Returns
+    -------
+    data: list
+        a list of (resource, params) tuples
+    """
+    if (date_start is None) != (date_end is None):
+        raise ValueError("date_start and date_end must be given together")
+    if target_size is not None and (connection is None or date_start is None):
+        raise ValueError("target_size needs a connection, date_start and date_end")
+    if date_start is not None:
+        windows = split_dates(date_start, date_end, window_days)
+    else:
+        windows = [(None, None)]
+    if not filter_sets:
+        filter_sets = [{}]
+    tasks = []
+    if target_size is not None:
+        planned = []
+        for filters in filter_sets:
+            for start, end, count in plan_windows(connection, resource, date_start, date_end,
+                                                  target_size, **filters):
+                planned.append((count, (resource, dict(filters, date_start=start, date_end=end))))
+        return [task for count, task in sorted(planned, key=lambda p: -p[0])]
+    for filters in filter_sets:
+        for window in windows:
+            params = dict(filters)
+            if window[0] is not None:
+                params["date_start"], params["date_end"] = window
+            tasks.append((resource, params))
+    return tasks
+
+
+class WorkQueue:
+    """This class stores harvest tasks and their results in a SQLite
+    database that is shared by a coordinator and any number of workers.
+    Workers lease tasks for lease_seconds. A task whose lease runs out is
+    handed to the next worker, so every task is run at least once. Results
+    are stored once per resource and ID, so repeated runs do not duplicate
+    documents
+
+    Several hosts can share the database on a network file system with
+    working file locks. Set wal=False in that case.
+
+    Methods
+    -------
+    submit(tasks):
+        Adds tasks. Tasks that are already queued are ignored
+    claim(worker):
+        Leases the next task to a worker
+    heartbeat(task, worker):
+        Extends the lease of a running task
+    complete(task, worker, documents):
+        Stores the results of a task and marks it as done
+    fail(task, worker, error):
+        Returns a task to the queue or marks it as failed
+    status():
+        Returns the number of tasks per status and of stored documents
+    documents(resource=None):
+        Iterates over the stored documents
+    """
+
+    def __init__(self, path, lease_seconds=600, max_attempts=5, wal=True):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.wal = wal
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        if wal:
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __str__(self):
+        return "WorkQueue: "+str(self.path)
+
+    def __repr__(self):
+        return "WorkQueue: "+str(self.path)
+
+    def submit(self, tasks):
+        """Adds tasks to the queue
+
+        Parameters
+        ----------
+        tasks: list
+            a list of (resource, params) tuples as returned by plan_tasks()
+
+        Returns
+        -------
+        data: int
+            the number of new tasks
+        """
+        rows = [(canonical_key(resource, params), resource, json.dumps(params, sort_keys=True))
+                for resource, params in tasks]
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            self.db.executemany("INSERT OR IGNORE INTO tasks (key, resource, params) VALUES (?, ?, ?)", rows)
+            after = self.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return after-before
+
+    def claim(self, worker):
+        """Leases the next pending task or a task whose lease ran out
+
+        Parameters
+        ----------
+        worker: str
+            Name of the worker
+
+        Returns
+        -------
+        data: dict
+            the task with id, resource, params and attempts or None if no
+            task is available
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT id, resource, params, attempts FROM tasks "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            self.db.execute("UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, "
+                            "attempts = attempts + 1 WHERE id = ?",
+                            (worker, now+self.lease_seconds, row[0]))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return {"id": row[0], "resource": row[1], "params": json.loads(row[2]), "attempts": row[3]+1}
+
+    def heartbeat(self, task, worker):
+        """Extends the lease of a task. Returns False if the task was handed
+        to another worker in the meantime"""
+        cursor = self.db.execute("UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? "
+                                 "AND status = 'leased'",
+                                 (time.time()+self.lease_seconds, task["id"], worker))
+        return cursor.rowcount == 1
+
+    def complete(self, task, worker, documents):
+        """Stores the documents of a task and marks it as done. Documents
+        that are already stored are replaced by the later version
+
+        Parameters
+        ----------
+        task: dict
+            The task returned by claim()
+        worker: str
+            Name of the worker
+        documents: list
+            The documents of the task
+        """
+        rows = [(task["resource"], str(doc["id"]), doc.get("aktualisiert"),
+                 json.dumps(doc, ensure_ascii=False), task["id"]) for doc in documents]
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                stored = self.db.execute("SELECT aktualisiert FROM results WHERE resource = ? AND id = ?",
+                                         row[:2]).fetchone()
+                if stored is not None and (stored[0] or "") > (row[2] or ""):
+                    continue
+                self.db.execute("INSERT OR REPLACE INTO results (resource, id, aktualisiert, document, task) "
+                                "VALUES (?, ?, ?, ?, ?)", row)
+            self.db.execute("UPDATE tasks SET status = 'done', worker = ?, records = ?, error = NULL "
+                            "WHERE id = ?", (worker, len(rows), task["id"]))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def fail(self, task, worker, error):
+        """Returns a task to the queue. After max_attempts attempts it is
+        marked as failed"""
+        status = "failed" if task["attempts"] >= self.max_attempts else "pending"
+        self.db.execute("UPDATE tasks SET status = ?, error = ?, lease_until = NULL "
+                        "WHERE id = ? AND worker = ? AND status = 'leased'",
+                        (status, str(error), task["id"], worker))
+
+    def status(self):
+        """Returns the state of the queue
+
+        Returns
+        -------
+        data: dict
+            the number of tasks per status, the number of expired leases and
+            the number of stored documents
+        """
+        data = {s: 0 for s in STATUSES}
+        for status, n in self.db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+            data[status] = n
+        data["expired"] = self.db.execute("SELECT COUNT(*) FROM tasks WHERE status = 'leased' "
+                                          "AND lease_until < ?", (time.time(),)).fetchone()[0]
+        data["documents"] = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return data
+
+    def documents(self, resource=None):
+        """Iterates over the stored documents in order of their IDs"""
+        if resource is None:
+            rows = self.db.execute("SELECT resource, document FROM results ORDER BY resource, id")
+        else:
+            rows = self.db.execute("SELECT resource, document FROM results WHERE resource = ? "
+                                   "ORDER BY id", (resource,))
+        for resource, document in rows:
+            yield resource, json.loads(document)
+
+    def export(self, output, output_format="jsonl"):
+        """Writes the stored documents to a JSONL file, a Parquet directory or
+        a local corpus and returns the number of documents"""
+        writer = open_writer(output, output_format)
+        count = 0
+        batch = []
+        current = None
+        for resource, doc in self.documents():
+            if batch and (resource != current or len(batch) >= 10000):
+                writer.write(current, batch, (None, None))
+                batch = []
+            current = resource
+            batch.append(doc)
+            count += 1
+        if batch:
+            writer.write(current, batch, (None, None))
+        writer.close()
+        return count
+
+
+class Worker:
+    """This class claims tasks from a work queue, runs them through
+    btaConnection.query and reports the results
+
+    Methods
+    -------
+    run(max_tasks=None):
+        Works on tasks until the queue is empty or max_tasks are done
+    """
+
+    def __init__(self, connection, queue, name=None, wait=False, poll_seconds=5):
+        self.connection = connection
+        self.queue = queue
+        if name is None:
+            name = "{}-{}".format(socket.gethostname(), os.getpid())
+        self.name = name
+        self.wait = wait
+        self.poll_seconds = poll_seconds
+
+    def __str__(self):
+        return "Worker: "+self.name
+
+    def __repr__(self):
+        return "Worker: "+self.name
+
+    def _heartbeat(self, task, stop):
+        # SQLite connections can not be shared between threads
+        queue = WorkQueue(self.queue.path, lease_seconds=self.queue.lease_seconds, wal=self.queue.wal)
+        try:
+            while not stop.wait(max(self.queue.lease_seconds/3, 1)):
+                if not queue.heartbeat(task, self.name):
+                    logger.warning("Lease of task {} was lost".format(task["id"]))
+                    break
+        finally:
+            queue.close()
+
+    def run_task(self, task):
+        """Runs the query of a task while its lease is extended"""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task, stop), daemon=True)
+        heartbeat.start()
+        try:
+            data = self.connection.query(task["resource"], num=10**9, **task["params"])
+        finally:
+            stop.set()
+            heartbeat.join()
+        if is_error(data):
+            raise RuntimeError(data)
+        return _as_documents(data)
+
+    def run(self, max_tasks=None):
+        """Works on tasks until no task is left. With wait=True the worker
+        keeps polling for new tasks instead
+
+        Parameters
+        ----------
+        max_tasks: int, optional
+            Number of tasks after which the worker stops
+
+        Returns
+        -------
+        data: dict
+            the number of finished and failed tasks and stored documents
+        """
+        summary = {"tasks": 0, "failed": 0, "records": 0}
+        while max_tasks is None or summary["tasks"]+summary["failed"] < max_tasks:
+            task = self.queue.claim(self.name)
+            if task is None:
+                if not self.wait:
+                    break
+                time.sleep(self.poll_seconds)
+                continue
+            try:
+                documents = self.run_task(task)
+            except Exception as e:
+                logger.error("Task {} failed: {}".format(task["id"], e))
+                self.queue.fail(task, self.name, e)
+                summary["failed"] += 1
+                continue
+            self.queue.complete(task, self.name, documents)
+            summary["tasks"] += 1
+            summary["records"] += len(documents)
+        return summary
+
+
+def _work(path, apikey, key_budget, rate_limit, lease_seconds, wal):
+    from .bta_wrapper import btaConnection
+    from .keys import KeyPool
+    if isinstance(apikey, list) and key_budget is not None:
+        apikey = KeyPool(apikey, budget=key_budget)
+    queue = WorkQueue(path, lease_seconds=lease_seconds, wal=wal)
+    try:
+        Worker(btaConnection(apikey=apikey, rate_limit=rate_limit), queue).run()
+    finally:
+        queue.close()
+
+
+def run_workers(path, processes=4, apikey=None, key_budget=None, rate_limit=None, lease_seconds=600,
+                wal=True):
+    """Starts worker processes on this host and waits until the queue is empty
+
+    Parameters
+    ----------
+    path: str
+        Path of the queue database
+    processes: int, optional
+        Number of worker processes. Defaults to 4
+    apikey: str/list, optional
+        API key or list of API keys for the connections of the workers
+    key_budget: int, optional
+        Requests per key and hour on this host. It is split evenly between
+        the processes
+    rate_limit: float, optional
+        Maximal requests per second of each worker
+    """
+    if key_budget is not None:
+        key_budget = max(key_budget // processes, 1)
+    workers = [Process(target=_work, args=(path, apikey, key_budget, rate_limit, lease_seconds, wal))
+               for _ in range(processes)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
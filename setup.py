@@ -21,5 +21,15 @@ setup(
     install_requires=[
          'requests>=2.0.0',
     ],
+    extras_require={
+         'pandas': ['pandas>1.2.0'],
+         'analytics': ['numpy>=1.17.0'],
+         'arrow': ['numpy>=1.17.0', 'pyarrow>=5.0.0'],
+         'tracing': ['opentelemetry-api>=1.0.0'],
+         'sql': ['duckdb>=0.9.0'],
+    },
+    entry_points={
+         'console_scripts': ['bundestag-api=bundestag_api.cli:main'],
+    },
     python_requires='>=3.7.0'
 )
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+from bundestag_api.analytics import Columns, DEFAULT_FIELDS
+from bundestag_api.bta_wrapper import MODELS
+from bundestag_api.models import Drucksache
+
+RECORDS = [{"id": "1", "typ": "Dokument", "datum": "2022-05-02", "drucksachetyp": "Antrag",
+            "urheber": [{"bezeichnung": "SPD", "titel": "Fraktion der SPD"}]},
+           {"id": "2", "typ": "Dokument", "datum": "2022-05-08", "drucksachetyp": "Antrag",
+            "urheber": [{"bezeichnung": "AfD", "titel": "Fraktion der AfD"}]},
+           {"id": "3", "typ": "Dokument", "datum": "2022-05-09", "drucksachetyp": "Kleine Anfrage",
+            "urheber": [{"bezeichnung": "SPD", "titel": "Fraktion der SPD"}]},
+           {"id": "4", "typ": "Aktivität", "datum": "2022-05-10", "titel": "Olaf Scholz, MdB, SPD"}]
+
+
+def test_count_by():
+    columns = Columns(RECORDS)
+    labels, counts = columns.count_by("fraktion")
+    assert dict(zip(labels, counts)) == {"SPD": 3, "AfD": 1}
+    labels, counts = columns.count_by("datum", freq="W")
+    assert list(labels) == [np.datetime64("2022-05-02"), np.datetime64("2022-05-09")]
+    assert list(counts) == [2, 2]
+
+
+def test_crosstab():
+    columns = Columns(RECORDS)
+    rows, cols, counts = columns.crosstab("drucksachetyp", "fraktion")
+    assert list(rows) == ["Antrag", "Kleine Anfrage"] and list(cols) == ["SPD", "AfD"]
+    assert counts.tolist() == [[1, 1], [1, 0]]
+    columns = Columns({"1": Drucksache(RECORDS[0])}, fields=["id", "datum", "drucksachetyp"])
+    assert columns.count_by("drucksachetyp")[1].tolist() == [1]
+
+
+EXAMPLES = {
+    "aktivitaet": {"id": "1", "typ": "Aktivität", "aktivitaetsart": "Rede", "datum": "2022-05-10",
+                   "titel": "Olaf Scholz, MdB, SPD", "dokumentart": "Plenarprotokoll", "wahlperiode": 20,
+                   "vorgangsbezug_anzahl": 1, "vorgangsbezug": [{"id": "7"}], "fundstelle": {"id": "9"}},
+    "drucksache": RECORDS[0],
+    "person": {"id": "1", "typ": "Person", "nachname": "Scholz", "vorname": "Olaf", "datum": "2022-05-10",
+               "titel": "Olaf Scholz, MdB, SPD", "wahlperiode": 20},
+    "plenarprotokoll": {"id": "1", "typ": "Dokument", "dokumentart": "Plenarprotokoll", "herausgeber": "BR",
+                        "datum": "2022-05-13", "wahlperiode": 20, "dokumentnummer": "1021"},
+    "vorgang": {"id": "1", "typ": "Vorgang", "vorgangstyp": "Gesetzgebung", "datum": "2022-05-01",
+                "wahlperiode": 20},
+    "vorgangsposition": {"id": "1", "typ": "Vorgangsposition", "dokumentart": "Drucksache", "zuordnung": "BT",
+                         "datum": "2022-05-02", "vorgangsposition": "Antrag", "vorgang_id": "7",
+                         "urheber": [{"bezeichnung": "SPD", "titel": "Fraktion der SPD"}]}}
+EXAMPLES["drucksache"] = dict(EXAMPLES["drucksache"], dokumentart="Drucksache", herausgeber="BT", wahlperiode=20)
+
+
+@pytest.mark.parametrize("resource", sorted(EXAMPLES))
+def test_objects_match_dicts(resource):
+    documents = [EXAMPLES[resource], dict(EXAMPLES[resource], id="2")]
+    from_dicts = Columns(documents)
+    from_objects = Columns([MODELS[resource](doc) for doc in documents])
+    assert from_objects.ids.tolist() == from_dicts.ids.tolist()
+    for field in DEFAULT_FIELDS:
+        if field in from_dicts.dates:
+            assert from_objects.dates[field].tolist() == from_dicts.dates[field].tolist()
+        elif field != "id":
+            assert from_objects.categories[field].tolist() == from_dicts.categories[field].tolist(), field
+            assert from_objects.codes[field].tolist() == from_dicts.codes[field].tolist(), field
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import json
+from bundestag_api.changes import ChangeFeed
+
+
+def vorgang(btid, beratungsstand, aktualisiert="2022-05-01T10:00:00+02:00"):
+    return {"id": btid, "titel": "Gesetz", "beratungsstand": beratungsstand,
+            "deskriptor": [{"name": "Pflege", "typ": "Sachbegriffe"}], "aktualisiert": aktualisiert}
+
+
+class PollConnection:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def query(self, resource, num=100, **params):
+        self.calls.append(params)
+        return self.results.pop(0)
+
+
+def test_change_feed(tmp_path):
+    log = str(tmp_path / "changes.jsonl")
+    feed = ChangeFeed(state=str(tmp_path / "state.json"), log=log)
+    updates = []
+    feed.subscribe(updates.append, resource="vorgang", types=["updated"])
+    events = feed.process("vorgang", [vorgang("1", "Noch nicht beraten"), vorgang("2", "Noch nicht beraten")])
+    assert [e.type for e in events] == ["created", "created"]
+    doc = vorgang("1", "Beschlussempfehlung liegt vor", "2022-06-01T10:00:00+02:00")
+    doc["deskriptor"] = [{"typ": "Sachbegriffe", "name": "Pflege"}]
+    events = feed.process("vorgang", [doc, vorgang("2", "Noch nicht beraten", "2022-06-01T10:00:00+02:00")],
+                          complete=True)
+    assert [(e.type, e.btid, e.changed) for e in events] == [("updated", "1", ["beratungsstand"])]
+    assert updates == events
+    events = feed.process("vorgang", [doc], complete=True)
+    assert [(e.type, e.btid) for e in events] == [("deleted", "2")]
+    with open(log) as f:
+        assert [json.loads(line)["type"] for line in f] == ["created", "created", "updated", "deleted"]
+
+
+def test_change_feed_poll(tmp_path):
+    state = str(tmp_path / "state.json")
+    conn = PollConnection([[vorgang("1", "Noch nicht beraten")],
+                           vorgang("1", "Abgeschlossen", "2022-06-01T10:00:00+02:00")])
+    assert len(ChangeFeed(state=state).poll(conn, "vorgang", institution="BT")) == 1
+    feed = ChangeFeed(state=state)
+    events = feed.poll(conn, "vorgang", institution="BT")
+    assert conn.calls[1] == {"institution": "BT", "updated_since": "2022-05-01T10:00:00"}
+    assert [str(e) for e in events] == ["updated vorgang 1: beratungsstand"]
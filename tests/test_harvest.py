@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import json
+import pytest
+from bundestag_api.harvest import Harvester, split_dates, plan_windows
+from bundestag_api.idset import IdSet
+from bundestag_api.cli import parse_filters
+
+
+class WindowConnection:
+    """Returns one document per day of a window and fails on request"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.windows = []
+        self.hooks = {"query_end": [], "request_end": [], "page": [], "retry": [], "error": []}
+
+    def add_hook(self, event, callback):
+        self.hooks[event].append(callback)
+
+    def remove_hook(self, event, callback):
+        self.hooks[event].remove(callback)
+
+    def iter_query(self, resource, date_start=None, date_end=None, pages=False, checkpoint=None,
+                   checkpoint_every=10, **filters):
+        if date_start == self.fail_on:
+            raise ConnectionError("failed")
+        self.windows.append(date_start)
+        days = range(int(date_start[-2:]), int(date_end[-2:])+1)
+        yield [{"id": str(d), "datum": "2022-05-{:02d}".format(d)} for d in days]
+
+
+def test_split_dates():
+    assert split_dates("2022-05-01", "2022-05-10", 4) == [("2022-05-01", "2022-05-04"),
+                                                         ("2022-05-05", "2022-05-08"),
+                                                         ("2022-05-09", "2022-05-10")]
+
+
+def test_harvest_resume(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    conn = WindowConnection(fail_on="2022-05-05")
+    harvester = Harvester(conn, "drucksache", output, date_start="2022-05-01", date_end="2022-05-10",
+                          window_days=4, concurrency=1, progress=False)
+    with pytest.raises(ConnectionError):
+        harvester.run()
+    conn = WindowConnection()
+    harvester = Harvester(conn, "drucksache", output, date_start="2022-05-01", date_end="2022-05-10",
+                          window_days=4, concurrency=2, progress=False)
+    summary = harvester.run()
+    assert "2022-05-01" not in conn.windows
+    assert summary["records_total"] == 10
+    with open(output) as f:
+        assert sorted(int(json.loads(line)["id"]) for line in f) == list(range(1, 11))
+
+
+class RepeatingConnection(WindowConnection):
+    """Delivers every page twice, like a page fetched again after a resume"""
+
+    def iter_query(self, resource, **kwargs):
+        for page in WindowConnection.iter_query(self, resource, **kwargs):
+            yield page
+            yield page
+
+
+def test_harvest_dedup(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    harvester = Harvester(RepeatingConnection(), "drucksache", output, date_start="2022-05-01",
+                          date_end="2022-05-10", window_days=4, concurrency=2, progress=False)
+    summary = harvester.run()
+    assert summary["records"] == 10
+    assert summary["duplicates"] == 10
+    assert len(IdSet.load(harvester.ids_path)) == 10
+    with open(output) as f:
+        assert sorted(int(json.loads(line)["id"]) for line in f) == list(range(1, 11))
+
+
+def test_idset():
+    first = IdSet([1, 5, 70000, 3000000])
+    second = IdSet(["5", "6"])
+    assert first.add(6) is True
+    assert first.add("6") is False
+    assert 70000 in first and 70001 not in first
+    assert list(first - second) == [1, 70000, 3000000]
+    assert list(first & second) == [5, 6]
+    assert len(first | IdSet([7])) == 6
+    assert IdSet.from_bytes(first.to_bytes()) == first
+    first.discard(70000)
+    assert list(first) == [1, 5, 6, 3000000]
+
+
+class SkewedConnection(WindowConnection):
+    """Has 100 documents on every sitting day (the 10th to 12th) and one on
+    every other day"""
+
+    def __init__(self):
+        WindowConnection.__init__(self)
+        self.probes = []
+
+    def count_many(self, resource, filter_sets, concurrency=4):
+        counts = []
+        for params in filter_sets:
+            self.probes.append((params["date_start"], params["date_end"]))
+            days = range(int(params["date_start"][-2:]), int(params["date_end"][-2:])+1)
+            counts.append(sum(100 if 10 <= d <= 12 else 1 for d in days))
+        return counts
+
+
+def test_plan_windows(tmp_path):
+    conn = SkewedConnection()
+    windows = plan_windows(conn, "drucksache", "2022-05-01", "2022-05-31", 60)
+    assert sum(w[2] for w in windows) == 328
+    assert [w[2] for w in windows[:3]] == [100, 100, 100]
+    assert all(w[2] <= 60 or w[0] == w[1] for w in windows)
+    assert sorted((w[0], w[1]) for w in windows)[0][0] == "2022-05-01"
+    harvester = Harvester(conn, "drucksache", str(tmp_path / "out.jsonl"), date_start="2022-05-01",
+                          date_end="2022-05-31", target_size=60, concurrency=2, progress=False)
+    summary = harvester.run()
+    assert summary["windows"] == len(windows)
+    assert summary["records"] == 31
+
+
+def test_harvest_new_range(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    state = str(tmp_path / "state.json")
+    conn = SkewedConnection()
+    summary = Harvester(conn, "drucksache", output, date_start="2022-05-01", date_end="2022-05-10",
+                        target_size=60, state=state, progress=False).run()
+    assert summary["records"] == 10
+    # Another range with the same state file is not mistaken for a finished harvest
+    conn = SkewedConnection()
+    summary = Harvester(conn, "drucksache", output, date_start="2022-05-11", date_end="2022-05-20",
+                        target_size=60, state=state, progress=False).run()
+    assert summary["records"] == 10 and summary["records_total"] == 10
+    assert conn.probes[0] == ("2022-05-11", "2022-05-20")
+    conn = WindowConnection()
+    summary = Harvester(conn, "drucksache", output, date_start="2022-05-21", date_end="2022-05-30",
+                        window_days=5, state=state, progress=False).run()
+    assert sorted(conn.windows) == ["2022-05-21", "2022-05-26"]
+    with open(output) as f:
+        assert len(f.readlines()) == 30
+
+
+def test_parse_filters():
+    assert parse_filters(["institution=BT", "descriptor=Pflege,Gesundheit", "--processID=5"]) == \
+        {"institution": "BT", "descriptor": ["Pflege", "Gesundheit"], "processID": 5}
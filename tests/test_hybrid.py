@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from datetime import date, datetime, timedelta
+from bundestag_api import hybrid
+from bundestag_api.hybrid import HybridPlanner, subtract_windows
+from bundestag_api.local import LocalCorpus
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, resource, num=100, date_start=None, date_end=None, **kwargs):
+        self.calls.append((date_start, date_end))
+        return [{"id": str(i), "datum": date_start} for i in range(int(date_start[-2:]), int(date_end[-2:])+1)]
+
+
+def test_subtract_windows():
+    d = date(2022, 5, 1)
+    missing = subtract_windows((d, d + timedelta(days=9)), [(d + timedelta(days=2), d + timedelta(days=3))])
+    assert missing == [(d, d + timedelta(days=1)), (d + timedelta(days=4), d + timedelta(days=9))]
+
+
+def test_planner_fetches_delta(tmp_path):
+    conn = RecordingConnection()
+    planner = HybridPlanner(conn, LocalCorpus(str(tmp_path)))
+    data = planner.query("drucksache", num=1000, date_start="2022-05-01", date_end="2022-05-10")
+    assert len(data) == 10
+    data = planner.query("drucksache", num=1000, date_start="2022-05-05", date_end="2022-05-12")
+    assert conn.calls == [("2022-05-01", "2022-05-10"), ("2022-05-11", "2022-05-12")]
+    # Windows of 2022 were fetched long after they passed and are settled
+    planner = HybridPlanner(conn, LocalCorpus(str(tmp_path)), max_age=timedelta(0))
+    local, remote = planner.plan("drucksache", "2022-05-01", "2022-05-12")
+    assert len(local) == 1 and remote == []
+    planner = HybridPlanner(conn, LocalCorpus(str(tmp_path)), max_age=timedelta(0), settle_after=None)
+    local, remote = planner.plan("drucksache", "2022-05-01", "2022-05-12")
+    assert local == [] and len(remote) == 1
+
+
+class FailingConnection:
+    def __init__(self):
+        self.calls = []
+        self.error = "An authorization error occured. Likely an error with you API key. Code 401: Error"
+
+    def query(self, resource, num=100, date_start=None, date_end=None, **kwargs):
+        self.calls.append((date_start, date_end))
+        if self.error is not None:
+            return self.error
+        return [{"id": "1", "datum": date_start}]
+
+
+def test_planner_error(tmp_path):
+    conn = FailingConnection()
+    planner = HybridPlanner(conn, LocalCorpus(str(tmp_path)))
+    with pytest.raises(RuntimeError):
+        planner.query("drucksache", date_start="2022-05-01", date_end="2022-05-10")
+    local, remote = planner.plan("drucksache", "2022-05-01", "2022-05-10")
+    assert local == [] and len(remote) == 1
+    conn.error = None
+    data = planner.query("drucksache", date_start="2022-05-01", date_end="2022-05-10")
+    assert data["id"] == "1"
+    assert len(conn.calls) == 2
+
+
+def test_planner_settled_days(tmp_path, monkeypatch):
+    class Yesterday(datetime):
+        @classmethod
+        def now(cls):
+            return datetime.now() - timedelta(days=1)
+
+    conn = FailingConnection()
+    conn.error = None
+    today = date.today()
+    day = lambda d: (today - timedelta(days=d)).strftime("%Y-%m-%d")
+    planner = HybridPlanner(conn, LocalCorpus(str(tmp_path)), settle_after=timedelta(days=7))
+    # The dashboard of the last 30 days is opened yesterday and again today
+    monkeypatch.setattr(hybrid, "datetime", Yesterday)
+    planner.query("drucksache", date_start=day(31), date_end=day(1))
+    monkeypatch.setattr(hybrid, "datetime", datetime)
+    planner.query("drucksache", date_start=day(30), date_end=day(0))
+    assert conn.calls == [(day(31), day(1)), (day(7), day(0))]
+    # By default the days settle after two days
+    conn.calls = []
+    planner = HybridPlanner(conn, LocalCorpus(str(tmp_path / "default")))
+    monkeypatch.setattr(hybrid, "datetime", Yesterday)
+    planner.query("drucksache", date_start=day(31), date_end=day(1))
+    monkeypatch.setattr(hybrid, "datetime", datetime)
+    planner.query("drucksache", date_start=day(30), date_end=day(0))
+    assert conn.calls == [(day(31), day(1)), (day(2), day(0))]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from bundestag_api.local import LocalCorpus
+
+DOCUMENTS = [{"id": "1", "typ": "Vorgang", "datum": "2022-05-02", "aktualisiert": "2022-05-03T10:00:00+02:00",
+              "titel": "Gesetz zur Stärkung der Pflege", "vorgangstyp": "Gesetzgebung",
+              "deskriptor": [{"name": "Pflege"}, {"name": "Gesundheit"}], "sachgebiet": ["Gesundheit"]},
+             {"id": "2", "typ": "Vorgang", "datum": "2022-05-10", "aktualisiert": "2022-05-11T10:00:00+02:00",
+              "titel": "Antrag zur Digitalisierung", "vorgangstyp": "Antrag",
+              "deskriptor": [{"name": "Digitalisierung"}], "sachgebiet": ["Medien"]},
+             {"id": "3", "typ": "Vorgang", "datum": "2022-06-01", "aktualisiert": "2022-06-01T10:00:00+02:00",
+              "titel": "Pflege und Digitalisierung", "vorgangstyp": "Gesetzgebung",
+              "deskriptor": [{"name": "Pflege"}, {"name": "Digitalisierung"}], "sachgebiet": ["Gesundheit", "Medien"]}]
+
+POSITIONS = [{"id": "10", "vorgang_id": "3", "datum": "2022-06-01", "zuordnung": "BT",
+              "fundstelle": {"id": "500", "dokumentart": "Drucksache", "drucksachetyp": "Gesetzentwurf"}}]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    corpus = LocalCorpus(str(tmp_path))
+    corpus.add("vorgang", DOCUMENTS)
+    corpus.add("vorgangsposition", POSITIONS)
+    return corpus
+
+
+def test_local_filters(corpus):
+    data = corpus.query("vorgang", descriptor=["Pflege", "Digitalisierung"])
+    assert data["id"] == "3"
+    data = corpus.query("vorgang", date_start="2022-05-01", date_end="2022-05-31")
+    assert [d["id"] for d in data] == ["2", "1"]
+    data = corpus.query("vorgang", title=["stärkung pflege", "Antrag"])
+    assert [d["id"] for d in data] == ["2", "1"]
+    data = corpus.query("vorgang", process_type="Gesetzgebung", updated_since="2022-05-20T00:00:00")
+    assert data["id"] == "3"
+    assert corpus.query("vorgang", documentID=500)["id"] == "3"
+    assert corpus.query("vorgangsposition", processID=3, institution="BT")["id"] == "10"
+    assert corpus.query("vorgang", sachgebiet="Umwelt") == "No data was returned."
+
+
+def test_local_persistence(corpus, tmp_path):
+    corpus.add("vorgang", dict(DOCUMENTS[0], titel="Geändert"))
+    corpus.compact()
+    reloaded = LocalCorpus(str(tmp_path))
+    assert len(reloaded) == 4
+    assert reloaded.get("vorgang", 1)["titel"] == "Geändert"
+    assert reloaded.query("vorgang", fid=[1, 2], num=1)["id"] == "2"
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import os
+import requests
+from bundestag_api.pdf import PdfFetcher
+
+FILES = {"https://dserver.bundestag.de/btd/20/001/2000100.pdf": b"%PDF-1.4 first" * 1000,
+         "https://dserver.bundestag.de/btd/20/001/2000101.pdf": b"%PDF-1.4 second" * 1000,
+         "https://dserver.bundestag.de/btd/20/001/copy.pdf": b"%PDF-1.4 first" * 1000}
+
+
+class FakeDownload:
+
+    def __init__(self, body, status_code, fail_after=None):
+        self.body = body
+        self.status_code = status_code
+        self.fail_after = fail_after
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), 1000):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection reset")
+            yield self.body[i:i+1000]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeServer:
+    """Serves FILES with range requests. The first download of a URL in
+    broken is interrupted after 5000 bytes"""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        start = 0
+        if headers and "Range" in headers:
+            start = int(headers["Range"][6:-1])
+        self.calls.append((url, start))
+        body = FILES[url]
+        if url in self.broken:
+            self.broken.remove(url)
+            return FakeDownload(body[start:], 206 if start else 200, fail_after=5000)
+        return FakeDownload(body[start:], 206 if start else 200)
+
+
+def test_pdf_fetcher(tmp_path):
+    docs = [{"id": "100", "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000100.pdf"}},
+            {"id": "101", "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000101.pdf"}},
+            {"id": "102", "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/copy.pdf"}},
+            {"id": "103", "fundstelle": {}}]
+    fetcher = PdfFetcher(str(tmp_path), concurrency=2, retry_backoff=0)
+    server = FakeServer(broken=["https://dserver.bundestag.de/btd/20/001/2000101.pdf"])
+    fetcher.session = server
+    summary = fetcher.fetch(docs)
+    assert summary["downloaded"] == 3
+    assert summary["missing"] == 1
+    assert summary["failed"] == 0
+    # The interrupted download continued where it stopped
+    assert ("https://dserver.bundestag.de/btd/20/001/2000101.pdf", 5000) in server.calls
+    with open(fetcher.path(101), "rb") as f:
+        assert f.read() == FILES["https://dserver.bundestag.de/btd/20/001/2000101.pdf"]
+    # Identical files are stored once
+    assert fetcher.path(100) == fetcher.path(102)
+    assert sum(len(files) for _, _, files in os.walk(os.path.join(str(tmp_path), "objects"))) == 2
+
+    fetcher = PdfFetcher(str(tmp_path))
+    fetcher.session = FakeServer()
+    summary = fetcher.fetch(docs)
+    assert summary["skipped"] == 3
+    assert summary["downloaded"] == 0
+    assert fetcher.session.calls == []
+
+
+class OneDocumentConnection:
+    """Returns a single document unwrapped, as query() does for one result"""
+
+    def query(self, resource, num=100, fid=None, fields=None):
+        return {"id": str(fid[0]), "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000100.pdf"}}
+
+
+def test_pdf_fetcher_single(tmp_path):
+    fetcher = PdfFetcher(str(tmp_path), connection=OneDocumentConnection())
+    fetcher.session = FakeServer()
+    summary = fetcher.fetch([100])
+    assert summary["downloaded"] == 1
+    assert fetcher.path(100) is not None
+    # A single document as returned by get_document
+    doc = {"id": "101", "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000101.pdf"}}
+    summary = fetcher.fetch(doc)
+    assert summary["downloaded"] == 1
+    assert list(summary["paths"]) == ["101"]
@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import time
+import pytest
+import bundestag_api
+from bundestag_api import bta_wrapper
+from bundestag_api.streaming import PageDecoder, XmlPageDecoder
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = json.dumps(content).encode("utf-8")
+        self.status_code = status_code
+        self.reason = "OK" if status_code == 200 else "Error"
+        self.url = "https://search.dip.bundestag.de/api/v1/"
+        self.headers = {"Content-Length": str(len(self.content))}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), 7):
+            yield self.content[i:i+7]
+
+    def close(self):
+        pass
+
+
+def fake_documents(params):
+    """Returns documents whose ID encodes the requested descriptor"""
+    descriptor = params.get("f.deskriptor")
+    ids = {"Pflege": [1, 2, 3], "Digitalisierung": [3, 4], None: [1, 2, 3, 4, 5]}[descriptor]
+    return [{"id": str(i), "datum": "2022-05-0{}".format(i), "deskriptor": [{"name": descriptor}]} for i in ids]
+
+
+@pytest.fixture
+def bta(monkeypatch):
+    calls = []
+
+    def get(url, params=None, **kwargs):
+        calls.append(dict(params))
+        docs = fake_documents(params)
+        return FakeResponse({"numFound": len(docs), "documents": docs, "cursor": "AoE"})
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    bta.calls = calls
+    return bta
+
+
+def test_descriptor_or(bta):
+    data = bta.search_procedure(descriptor=["Pflege", "Digitalisierung"], descriptor_mode="or")
+    assert [d["id"] for d in data] == ["4", "3", "2", "1"]
+    assert len(bta.calls) == 2
+    data = bta.search_procedure(descriptor=["Pflege", "Digitalisierung"], descriptor_mode="or", num=2)
+    assert [d["id"] for d in data] == ["4", "3"]
+
+
+def test_descriptor_or_error(monkeypatch):
+    def get(url, params=None, **kwargs):
+        if params.get("f.deskriptor") == "Digitalisierung":
+            return FakeResponse({}, 401)
+        docs = fake_documents(params)
+        return FakeResponse({"numFound": len(docs), "documents": docs, "cursor": "AoE"})
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    data = bta.search_procedure(descriptor=["Pflege", "Digitalisierung"], descriptor_mode="or")
+    assert bundestag_api.is_error(data) and "Code 401" in data
+
+
+def test_descriptor_or_all(bta):
+    data = bta.query("vorgang", num=None, descriptor=["Pflege", "Digitalisierung"], descriptor_mode="or")
+    assert [d["id"] for d in data] == ["4", "3", "2", "1"]
+
+
+def test_descriptor_mode_validation(bta):
+    with pytest.raises(ValueError):
+        bta.query(resource="vorgang", descriptor=["Pflege"], descriptor_mode="xor")
+    with pytest.raises(ValueError):
+        bta.query(resource="vorgang", descriptor=["Pflege", "Digitalisierung"], descriptor_mode="or",
+                  return_format="xml")
+
+
+def test_metrics(bta):
+    metrics = bundestag_api.Metrics(bta)
+    bta.search_procedure(num=10)
+    assert metrics.get("requests_total", resource="vorgang", status=200) == 1
+    assert metrics.get("documents_total", resource="vorgang") == 5
+    text = metrics.to_prometheus()
+    assert 'bundestag_api_request_duration_seconds_count{resource="vorgang",status="200"} 1' in text
+
+
+def test_error_stops_and_retries(monkeypatch):
+    responses = [FakeResponse({}, 503), FakeResponse({}, 401)]
+    monkeypatch.setattr(bta_wrapper.requests, "get", lambda url, params=None, **kwargs: responses.pop(0))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", retry_backoff=0)
+    events = []
+    bta.add_hook("retry", lambda event, info: events.append(event))
+    data = bta.search_document()
+    assert data == "An authorization error occured. Likely an error with you API key. Code 401: Error"
+    assert events == ["retry"]
+
+
+def test_profile(bta, tmp_path):
+    with bta.profile(slowest=1) as profiler:
+        bta.search_procedure(num=10, return_format="object")
+        bta.search_procedure(num=10, descriptor="Pflege")
+    assert bta.profiler is None
+    slowest = profiler.slowest_queries()
+    assert len(slowest) == 1 and len(profiler.recent) == 2
+    phases = profiler.recent[0].summary()
+    assert set(phases) == {"validate", "network", "decode", "models"}
+    profiler.dump_flamegraph(str(tmp_path / "profile.txt"), profile=profiler.recent[1])
+    lines = (tmp_path / "profile.txt").read_text().splitlines()
+    assert lines[0].startswith("query vorgang;validate ")
+    assert '"f.deskriptor": "Pflege"' in profiler.recent[1].key
+
+
+def paged_server(records, fail_at=None):
+    """Serves pages of 50 documents. The page with index fail_at fails once"""
+    calls = []
+
+    def get(url, params=None, **kwargs):
+        calls.append(params.get("cursor"))
+        start = 0 if params.get("cursor") is None else int(params["cursor"][1:])
+        if start // 50 == fail_at:
+            calls.pop()
+            return FakeResponse({}, 401)
+        docs = [{"id": str(i), "datum": "2022-05-01"} for i in range(start, min(start+50, records))]
+        cursor = "c{}".format(start+50 if start+50 < records else start)
+        r = FakeResponse({"numFound": records, "documents": docs, "cursor": cursor})
+        if params.get("format") == "xml":
+            r.content = ("<?xml version='1.0' encoding='UTF-8'?><response><numFound>{}</numFound><documents>{}"
+                         "</documents><cursor>{}</cursor></response>").format(records, "".join(
+                             "<document><id>{}</id><datum>2022-05-01</datum><deskriptor><name>Pflege</name>"
+                             "<fundstelle>true</fundstelle></deskriptor></document>".format(d["id"])
+                             for d in docs), cursor).encode("utf-8")
+        return r
+    get.calls = calls
+    return get
+
+
+def test_iter_query_resume(monkeypatch, tmp_path):
+    path = str(tmp_path / "vorgang.checkpoint")
+    server = paged_server(180, fail_at=2)
+    monkeypatch.setattr(bta_wrapper.requests, "get", server)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", retry_backoff=0)
+    delivered = []
+    with pytest.raises(RuntimeError):
+        for doc in bta.iter_query("vorgang", checkpoint=path, checkpoint_every=5):
+            delivered.append(int(doc["id"]))
+    assert delivered == list(range(100))
+    with open(path) as f:
+        assert json.load(f)["cursor"] == "c100"
+    server = paged_server(180)
+    monkeypatch.setattr(bta_wrapper.requests, "get", server)
+    # Stop in the middle of a page. The document the iterator stopped at was
+    # not confirmed by a further next() and is delivered again
+    iterator = bta.iter_query("vorgang", checkpoint=path)
+    delivered.extend(int(next(iterator)["id"]) for _ in range(10))
+    iterator.close()
+    with open(path) as f:
+        assert json.load(f)["offset"] == 9
+    for doc in bta.iter_query("vorgang", checkpoint=path):
+        delivered.append(int(doc["id"]))
+    assert delivered == list(range(110))+list(range(109, 180))
+    assert server.calls == ["c100", "c100", "c150"]
+    assert not (tmp_path / "vorgang.checkpoint").exists()
+
+
+def test_iter_query_pages(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(120))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    pages = list(bta.iter_query("vorgang", num=110, pages=True, return_format="object"))
+    assert [len(p) for p in pages] == [50, 50, 10]
+    assert pages[2][-1].btid == "109"
+
+
+def test_iter_query_pages_resume(monkeypatch, tmp_path):
+    path = str(tmp_path / "vorgang.checkpoint")
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(120))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    iterator = bta.iter_query("vorgang", checkpoint=path, pages=True)
+    assert len(next(iterator)) == 50
+    assert int(next(iterator)[0]["id"]) == 50
+    iterator.close()
+    # The second page was handed out but not confirmed, so it is delivered again
+    pages = list(bta.iter_query("vorgang", checkpoint=path, pages=True))
+    assert [int(p[0]["id"]) for p in pages] == [50, 100]
+
+
+def test_parallel_objects(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(180))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", workers=2)
+    data = bta.query("vorgang", num=160, return_format="object")
+    assert list(data) == [str(i) for i in range(160)]
+    assert all(isinstance(p, bundestag_api.Vorgang) for p in data.values())
+    # The pool is kept for the next query and shut down by close()
+    executor = bta.executor
+    assert executor is not None
+    assert len(bta.query("vorgang", num=120, return_format="object")) == 120
+    assert bta.executor is executor
+    bta.close()
+    assert bta.executor is None
+    with bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", workers=2) as bta:
+        assert len(bta.query("vorgang", num=60, return_format="object")) == 60
+    assert bta.executor is None
+    with pytest.raises(ValueError):
+        bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", workers=0)
+
+
+def test_prepared_query(bta):
+    prepared = bta.prepare("vorgang", num=10, institution="BT", date_end="2022-12-31")
+    data = prepared.execute(date_start="2022-05-01")
+    assert len(data) == 5
+    assert bta.calls[-1]["f.datum.start"] == "2022-05-01" and bta.calls[-1]["f.zuordnung"] == "BT"
+    assert prepared.payload["f.datum.start"] is None
+    assert prepared.key(fid=["3", 1]) == prepared.key(fid=[3, 1])
+    assert prepared.key(date_start="2022-05-01") != prepared.key(date_start="2022-06-01")
+    with pytest.raises(ValueError):
+        prepared.bind(date_end="2023-01-01")
+    with pytest.raises(ValueError):
+        prepared.bind(institution="BR")
+    with pytest.raises(ValueError):
+        prepared.bind(updated_since="yesterday")
+
+    async def run():
+        return await asyncio.gather(prepared.execute_async(date_start="2022-05-01"),
+                                    prepared.execute_async(date_start="2022-06-01"))
+    results = asyncio.run(run())
+    assert [len(r) for r in results] == [5, 5]
+
+
+def test_key_pool(monkeypatch):
+    keys = []
+
+    def get(url, params=None, **kwargs):
+        keys.append(params["apikey"])
+        if params["apikey"] == "bad-key-000":
+            return FakeResponse({}, 401)
+        return FakeResponse({"numFound": 1, "documents": [{"id": "1"}], "cursor": "AoE"})
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    pool = bundestag_api.KeyPool({"bad-key-000": None, "key-a-0001": 3, "key-b-0002": 5})
+    bta = bundestag_api.btaConnection(apikey=pool, retry_backoff=0)
+    for _ in range(4):
+        assert bta.search_procedure() == {"id": "1"}
+    # The bad key is tried once, benched and the request repeated with another key
+    assert keys[:2] == ["bad-key-000", "key-b-0002"]
+    usage = pool.usage()
+    assert usage["bad-key-000"]["errors"] == 1 and usage["bad-key-000"]["benched"] > 0
+    assert usage["key-a-0001"]["remaining"] == 2 and usage["key-b-0002"]["remaining"] == 2
+    with pytest.raises(ValueError):
+        bundestag_api.KeyPool([])
+
+
+def test_fields(monkeypatch):
+    def get(url, params=None, **kwargs):
+        docs = [{"id": str(i), "datum": "2022-05-0{}".format(i), "titel": "Antrag", "text": "x" * 1000,
+                 "deskriptor": [{"name": "Pflege"}],
+                 "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000001.pdf", "seite": "1"},
+                 "vorgangsbezug": [{"id": "7", "titel": "Vorgang", "vorgangstyp": "Antrag"}]} for i in range(1, 4)]
+        return FakeResponse({"numFound": 3, "documents": docs, "cursor": "AoE"})
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    data = bta.search_document(fields=["titel", "fundstelle.pdf_url", "vorgangsbezug.titel"])
+    assert data[0] == {"id": "1", "titel": "Antrag",
+                       "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000001.pdf"},
+                       "vorgangsbezug": [{"titel": "Vorgang"}]}
+    data = bta.search_procedure(descriptor=["Pflege", "Gesundheit"], descriptor_mode="or", fields="titel")
+    assert [d for d in data] == [{"id": str(i), "titel": "Antrag"} for i in (3, 2, 1)]
+    with pytest.raises(ValueError):
+        bta.search_document(fields=[1])
+
+
+FULL_DOCUMENTS = {
+    "aktivitaet": {"id": "1", "aktivitaetsart": "Rede", "datum": "2022-05-01", "titel": "Max Mustermann, MdB, SPD",
+                   "typ": "Aktivität", "dokumentart": "Plenarprotokoll", "wahlperiode": 20,
+                   "vorgangsbezug_anzahl": 1, "vorgangsbezug": [{"id": "7", "titel": "Vorgang"}],
+                   "fundstelle": {"id": "9", "pdf_url": "https://dserver.bundestag.de/btp/20/20001.pdf"}},
+    "drucksache": {"id": "1", "datum": "2022-05-01", "titel": "Antrag", "drucksachetyp": "Antrag",
+                   "autoren_anzeige": [{"id": "3", "titel": "Max Mustermann, MdB, SPD", "autor_titel": "Max"}]},
+    "person": {"id": "1", "nachname": "Mustermann", "vorname": "Max", "titel": "Max Mustermann, MdB, SPD",
+               "wahlperiode": 20, "person_roles": [{"funktion": "MdB", "fraktion": "SPD", "nachname": "Mustermann"}]},
+    "plenarprotokoll": {"id": "1", "datum": "2022-05-01", "titel": "Protokoll", "dokumentnummer": "20/1"},
+    "vorgang": {"id": "1", "datum": "2022-05-01", "titel": "Gesetz", "vorgangstyp": "Gesetzgebung",
+                "inkrafttreten": [{"datum": "2022-07-01", "erlaeuterung": "Art. 1"}]},
+    "vorgangsposition": {"id": "1", "datum": "2022-05-01", "titel": "Gesetz", "vorgang_id": "7"}}
+FULL_DOCUMENTS["drucksache-text"] = dict(FULL_DOCUMENTS["drucksache"], text="Text")
+FULL_DOCUMENTS["plenarprotokoll-text"] = dict(FULL_DOCUMENTS["plenarprotokoll"], text="Text")
+
+
+@pytest.mark.parametrize("resource", sorted(FULL_DOCUMENTS))
+def test_fields_objects(monkeypatch, resource):
+    def get(url, params=None, **kwargs):
+        return FakeResponse({"numFound": 1, "documents": [FULL_DOCUMENTS[resource]], "cursor": "AoE"})
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    # Nested fields of lists leave out the parts the models read
+    fields = ["datum", "titel", "vorgangsbezug", "autoren_anzeige.autor_titel", "person_roles.fraktion",
+              "inkrafttreten.erlaeuterung"]
+    data = bta.query(resource, fields=fields, return_format="object")
+    assert str(data.btid) == "1"
+
+
+def test_streaming(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(180))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", stream=True)
+    metrics = bundestag_api.Metrics(bta)
+    data = bta.query("vorgang", num=1000, fields=["datum"])
+    assert data == [{"id": str(i), "datum": "2022-05-01"} for i in range(180)]
+    assert metrics.get("pages_total", resource="vorgang") == 4
+    assert [d["id"] for d in bta.query("vorgang", num=60)] == [str(i) for i in range(60)]
+    iterator = bta.iter_query("vorgang")
+    assert next(iterator)["id"] == "0"
+    assert sum(1 for _ in iterator) == 179
+
+
+def test_profile_streaming(monkeypatch):
+    class SlowResponse(FakeResponse):
+        def iter_content(self, chunk_size=1):
+            for i in range(0, len(self.content), 1000):
+                time.sleep(0.01)
+                yield self.content[i:i+1000]
+
+    def get(url, params=None, **kwargs):
+        docs = [{"id": str(i), "titel": "x" * 100} for i in range(50)]
+        return SlowResponse({"numFound": 50, "documents": docs, "cursor": "AoE"})
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", stream=True)
+    with bta.profile() as profiler:
+        assert len(bta.query("vorgang", return_format="object")) == 50
+    phases = profiler.recent[0].summary()
+    assert set(phases) == {"validate", "network", "decode", "models"}
+    # The body is received in 6 chunks of 10 ms, which count as network
+    assert phases["network"][0] >= 0.06
+    assert 0 <= phases["decode"][0] < phases["network"][0]
+    assert {path[0] for path, wall, cpu in profiler.recent[0].phases if len(path) == 2} == {"page 1"}
+
+
+def test_metrics_streaming(monkeypatch):
+    bodies = []
+
+    class ChunkedResponse(FakeResponse):
+        def iter_content(self, chunk_size=1):
+            for i in range(0, len(self.content), 1000):
+                time.sleep(0.01)
+                yield self.content[i:i+1000]
+
+    def get(url, params=None, **kwargs):
+        docs = [{"id": str(i), "titel": "x" * 100} for i in range(50)]
+        r = ChunkedResponse({"numFound": 50, "documents": docs, "cursor": "AoE"})
+        r.headers = {}
+        bodies.append(len(r.content))
+        return r
+
+    monkeypatch.setattr(bta_wrapper.requests, "get", get)
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", stream=True)
+    metrics = bundestag_api.Metrics(bta)
+    bta.query("vorgang")
+    # The size and time of the received body are reported, not the announced size
+    assert metrics.get("response_bytes_total", resource="vorgang") == bodies[0]
+    duration = metrics.histograms[("request_duration_seconds", (("resource", "vorgang"), ("status", 200)))]
+    assert duration.total == 1 and duration.sum >= 0.06
+
+
+def test_pandas_chunks(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(120))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    frame = bta.query("vorgang", return_format="pandas", num=110)
+    assert len(frame) == 110
+    assert str(frame["id"].dtype) == "int64"
+    assert str(frame["datum"].dtype).startswith("datetime64")
+    chunks = list(bta.iter_query("vorgang", return_format="pandas"))
+    assert [len(chunk) for chunk in chunks] == [50, 50, 20]
+    assert chunks[2]["id"].iloc[0] == 100
+
+
+def test_concat_frames():
+    from bundestag_api.frames import page_frame, concat_frames
+    first = page_frame([{"id": "1", "typ": "Vorgang", "vorgangstyp": "Gesetzgebung",
+                         "aktualisiert": "2022-06-24T09:45:00+02:00",
+                         "deskriptor": [{"name": "Pflege", "typ": "Sachbegriffe"}]},
+                        {"id": "2", "typ": "Vorgang", "vorgangstyp": "Antrag",
+                         "aktualisiert": "2022-01-24T09:45:00+01:00"}])
+    second = page_frame([{"id": "3", "typ": "Vorgang", "vorgangstyp": "Kleine Anfrage",
+                          "aktualisiert": "2022-01-24T10:45:00+01:00", "wahlperiode": 20}])
+    frame = concat_frames([first, second])
+    assert frame["vorgangstyp"].dtype == "category"
+    assert list(frame["vorgangstyp"]) == ["Gesetzgebung", "Antrag", "Kleine Anfrage"]
+    assert str(frame["aktualisiert"].dt.tz) == "UTC"
+    assert frame["aktualisiert"].iloc[0].hour == 7
+    assert list(frame["deskriptor"].map(len)) == [1, 0, 0]
+    assert str(frame["wahlperiode"].dtype) == "Int64"
+    assert page_frame([{"id": "1", "deskriptor": [{"name": "Pflege"}]}], lists="json")["deskriptor"][0] == \
+        '[{"name": "Pflege"}]'
+
+
+def test_xml(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(120))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    elements = bta.query("vorgang", return_format="xml", num=1000)
+    assert [e.find("id").text for e in elements] == [str(i) for i in range(120)]
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", wire_format="xml")
+    data = bta.query("vorgang", num=60)
+    assert data[59] == {"id": "59", "datum": "2022-05-01", "deskriptor": [{"name": "Pflege", "fundstelle": True}]}
+    objects = bta.query("vorgang", return_format="object", num=3)
+    assert objects["2"].descriptor[0]["name"] == "Pflege"
+    assert sum(1 for _ in bta.iter_query("vorgang", return_format="xml")) == 120
+
+
+def to_xml(tag, value):
+    """Writes a value the way the XML format of the API does, with lists as
+    repeated elements"""
+    if isinstance(value, list):
+        return "".join(to_xml(tag, item) for item in value)
+    if isinstance(value, dict):
+        return "<{0}>{1}</{0}>".format(tag, "".join(to_xml(k, v) for k, v in value.items()))
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return "<{0}>{1}</{0}>".format(tag, value)
+
+
+def test_xml_matches_json():
+    documents = [{"id": "264026", "typ": "Dokument", "dokumentart": "Drucksache", "drucksachetyp": "Antrag",
+                  "dokumentnummer": "20/1", "wahlperiode": 20, "herausgeber": "BT", "datum": "2022-05-01",
+                  "titel": "Antrag", "autoren_anzahl": 1, "vorgangsbezug_anzahl": 1,
+                  "autoren_anzeige": [{"id": "3", "titel": "Max Mustermann, MdB, SPD", "autor_titel": "Max"}],
+                  "fundstelle": {"id": "264026", "dokumentart": "Drucksache", "pdf_url": "https://x/1.pdf",
+                                 "anfangsseite": 1, "endseite": 12, "anfangsquadrant": "A"},
+                  "urheber": [{"einbringer": True, "bezeichnung": "SPD", "titel": "Fraktion der SPD"}],
+                  "vorgangsbezug": [{"id": "7", "titel": "Vorgang", "vorgangstyp": "Antrag"}],
+                  "ressort": [{"federfuehrend": False, "titel": "Bundesministerium"}]},
+                 {"id": "1", "typ": "Aktivität", "aktivitaetsart": "Rede", "wahlperiode": 20,
+                  "vorgangsbezug_anzahl": 2, "deskriptor": [{"name": "Pflege", "typ": "Sachbegriffe",
+                                                             "fundstelle": True}],
+                  "vorgangsbezug": [{"id": "7"}, {"id": "8"}], "aktivitaet_anzahl": 3}]
+    page = {"numFound": 2, "documents": documents, "cursor": "AoE"}
+    body = json.dumps(page).encode("utf-8")
+    xml = "<response><numFound>2</numFound><documents>{}</documents><cursor>AoE</cursor></response>".format(
+        "".join(to_xml("document", doc) for doc in documents)).encode("utf-8")
+    json_decoder = PageDecoder([body[i:i+11] for i in range(0, len(body), 11)])
+    xml_decoder = XmlPageDecoder([xml[i:i+11] for i in range(0, len(xml), 11)])
+    assert list(xml_decoder.documents()) == list(json_decoder.documents()) == documents
+    assert xml_decoder.finish() == json_decoder.finish()
+
+
+def test_xml_fields(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(3))
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    elements = bta.query("vorgang", return_format="xml", fields=["deskriptor.name"])
+    assert [[child.tag for child in e.iter()] for e in elements] == [["document", "id", "deskriptor", "name"]] * 3
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw", wire_format="xml")
+    assert bta.query("vorgang", fields=["datum"], num=1) == {"id": "0", "datum": "2022-05-01"}
+
+
+def test_count(monkeypatch, bta):
+    assert bta.query("vorgang", count=True) == 5
+    assert bta.search_procedure(descriptor="Pflege", count=True) == 3
+    assert len(bta.calls) == 2
+    assert bta.count_many("vorgang", [{"descriptor": "Pflege"}, {"descriptor": "Digitalisierung"}, {}]) == [3, 2, 5]
+    with pytest.raises(ValueError):
+        bta.search_procedure(descriptor=["Pflege", "Digitalisierung"], descriptor_mode="or", count=True)
+    server = paged_server(180)
+    monkeypatch.setattr(bta_wrapper.requests, "get", server)
+    assert bta.query("vorgang", count=True) == 180
+    assert server.calls == [None]
+    # numFound after the documents
+    monkeypatch.setattr(bta_wrapper.requests, "get", lambda url, params=None, **kwargs: FakeResponse(
+        {"documents": [{"id": "1"}, {"id": "2"}], "cursor": "AoE", "numFound": 2}))
+    assert bta.query("vorgang", count=True) == 2
+    assert bta.count_many("vorgang", [{}, {"descriptor": "Pflege"}]) == [2, 2]
+
+
+def test_is_error():
+    assert bundestag_api.is_error("An error occured. Code 500: Error")
+    assert not bundestag_api.is_error(bundestag_api.NO_DATA)
+    assert not bundestag_api.is_error([{"id": "1"}])
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from bundestag_api.speeches import iter_speeches, segment_protocols
+
+PROTOCOL = """Deutscher Bundestag
+Stenografischer Bericht
+Beginn: 9.00 Uhr
+Präsidentin Bärbel Bas:
+Die Sitzung ist eröffnet.
+(Beifall)
+Dr. Rolf Mützenich (SPD):
+Frau Präsidentin! Meine Damen und Herren!
+(Beifall bei der SPD – Zuruf von der AfD: Unsinn!)
+Wir bleiben dabei.
+Christian Lindner, Bundesminister der Finanzen:
+Vielen Dank.
+"""
+
+
+def test_iter_speeches():
+    speeches = list(iter_speeches(PROTOCOL))
+    assert [s.speaker for s in speeches] == ["Bärbel Bas", "Dr. Rolf Mützenich", "Christian Lindner"]
+    assert speeches[0].role == "Präsidentin"
+    assert speeches[1].faction == "SPD"
+    assert speeches[2].role == "Bundesminister der Finanzen"
+    assert speeches[1].text.strip().endswith("Wir bleiben dabei.")
+    assert speeches[1].interjections[0].text == "Beifall bei der SPD – Zuruf von der AfD: Unsinn!"
+    assert PROTOCOL[speeches[0].end:].startswith("Dr. Rolf Mützenich (SPD):")
+
+
+def test_segment_protocols():
+    protocols = [{"id": "1", "text": PROTOCOL}, {"id": "2", "text": PROTOCOL}]
+    data = segment_protocols(protocols, processes=2)
+    assert len(data["1"]) == 3 and len(data["2"]) == 3
+    assert data["2"][2].text.strip() == "Vielen Dank."
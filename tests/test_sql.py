@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import json
+import pytest
+from bundestag_api.harvest import ParquetWriter
+
+pytest.importorskip("duckdb")
+
+from bundestag_api.sql import DipDatabase
+
+PROCEDURES = [{"id": "1", "typ": "Vorgang", "vorgangstyp": "Gesetzgebung", "datum": "2022-05-01",
+               "aktualisiert": "2022-06-24T09:45:00+02:00",
+               "deskriptor": [{"name": "Pflege", "typ": "Sachbegriffe", "fundstelle": True},
+                              {"name": "Gesundheit", "typ": "Sachbegriffe", "fundstelle": False}]},
+              {"id": "2", "typ": "Vorgang", "vorgangstyp": "Antrag", "datum": "2022-05-02",
+               "aktualisiert": "2022-06-24T09:45:00+02:00",
+               "deskriptor": [{"name": "Pflege", "typ": "Sachbegriffe", "fundstelle": True}]},
+              {"id": "1", "typ": "Vorgang", "vorgangstyp": "Gesetzgebung", "datum": "2022-05-01",
+               "aktualisiert": "2022-01-01T09:45:00+01:00", "deskriptor": []}]
+DOCUMENTS = [{"id": "10", "typ": "Dokument", "dokumentart": "Drucksache", "datum": "2022-05-03",
+              "fundstelle": {"pdf_url": "https://dserver.bundestag.de/btd/20/001/2000100.pdf"},
+              "vorgangsbezug": [{"id": "1", "titel": "Pflegegesetz", "vorgangstyp": "Gesetzgebung"}],
+              "autoren_anzeige": [{"id": "7", "titel": "Müller, Anna, MdB", "autor_titel": "Anna Müller"}]}]
+
+
+def test_dip_database(tmp_path):
+    path = str(tmp_path / "vorgang.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in PROCEDURES:
+            f.write(json.dumps(doc)+"\n")
+    db = DipDatabase()
+    # The newer version of procedure 1 is kept
+    assert db.load("vorgang", path) == 2
+    assert db.load("drucksache", DOCUMENTS) == 1
+    assert set(db.tables()) == {"vorgang", "vorgang_deskriptor", "drucksache",
+                                "drucksache_vorgangsbezug", "drucksache_autoren_anzeige"}
+    assert db.sql("SELECT name, count(*) FROM vorgang_deskriptor GROUP BY name ORDER BY name").fetchall() == \
+        [("Gesundheit", 1), ("Pflege", 2)]
+    assert db.sql("SELECT v.vorgangstyp, d.fundstelle.pdf_url FROM drucksache d "
+                  "JOIN drucksache_vorgangsbezug b ON b.drucksache_id = d.id "
+                  "JOIN vorgang v ON v.id = b.id WHERE d.id = ?", [10]).fetchall() == \
+        [("Gesetzgebung", "https://dserver.bundestag.de/btd/20/001/2000100.pdf")]
+    assert db.sql("SELECT id FROM drucksache_autoren_anzeige").fetchall() == [(7,)]
+    db.close()
+
+
+def test_dip_database_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    writer = ParquetWriter(str(tmp_path / "vorgang"))
+    writer.write("vorgang", PROCEDURES[:2], ("2022-05-01", "2022-05-31"))
+    db = DipDatabase()
+    assert db.load("vorgang", str(tmp_path / "vorgang")) == 2
+    assert db.sql("SELECT count(*) FROM vorgang_deskriptor WHERE name = 'Pflege'").fetchone()[0] == 2
+    db.close()
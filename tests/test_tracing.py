@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import bundestag_api
+from bundestag_api import bta_wrapper
+from test_query_offline import paged_server
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+EXPORTER = InMemorySpanExporter()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def provider():
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(EXPORTER))
+    # The global provider can only be set once per process
+    trace.set_tracer_provider(provider)
+    yield provider
+
+
+def test_query_spans(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(120))
+    EXPORTER.clear()
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    bta.search_procedure(num=1000)
+    spans = EXPORTER.get_finished_spans()
+    query = [span for span in spans if span.name == "bundestag_api.search_procedure"]
+    pages = [span for span in spans if span.name == "bundestag_api.page"]
+    # search_procedure calls query, which does not open a span of its own
+    assert len(query) == 1 and len(spans) == 4
+    query = query[0]
+    assert query.attributes["bundestag_api.resource"] == "vorgang"
+    assert query.attributes["bundestag_api.numFound"] == 120
+    assert query.attributes["bundestag_api.documents"] == 120
+    assert query.attributes["bundestag_api.cursor_depth"] == 3
+    assert [page.parent.span_id for page in pages] == [query.context.span_id]*3
+    assert [page.attributes["bundestag_api.cursor_depth"] for page in pages] == [0, 1, 2]
+    for page in pages:
+        assert page.attributes["bundestag_api.resource"] == "vorgang"
+        assert page.attributes["http.status_code"] == 200
+        assert page.attributes["bundestag_api.retries"] == 0
+    assert [page.attributes["bundestag_api.documents"] for page in pages] == [50, 50, 20]
+
+
+def test_error_span(monkeypatch):
+    monkeypatch.setattr(bta_wrapper.requests, "get", paged_server(120, fail_at=1))
+    EXPORTER.clear()
+    bta = bundestag_api.btaConnection(apikey="OSOegLs.PR2lwJ1dwCeje9vTj7FPOt3hvpYKtwKkhw")
+    assert bundestag_api.is_error(bta.query("vorgang", num=1000))
+    pages = [span for span in EXPORTER.get_finished_spans() if span.name == "bundestag_api.page"]
+    assert [page.attributes["http.status_code"] for page in pages] == [200, 401]
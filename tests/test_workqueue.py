@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import json
+from bundestag_api.workqueue import WorkQueue, Worker, plan_tasks
+
+
+class TaskConnection:
+    """Returns two documents per window, the first one shared by all windows"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def query(self, resource, num=100, date_start=None, date_end=None, **filters):
+        if self.fail:
+            return "An error occured. Code 500: Error"
+        return [{"id": "1", "aktualisiert": "2022-01-01T00:00:00"},
+                {"id": date_start.replace("-", ""), "aktualisiert": "2022-01-01T00:00:00"}]
+
+
+def test_plan_tasks():
+    tasks = plan_tasks("vorgang", "2022-05-01", "2022-05-10", window_days=5,
+                       filter_sets=[{"descriptor": "Pflege"}, {"descriptor": "Gesundheit"}])
+    assert len(tasks) == 4
+    assert tasks[0] == ("vorgang", {"descriptor": "Pflege", "date_start": "2022-05-01", "date_end": "2022-05-05"})
+
+
+def test_queue_at_least_once(tmp_path):
+    path = str(tmp_path / "queue.db")
+    queue = WorkQueue(path, lease_seconds=-1, max_attempts=2)
+    tasks = plan_tasks("vorgang", "2022-05-01", "2022-05-10", window_days=5)
+    assert queue.submit(tasks) == 2
+    assert queue.submit(tasks) == 0
+    # A worker that died keeps its lease only until it runs out
+    lost = queue.claim("lost-worker")
+    assert queue.status()["expired"] == 1
+    summary = Worker(TaskConnection(), queue, name="worker").run()
+    assert summary == {"tasks": 2, "failed": 0, "records": 4}
+    # The late worker completes too, without duplicating documents
+    queue.complete(lost, "lost-worker", TaskConnection().query("vorgang", date_start="2022-05-01"))
+    status = queue.status()
+    assert status["done"] == 2 and status["documents"] == 3
+    output = str(tmp_path / "out.jsonl")
+    assert queue.export(output) == 3
+    with open(output) as f:
+        assert sorted(json.loads(line)["id"] for line in f) == ["1", "20220501", "20220506"]
+
+
+def test_queue_failures(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    queue.submit(plan_tasks("vorgang", "2022-05-01", "2022-05-03"))
+    summary = Worker(TaskConnection(fail=True), queue).run()
+    assert summary["failed"] == 2
+    assert queue.status()["failed"] == 1